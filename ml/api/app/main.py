@@ -1,10 +1,17 @@
 from .utils.mf_prediction import predictor
+from .utils.batcher import MicroBatcher
+from .utils.executor import InferenceExecutor, ExecutorSaturated
+from .utils.cache import RecommendationCache
+from .utils.id_map import IdTranslator
+import os
+import asyncio
+import numpy as np
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
-import polars as pl
 from pydantic import BaseModel, Field
 import json
-from fastapi.responses import JSONResponse
+from itertools import chain
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi import HTTPException
 from models.tf_idf.model import TFIDFModel
 
@@ -16,10 +23,26 @@ class preferences(BaseModel):
     )
 
 
+class BatchProfile(preferences):
+    user_id: str | None = Field(
+        None, description="Caller's identifier, echoed back on the result line"
+    )
+
+
+class BatchPreferences(BaseModel):
+    profiles: list[BatchProfile] = Field(
+        ..., description="Preference profiles to recommend for"
+    )
+
+
 class TFIDFPreferences(BaseModel):
     interactions: list[tuple[int, float]] = Field(
         ..., description="List of (TMDB movie ID, rating) tuples"
     )
+    exclude_ids: list[int] = Field(
+        default_factory=list,
+        description="TMDB movie IDs never to recommend; rated movies are always excluded",
+    )
 
 
 mf_config = {
@@ -36,41 +59,242 @@ mf_config = {
     "l2_reg": 0.002,
     "threshold": 0.5,
     "early_stopping_patience": 6,
+    # None uses the bundle's solver ("irls" for MF bundles and checkpoints, "ials" for iALS bundles)
+    "fold_in": None,
+    "fold_in_l2_reg": 0.1,
+    "fold_in_iters": 5,
+    # "exact" scores the whole catalog; "ann" retrieves from an index built with
+    # models/matrix_factorisation/build_ann_index.py
+    # Serving bundle written by `python -m models.matrix_factorisation.serving export`;
+    # the full training checkpoint is used when it is missing
+    "bundle_path": "/Users/vibhorkumar/Desktop/projs/project/ml/api/app/model_checkpoints/mf_ml32m_bundle",
+    "checkpoint_path": "/Users/vibhorkumar/Desktop/projs/project/ml/api/app/model_checkpoints/mf_ml32m.pth",
+    "retrieval": "exact",
+    # Exact retrieval only: None, "fp16", "bf16" or "int8" first-pass scoring,
+    # followed by an exact float32 re-rank of the best rerank_candidates items
+    "quantization": None,
+    "rerank_candidates": 256,
+    "ann_index_path": "/Users/vibhorkumar/Desktop/projs/project/ml/api/app/model_checkpoints/mf_ml32m_hnsw.faiss",
 }
-with open(
-    "/Users/vibhorkumar/Desktop/projs/project/ml/api/app/model_checkpoints/mid_map.json",
-    "r",
-) as f:
-    metadata = json.load(f)
-links = pl.read_csv(
-    "/Users/vibhorkumar/Desktop/projs/project/ml/api/app/data/links.csv"
+id_tables_path = (
+    "/Users/vibhorkumar/Desktop/projs/project/ml/api/app/model_checkpoints/id_tables"
 )
-id_dict = dict(zip(links["tmdbId"].to_list(), links["movieId"].to_list()))
-id_dict_rev = {v: k for k, v in id_dict.items()}
+if not os.path.isdir(id_tables_path):
+    # One-off conversion; later starts memory-map the .npy tables directly. save() renames a
+    # complete directory into place, so a crash or a second worker mid-build is never mistaken for it
+    with open(
+        "/Users/vibhorkumar/Desktop/projs/project/ml/api/app/model_checkpoints/mid_map.json",
+        "r",
+    ) as f:
+        metadata = json.load(f)
+    IdTranslator.build(
+        metadata.pop("mid_map"),
+        "/Users/vibhorkumar/Desktop/projs/project/ml/api/app/data/links.csv",
+        metadata,
+    ).save(id_tables_path)
+id_tables = IdTranslator.load(id_tables_path)
 predictor_model = predictor()
-tfidf_model = TFIDFModel(
-    movie_path="/Users/vibhorkumar/Desktop/projs/project/ml/data/ml-32m/movies.csv",
-    tags_path="/Users/vibhorkumar/Desktop/projs/project/ml/data/ml-32m/tags.csv",
-)
+# Serving bundle written by TFIDFModel.save(); loading it needs neither the raw CSVs nor sklearn
+tfidf_config = {
+    "save_path": "checkpoints/tf_idf",
+    "mmap": True,
+}
+tfidf_model = None
 pos_weight = 1.0
 
+batching_config = {
+    "enabled": True,
+    "max_batch_size": 32,
+    "max_wait_ms": 5.0,
+    "max_queue_size": 256,
+}
+
+inference_config = {
+    # Worker threads running model code; torch_threads intra-op threads each
+    "max_workers": 2,
+    "torch_threads": 2,
+    # Jobs allowed to wait for a worker before requests are rejected with 503
+    "max_pending": 32,
+    "timeout_s": 10.0,
+}
+
+batch_endpoint_config = {
+    # Profiles folded in and scored per executor job; one NDJSON flush per chunk
+    "chunk_size": 256,
+    "max_profiles": 50000,
+}
+
+cache_config = {
+    "enabled": True,
+    "max_entries": 10000,
+    "ttl_s": 300.0,
+    "max_mb": 64,
+}
+
+response_cache = RecommendationCache(
+    max_entries=cache_config["max_entries"],
+    ttl_s=cache_config["ttl_s"],
+    max_bytes=cache_config["max_mb"] * 1024 * 1024,
+)
+
+inference_executor = InferenceExecutor(
+    max_workers=inference_config["max_workers"],
+    max_pending=inference_config["max_pending"],
+    timeout_s=inference_config["timeout_s"],
+    torch_threads=inference_config["torch_threads"],
+)
+
+
+def predict_batch(requests: list[tuple[list[int], list[float], int, tuple]]):
+    # Requests with different ANN search parameters cannot share a search call
+    groups = {}
+    for pos, (_, _, _, search) in enumerate(requests):
+        groups.setdefault(search, []).append(pos)
+    results = [None] * len(requests)
+    for (nprobe, ef_search), positions in groups.items():
+        # Score the group with the largest k asked for, then trim per request
+        k = max(requests[pos][2] for pos in positions)
+        group_results = predictor_model.predict_batch(
+            [(requests[pos][0], requests[pos][1]) for pos in positions],
+            k,
+            nprobe=nprobe,
+            ef_search=ef_search,
+        )
+        for pos, (scores, recs, emb) in zip(positions, group_results):
+            req_k = requests[pos][2]
+            results[pos] = (scores[:req_k], recs[:req_k], emb)
+    return results
+
+
+mf_batcher = MicroBatcher(
+    predict_batch,
+    max_batch_size=batching_config["max_batch_size"],
+    max_wait_ms=batching_config["max_wait_ms"],
+    executor=inference_executor,
+    max_queue_size=batching_config["max_queue_size"],
+)
+
+
+def to_tmdb(movie_ids) -> list:
+    tmdb_ids, found = id_tables.movie_to_tmdb(movie_ids)
+    return [
+        tmdb_id if ok else f"unknown_{movie_id}"
+        for movie_id, tmdb_id, ok in zip(movie_ids, tmdb_ids.tolist(), found)
+    ]
+
+
+def mf_batch_chunk(
+    profiles: list[BatchProfile],
+    offset: int,
+    k: int,
+    nprobe: int | None,
+    ef_search: int | None,
+    include_embedding: bool,
+) -> str:
+    """Translate, fold in and score one chunk of profiles; returns its NDJSON lines."""
+    lengths = [min(len(p.movie_ids), len(p.ratings)) for p in profiles]
+    total = sum(lengths)
+    tmdb_ids = np.fromiter(
+        chain.from_iterable(p.movie_ids[:n] for p, n in zip(profiles, lengths)),
+        dtype=np.int64,
+        count=total,
+    )
+    ratings = np.fromiter(
+        chain.from_iterable(p.ratings[:n] for p, n in zip(profiles, lengths)),
+        dtype=np.float32,
+        count=total,
+    )
+    movie_ids, found = id_tables.tmdb_to_movie(tmdb_ids)
+    found &= id_tables.movie_to_index(movie_ids)[1]
+    splits = np.cumsum(lengths)[:-1]
+    rows = list(
+        zip(
+            np.split(tmdb_ids, splits),
+            np.split(movie_ids, splits),
+            np.split(ratings, splits),
+            np.split(found, splits),
+        )
+    )
+
+    scored = [pos for pos, row in enumerate(rows) if row[3].any()]
+    results = []
+    if scored:
+        results = predictor_model.predict_batch(
+            [(rows[pos][1][rows[pos][3]], rows[pos][2][rows[pos][3]]) for pos in scored],
+            k,
+            nprobe=nprobe,
+            ef_search=ef_search,
+        )
+    # Translate every recommendation in the chunk back to TMDB IDs in one call
+    tmdb_recs = iter(to_tmdb([m for _, recs, _ in results for m in recs]))
+    results = dict(zip(scored, results))
+
+    lines = []
+    for pos, (profile, (row_tmdb, _, _, row_found)) in enumerate(zip(profiles, rows)):
+        line = {
+            "index": offset + pos,
+            "user_id": profile.user_id,
+            "skipped_tmdb_ids": row_tmdb[~row_found].tolist(),
+        }
+        if pos in results:
+            scores, recs, user_emb = results[pos]
+            line["recommendation_scores"] = scores
+            line["recommendations"] = [next(tmdb_recs) for _ in recs]
+            if include_embedding:
+                line["user_embedding"] = user_emb
+        else:
+            line["error"] = "No valid TMDB IDs found"
+        lines.append(json.dumps(line, separators=(",", ":")))
+    return "\n".join(lines) + "\n"
+
+
+async def cached(namespace: str, model_version: str, interactions, compute, **params):
+    """Serve a response from the cache, computing it once per canonical request otherwise."""
+    if not cache_config["enabled"]:
+        return await compute()
+    response_cache.ensure_version(namespace, model_version)
+    key = response_cache.make_key(namespace, model_version, interactions, **params)
+    return await response_cache.get_or_compute(key, compute)
+
+
+async def run_inference(call):
+    """Await an inference coroutine, turning overload into 503 and slow jobs into 504."""
+    try:
+        return await asyncio.wait_for(call, inference_config["timeout_s"])
+    except (ExecutorSaturated, asyncio.QueueFull):
+        raise HTTPException(
+            status_code=503,
+            detail="Inference capacity exhausted, retry later",
+            headers={"Retry-After": "1"},
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Inference timed out")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     predictor_model.load_model(
-        "/Users/vibhorkumar/Desktop/projs/project/ml/api/app/model_checkpoints/mf_ml32m.pth",
+        mf_config["bundle_path"]
+        if os.path.isdir(mf_config["bundle_path"])
+        else mf_config["checkpoint_path"],
         mf_config,
-        metadata,
+        id_tables.meta,
+        id_tables,
     )
+    global tfidf_model
     try:
-        tfidf_model.load()
+        tfidf_model = TFIDFModel.load_serving(
+            tfidf_config["save_path"], mmap=tfidf_config["mmap"]
+        )
         print("TF-IDF model loaded successfully")
     except Exception as e:
         print(f"Warning: Could not load TF-IDF model: {e}")
         print("TF-IDF recommendations will not be available")
+    if batching_config["enabled"]:
+        await mf_batcher.start()
     yield
-    id_dict.clear()
-    id_dict_rev.clear()
+    await mf_batcher.stop()
+    inference_executor.shutdown()
 
 
 app = FastAPI(
@@ -89,26 +313,56 @@ app = FastAPI(
     description="Get personalized movie recommendations using Matrix Factorization algorithm based on user's movie ratings",
     response_description="Movie recommendations with predicted ratings",
 )
-async def recommendation(pref: preferences, k: int = 10):
-    valid_movie_ids = []
-    valid_ratings = []
-    missing_ids = []
-    for x, r in zip(pref.movie_ids, pref.ratings):
-        if x in id_dict:
-            valid_movie_ids.append(id_dict[x])
-            valid_ratings.append(r)
-        else:
-            missing_ids.append(x)
+async def recommendation(
+    pref: preferences,
+    k: int = 10,
+    nprobe: int | None = None,
+    ef_search: int | None = None,
+):
+    return await cached(
+        "mf",
+        predictor_model.model_version,
+        zip(pref.movie_ids, pref.ratings),
+        lambda: mf_recommendation(pref, k, nprobe, ef_search),
+        k=k,
+        nprobe=nprobe,
+        ef_search=ef_search,
+    )
+
+
+async def mf_recommendation(
+    pref: preferences, k: int, nprobe: int | None, ef_search: int | None
+):
+    n = min(len(pref.movie_ids), len(pref.ratings))
+    tmdb_ids = np.asarray(pref.movie_ids[:n], dtype=np.int64)
+    movie_ids, found = id_tables.tmdb_to_movie(tmdb_ids)
+    # Movies the MF model never saw during training are skipped as well
+    found &= id_tables.movie_to_index(movie_ids)[1]
+    valid_movie_ids = movie_ids[found].tolist()
+    valid_ratings = np.asarray(pref.ratings[:n], dtype=np.float32)[found].tolist()
+    missing_ids = tmdb_ids[~found].tolist()
 
     if not valid_movie_ids:
         raise HTTPException(
             status_code=400, detail=f"No valid TMDB IDs found. Missing: {missing_ids}"
         )
 
-    recommendation_scores, recommendations, user_emb = predictor_model.predict(
-        valid_movie_ids, valid_ratings, k
-    )
-    recommendations = [id_dict_rev.get(x, f"unknown_{x}") for x in recommendations]
+    if batching_config["enabled"]:
+        recommendation_scores, recommendations, user_emb = await run_inference(
+            mf_batcher.submit((valid_movie_ids, valid_ratings, k, (nprobe, ef_search)))
+        )
+    else:
+        recommendation_scores, recommendations, user_emb = await run_inference(
+            inference_executor.run(
+                predictor_model.predict,
+                valid_movie_ids,
+                valid_ratings,
+                k,
+                nprobe=nprobe,
+                ef_search=ef_search,
+            )
+        )
+    recommendations = to_tmdb(recommendations)
 
     return {
         "recommendation_scores": recommendation_scores,
@@ -118,24 +372,100 @@ async def recommendation(pref: preferences, k: int = 10):
     }
 
 
+@app.post(
+    "/recommendation/batch",
+    summary="Get Matrix Factorization Recommendations for Many Users",
+    description="Fold in and score many preference profiles in one request; results stream back as NDJSON, one line per profile",
+    response_description="One JSON object per profile, newline-delimited",
+)
+async def recommendation_batch(
+    batch: BatchPreferences,
+    k: int = 10,
+    nprobe: int | None = None,
+    ef_search: int | None = None,
+    include_embedding: bool = True,
+):
+    profiles = batch.profiles
+    if len(profiles) > batch_endpoint_config["max_profiles"]:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {batch_endpoint_config['max_profiles']} profiles per request",
+        )
+    chunk_size = batch_endpoint_config["chunk_size"]
+    starts = range(0, len(profiles), chunk_size)
+
+    def run_chunk(start: int):
+        return run_inference(
+            inference_executor.run(
+                mf_batch_chunk,
+                profiles[start : start + chunk_size],
+                start,
+                k,
+                nprobe,
+                ef_search,
+                include_embedding,
+            )
+        )
+
+    # The first chunk runs before the response starts so overload still maps to a status code
+    first = await run_chunk(0) if profiles else ""
+
+    async def stream():
+        yield first
+        for start in starts[1:]:
+            try:
+                yield await run_chunk(start)
+            except HTTPException as e:
+                # Headers are already sent; report where the stream stopped and end it
+                yield json.dumps(
+                    {"error": e.detail, "status_code": e.status_code, "index": start}
+                ) + "\n"
+                return
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
 @app.post(
     "/tfidf-recommendation",
     summary="Get TF-IDF Content-Based Recommendations",
     description="Get movie recommendations using TF-IDF content-based filtering based on movie metadata and tags",
     response_description="Content-based movie recommendations with similarity scores",
 )
-async def tfidf_recommendation(pref: TFIDFPreferences, k: int = 10):
+async def tfidf_recommendation(
+    pref: TFIDFPreferences,
+    k: int = 10,
+    nprobe: int | None = None,
+    ef_search: int | None = None,
+):
+    return await cached(
+        "tfidf",
+        getattr(tfidf_model, "model_version", "unloaded"),
+        pref.interactions,
+        lambda: tfidf_recommend(pref, k, nprobe, ef_search),
+        k=k,
+        nprobe=nprobe,
+        ef_search=ef_search,
+        exclude=sorted(set(pref.exclude_ids)),
+    )
+
+
+async def tfidf_recommend(
+    pref: TFIDFPreferences, k: int, nprobe: int | None, ef_search: int | None
+):
+    if tfidf_model is None:
+        raise HTTPException(status_code=503, detail="TF-IDF model not loaded")
     try:
         # Convert TMDB IDs to internal movie IDs for TF-IDF model
-        valid_interactions = []
-        missing_ids = []
-
-        for tmdb_id, rating in pref.interactions:
-            if tmdb_id in id_dict:
-                internal_id = id_dict[tmdb_id]
-                valid_interactions.append((internal_id, rating))
-            else:
-                missing_ids.append(tmdb_id)
+        tmdb_ids = [tmdb_id for tmdb_id, _ in pref.interactions]
+        movie_ids, found = id_tables.tmdb_to_movie(tmdb_ids)
+        valid_interactions = [
+            (movie_id, rating)
+            for movie_id, (_, rating), ok in zip(
+                movie_ids.tolist(), pref.interactions, found
+            )
+            if ok
+        ]
+        missing_ids = np.asarray(tmdb_ids, dtype=np.int64)[~found].tolist()
 
         if not valid_interactions:
             raise HTTPException(
@@ -143,15 +473,25 @@ async def tfidf_recommendation(pref: TFIDFPreferences, k: int = 10):
                 detail=f"No valid TMDB IDs found. Missing: {missing_ids}",
             )
 
+        blocked_ids, blocked_found = id_tables.tmdb_to_movie(pref.exclude_ids)
+
         # Get recommendations from TF-IDF model
-        recommendations, scores = tfidf_model.recommend(
-            interactions=valid_interactions, k=k, min_pos_rating=3
+        recommendations, scores, unknown_movie_ids = await run_inference(
+            inference_executor.run(
+                tfidf_model.recommend,
+                interactions=valid_interactions,
+                k=k,
+                min_pos_rating=3,
+                nprobe=nprobe,
+                ef_search=ef_search,
+                exclude_ids=blocked_ids[blocked_found].tolist(),
+            )
         )
+        # Movies with a TMDB link but no TF-IDF row are reported, not fatal
+        missing_ids += id_tables.movie_to_tmdb(unknown_movie_ids)[0].tolist()
 
         # Convert back to TMDB IDs
-        tmdb_recommendations = [
-            id_dict_rev.get(x, f"unknown_{x}") for x in recommendations
-        ]
+        tmdb_recommendations = to_tmdb(recommendations)
 
         return {
             "recommendations": tmdb_recommendations,
@@ -162,6 +502,10 @@ async def tfidf_recommendation(pref: TFIDFPreferences, k: int = 10):
             "algorithm": "tfidf",
         }
 
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"TF-IDF recommendation failed: {str(e)}"
@@ -175,9 +519,24 @@ async def tfidf_recommendation(pref: TFIDFPreferences, k: int = 10):
     response_description="API health status",
 )
 async def health_check():
-    if not predictor_model or not id_dict or not id_dict_rev:
+    if not hasattr(predictor_model, "model") or id_tables.num_items == 0:
         return JSONResponse(
             status_code=503,
             content={"status": "error", "details": "Model or ID maps not ready"},
         )
     return {"status": "ok"}
+
+
+
+@app.get(
+    "/stats",
+    summary="Serving Statistics",
+    description="Report micro-batching, inference executor and cache statistics",
+    response_description="Serving statistics",
+)
+async def stats():
+    return {
+        "batching": {"enabled": batching_config["enabled"], **mf_batcher.stats()},
+        "executor": inference_executor.stats(),
+        "cache": {"enabled": cache_config["enabled"], **response_cache.stats()},
+    }
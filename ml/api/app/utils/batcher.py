@@ -0,0 +1,103 @@
+import asyncio
+import time
+from typing import Any, Callable
+
+
+class MicroBatcher:
+    """
+    Collects requests that arrive close together and runs them as one batch.
+
+    A background task waits for the first queued request, then keeps collecting until either
+    max_batch_size requests are queued or max_wait_ms has passed since the first one arrived.
+    The batch is handed to process_batch, which must return one result per request in order;
+    each result is then delivered to the caller awaiting it. With an executor the batch runs
+    on its thread pool instead of the event loop. A non-zero max_queue_size makes submit raise
+    asyncio.QueueFull once that many requests are waiting.
+    """
+
+    def __init__(self, process_batch: Callable[[list], list], max_batch_size: int = 32, max_wait_ms: float = 5.0,
+        executor=None, max_queue_size: int = 0):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.executor = executor
+        self.max_queue_size = max_queue_size
+        self.queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self.batches = 0
+        self.requests = 0
+        self.max_queue_depth = 0
+        self.max_batch_seen = 0
+
+    async def start(self) -> None:
+        self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def submit(self, item: Any) -> Any:
+        """Queue a single request and wait for its share of the batch result."""
+        if self.queue is None:
+            raise RuntimeError("MicroBatcher has not been started")
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((item, future))
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        return await future
+
+    async def _collect(self) -> list:
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            # Requests whose callers already went away are dropped before the work starts
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                continue
+            try:
+                items = [item for item, _ in batch]
+                if self.executor is not None:
+                    results = await self.executor.run(self.process_batch, items)
+                else:
+                    results = self.process_batch(items)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+            self.batches += 1
+            self.requests += len(batch)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "max_queue_depth": self.max_queue_depth,
+            "batches": self.batches,
+            "requests": self.requests,
+            "avg_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "max_batch_size_seen": self.max_batch_seen,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "max_queue_size": self.max_queue_size,
+        }
@@ -0,0 +1,119 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+
+class RecommendationCache:
+    """
+    In-process LRU + TTL cache for recommendation responses.
+
+    Entries are evicted least-recently-used first once max_entries or max_bytes is exceeded,
+    and ignored once older than ttl_s. Concurrent requests for a key that is being computed
+    wait for that single computation instead of starting their own. Keys include the model
+    version, and a call with a new version drops every cached entry, so reloading a model
+    invalidates the cache without any extra bookkeeping.
+    """
+
+    def __init__(self, max_entries: int = 10_000, ttl_s: float = 300.0, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, tuple[float, int, Any]] = OrderedDict()
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self._bytes = 0
+        self._versions: dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(namespace: str, model_version: str, interactions: list[tuple[int, float]], **params) -> str:
+        """Hash the sorted (movie_id, rating) pairs with the request parameters and model version."""
+        pairs = sorted((int(movie_id), round(float(rating), 4)) for movie_id, rating in interactions)
+        payload = json.dumps([namespace, model_version, pairs, sorted(params.items())], separators=(",", ":"))
+        return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+    def ensure_version(self, namespace: str, model_version: str) -> None:
+        if self._versions.get(namespace, model_version) != model_version:
+            self.clear()
+        self._versions[namespace] = model_version
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def _get(self, key: str) -> tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, size, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self._bytes -= size
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def _put(self, key: str, value: Any) -> None:
+        # Serialised length is a cheap, stable proxy for the memory an entry holds
+        size = len(json.dumps(value, separators=(",", ":"), default=str))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+        self._entries[key] = (time.monotonic() + self.ttl_s, size, value)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        found, value = self._get(key)
+        if found:
+            self.hits += 1
+            return value
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting on it
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            self._put(key, value)
+            return value
+        finally:
+            del self._in_flight[key]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            "in_flight": len(self._in_flight),
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_s": self.ttl_s,
+        }
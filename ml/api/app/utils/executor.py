@@ -0,0 +1,70 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
+import torch
+
+
+class ExecutorSaturated(RuntimeError):
+    """Raised when the inference executor has no room for another job."""
+
+
+class InferenceExecutor:
+    """
+    Runs CPU-bound inference off the asyncio event loop on a bounded thread pool.
+
+    torch and FAISS release the GIL inside their kernels, so a small pool keeps the event
+    loop (and /health) responsive while models run. At most max_workers jobs run and
+    max_pending more wait; anything beyond that is rejected with ExecutorSaturated so callers
+    can shed load instead of queueing without bound. A job that outlives timeout_s raises
+    asyncio.TimeoutError for the caller; its slot is freed once the worker finishes.
+    """
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 32, timeout_s: float = 10.0,
+        torch_threads: int | None = None):
+        if torch_threads is not None:
+            # Intra-op threads are shared by every worker; pin them so workers x threads <= cores
+            torch.set_num_threads(torch_threads)
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        self.max_workers = max_workers
+        self.capacity = max_workers + max_pending
+        self.timeout_s = timeout_s
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            self.completed += 1
+
+    async def run(self, fn: Callable, *args, timeout_s: float | None = None, **kwargs) -> Any:
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                self.rejected += 1
+                raise ExecutorSaturated(f"Inference queue full ({self.capacity} jobs)")
+            self._in_flight += 1
+        future = self.pool.submit(partial(fn, *args, **kwargs))
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout_s or self.timeout_s)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise
+
+    def shutdown(self) -> None:
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self._in_flight,
+            "max_workers": self.max_workers,
+            "capacity": self.capacity,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "torch_threads": torch.get_num_threads(),
+        }
@@ -0,0 +1,169 @@
+"""
+Array-backed translation between TMDB IDs, MovieLens movie IDs and model item indices.
+
+The tables are a handful of .npy files that are memory-mapped at startup, replacing the
+string-keyed mid_map.json and the Python dicts built from links.csv. Build them once with:
+
+    python -m api.app.utils.id_map api/app/model_checkpoints/mid_map.json \
+        api/app/data/links.csv api/app/model_checkpoints/id_tables
+"""
+import argparse
+import json
+import os
+import shutil
+import numpy as np
+
+TABLES = ("tmdb_sorted", "tmdb_movie", "movie_to_index", "index_to_movie", "movie_to_tmdb")
+
+
+def _dense_lookup(keys: np.ndarray, values: np.ndarray, size: int, dtype) -> np.ndarray:
+    table = np.full(size, -1, dtype=dtype)
+    table[keys] = values
+    return table
+
+
+def _lookup(table: np.ndarray, keys) -> tuple[np.ndarray, np.ndarray]:
+    keys = np.asarray(keys, dtype=np.int64)
+    in_range = (keys >= 0) & (keys < len(table))
+    values = np.full(keys.shape, -1, dtype=np.int64)
+    values[in_range] = table[keys[in_range]]
+    return values, values >= 0
+
+
+class IdTranslator:
+    """
+    Vectorised ID translation in both directions.
+
+    Every method takes an array-like of IDs and returns (translated, found) where found is a
+    boolean mask; entries that could not be translated are -1 in the translated array.
+    """
+
+    def __init__(self, tables: dict[str, np.ndarray], meta: dict):
+        self.tmdb_sorted = tables["tmdb_sorted"]
+        self.tmdb_movie = tables["tmdb_movie"]
+        self._movie_to_index = tables["movie_to_index"]
+        self._index_to_movie = tables["index_to_movie"]
+        self._movie_to_tmdb = tables["movie_to_tmdb"]
+        self.meta = meta
+
+    @property
+    def num_items(self) -> int:
+        return len(self._index_to_movie)
+
+    @classmethod
+    def build(cls, mid_map: dict, links_path: str | None = None, meta: dict | None = None) -> "IdTranslator":
+        """
+        Build the tables from a movieId -> index map and, optionally, links.csv.
+
+        Args:
+            mid_map (dict): MovieLens movie ID (int or str) -> model item index.
+            links_path (str, optional): links.csv with movieId and tmdbId columns.
+            meta (dict, optional): Extra scalars (num_users, pos_weight, ...) stored alongside.
+        """
+        movie_ids = np.fromiter((int(k) for k in mid_map.keys()), dtype=np.int64, count=len(mid_map))
+        indices = np.fromiter(mid_map.values(), dtype=np.int64, count=len(mid_map))
+        index_to_movie = np.full(int(indices.max()) + 1 if len(indices) else 0, -1, dtype=np.int32)
+        index_to_movie[indices] = movie_ids
+
+        link_movies = np.zeros(0, dtype=np.int64)
+        link_tmdb = np.zeros(0, dtype=np.int64)
+        if links_path is not None:
+            import polars as pl
+            links = pl.read_csv(links_path, columns=["movieId", "tmdbId"]).drop_nulls()
+            link_movies = links["movieId"].to_numpy().astype(np.int64)
+            link_tmdb = links["tmdbId"].to_numpy().astype(np.int64)
+
+        # Several MovieLens entries can share a TMDB ID; like the dict it replaces, the last row wins
+        order = np.argsort(link_tmdb, kind="stable")
+        sorted_tmdb = link_tmdb[order]
+        last = np.r_[sorted_tmdb[1:] != sorted_tmdb[:-1], True] if len(sorted_tmdb) else np.zeros(0, dtype=bool)
+
+        max_movie = int(max(movie_ids.max(initial=0), link_movies.max(initial=0))) + 1
+        tables = {
+            "tmdb_sorted": sorted_tmdb[last],
+            "tmdb_movie": link_movies[order][last].astype(np.int32),
+            "movie_to_index": _dense_lookup(movie_ids, indices, max_movie, np.int32),
+            "index_to_movie": index_to_movie,
+            "movie_to_tmdb": _dense_lookup(link_movies, link_tmdb, max_movie, np.int64),
+        }
+        return cls(tables, meta or {})
+
+    def save(self, path: str) -> None:
+        """
+        Write the tables as .npy files, atomically: they are written to a temporary directory
+        that is renamed into place, so a directory at path is always complete.
+
+        Args:
+            path (str): Table directory; if it already exists (another worker built it first)
+                it is kept and the new tables are discarded.
+        """
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        os.makedirs(tmp_path, exist_ok=True)
+        for name, array in zip(TABLES, (self.tmdb_sorted, self.tmdb_movie, self._movie_to_index,
+                                        self._index_to_movie, self._movie_to_tmdb)):
+            np.save(os.path.join(tmp_path, f"{name}.npy"), array)
+        with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+            json.dump(self.meta, f)
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # Another worker wrote the tables first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            print(f"ID tables already present at {path}, keeping them")
+            return
+        print(f"ID tables saved to {path}")
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "IdTranslator":
+        tables = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+                  for name in TABLES}
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        return cls(tables, meta)
+
+    def tmdb_to_movie(self, tmdb_ids) -> tuple[np.ndarray, np.ndarray]:
+        tmdb_ids = np.asarray(tmdb_ids, dtype=np.int64)
+        pos = np.searchsorted(self.tmdb_sorted, tmdb_ids)
+        pos = np.minimum(pos, len(self.tmdb_sorted) - 1)
+        found = (self.tmdb_sorted[pos] == tmdb_ids) if len(self.tmdb_sorted) else np.zeros(tmdb_ids.shape, dtype=bool)
+        movie_ids = np.where(found, self.tmdb_movie[pos] if len(self.tmdb_movie) else -1, -1).astype(np.int64)
+        return movie_ids, found
+
+    def movie_to_tmdb(self, movie_ids) -> tuple[np.ndarray, np.ndarray]:
+        return _lookup(self._movie_to_tmdb, movie_ids)
+
+    def movie_to_index(self, movie_ids) -> tuple[np.ndarray, np.ndarray]:
+        return _lookup(self._movie_to_index, movie_ids)
+
+    def index_to_movie(self, indices) -> tuple[np.ndarray, np.ndarray]:
+        return _lookup(self._index_to_movie, indices)
+
+    def tmdb_to_index(self, tmdb_ids) -> tuple[np.ndarray, np.ndarray]:
+        movie_ids, found = self.tmdb_to_movie(tmdb_ids)
+        indices, in_model = self.movie_to_index(movie_ids)
+        return indices, found & in_model
+
+    def index_to_tmdb(self, indices) -> tuple[np.ndarray, np.ndarray]:
+        movie_ids, found = self.index_to_movie(indices)
+        tmdb_ids, linked = self.movie_to_tmdb(movie_ids)
+        return tmdb_ids, found & linked
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("mid_map", help="mid_map.json written at training time")
+    parser.add_argument("links", help="MovieLens links.csv")
+    parser.add_argument("output", help="directory for the .npy tables")
+    args = parser.parse_args()
+
+    with open(args.mid_map) as f:
+        metadata = json.load(f)
+    meta = {key: value for key, value in metadata.items() if key != "mid_map"}
+    translator = IdTranslator.build(metadata["mid_map"], args.links, meta)
+    # save() never overwrites a complete table directory, so clear the one being rebuilt
+    shutil.rmtree(args.output, ignore_errors=True)
+    translator.save(args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,115 @@
-import torch 
-from models.matrix_factorisation.trainer import MatrixFactorizationTrainer
+import os
+import numpy as np
+import torch
+from .id_map import IdTranslator
 
 class predictor:
 
-    def load_model(self,path:str,config,metadata:dict):
-        self.trainer=MatrixFactorizationTrainer()
-        config.update({"num_users":metadata.get("num_users", 0),
-                       "num_items":metadata.get("num_items", 0)})
-        self.trainer.build_for_inference(config)
-        self.trainer.load(path)
-        self.mid_map=metadata.get("mid_map", {})
-        self.rev_mid_map={v:int(k) for k,v in self.mid_map.items()}
-        self.pos_weight=metadata.get("pos_weight", 1.0)
-        return self.trainer.model
-    
-    def predict(self,movie_ids,ratings,k):
-        movie_ids=[self.mid_map[str(x)] for x in movie_ids]
-        movie_ids = torch.tensor(movie_ids, dtype=torch.long)
+    def load_model(self,path:str,config,metadata:dict,id_tables:IdTranslator|None=None):
+        """
+        Load either a serving bundle directory or a full training checkpoint.
+
+        Bundles (see models/matrix_factorisation/serving.py) only hold the item-side tensors,
+        so they load without allocating user tables or importing the training stack.
+        """
+        if os.path.isdir(path):
+            from models.matrix_factorisation.serving import MFServingModel
+            self.model=MFServingModel.load(path)
+            manifest=self.model.manifest
+            bundle_tables=os.path.join(path,"id_tables")
+            if id_tables is None and os.path.isdir(bundle_tables):
+                id_tables=IdTranslator.load(bundle_tables)
+            self.pos_weight=manifest.get("pos_weight",metadata.get("pos_weight", 1.0))
+            # A configured solver wins; otherwise the bundle's own ("ials" for iALS bundles)
+            self.fold_in=config.get("fold_in") or manifest.get("fold_in","irls")
+            version=manifest["model_version"]
+        else:
+            from models.matrix_factorisation.trainer import MatrixFactorizationTrainer
+            self.model=MatrixFactorizationTrainer()
+            config.update({"num_users":metadata.get("num_users", 0),
+                           "num_items":metadata.get("num_items", 0)})
+            self.model.build_for_inference(config)
+            self.model.load(path)
+            self.pos_weight=metadata.get("pos_weight", 1.0)
+            self.fold_in=config.get("fold_in") or "irls"
+            stat=os.stat(path)
+            version=f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+        # Prefer prebuilt memory-mapped tables; fall back to the JSON mid_map
+        self.id_tables=id_tables or IdTranslator.build(metadata.get("mid_map", {}))
+        self.model_version=f"{version}:{config.get('retrieval', 'exact')}:{config.get('quantization')}"
+        self.model.enable_quantized_scoring(config.get("quantization"),config.get("rerank_candidates",256))
+        self.ann_index=None
+        if config.get("retrieval", "exact")=="ann":
+            from models.matrix_factorisation.ann_index import MFAnnIndex
+            self.ann_index=MFAnnIndex.load(config["ann_index_path"])
+        return self.model
+
+    def _search_kwargs(self,nprobe,ef_search):
+        if self.ann_index is None:
+            return {}
+        return {"ann_index":self.ann_index,"nprobe":nprobe,"ef_search":ef_search}
+
+    def _to_indices(self,movie_ids):
+        indices,found=self.id_tables.movie_to_index(movie_ids)
+        if not found.all():
+            raise ValueError(f"Movie IDs not known to the model: {np.asarray(movie_ids)[~found].tolist()}")
+        return indices
+
+    def _to_movie_ids(self,scores,recommendations):
+        # Approximate retrieval pads with -1 when it finds fewer than k candidates
+        recommendations=np.asarray(recommendations)
+        keep=recommendations>=0
+        movie_ids,_=self.id_tables.index_to_movie(recommendations[keep])
+        return np.asarray(scores)[keep].tolist(),movie_ids.tolist()
+
+    def predict(self,movie_ids,ratings,k,fold_in:str|None=None,nprobe:int|None=None,ef_search:int|None=None):
+        """
+        Recommend movies for a cold-start user.
+
+        Args:
+            movie_ids (list[int]): MovieLens movie IDs the user rated.
+            ratings (list[float]): Ratings matching movie_ids.
+            k (int): Number of recommendations.
+            fold_in (str, optional): Fold-in solver ("irls", "lstsq", "ials" or "adam"); defaults to the configured one.
+            nprobe (int, optional): IVF lists to visit when serving from an ANN index.
+            ef_search (int, optional): HNSW beam width when serving from an ANN index.
+        """
+        movie_ids = torch.from_numpy(self._to_indices(movie_ids))
         ratings = torch.tensor(ratings, dtype=torch.float32)
-        recommendation_scores,recommendations,user_embedding=self.trainer.predict(movie_ids,ratings,k,self.pos_weight)
-        
-        recommendations = [(self.rev_mid_map[int(x)])for x in recommendations]
-        
-        return recommendation_scores.tolist(),recommendations,user_embedding.tolist()
\ No newline at end of file
+        recommendation_scores,recommendations,user_embedding=self.model.predict(movie_ids,ratings,k,self.pos_weight,
+                                                                                 fold_in=fold_in or self.fold_in,
+                                                                                 **self._search_kwargs(nprobe,ef_search))
+
+        recommendation_scores,recommendations=self._to_movie_ids(recommendation_scores,recommendations)
+
+        return recommendation_scores,recommendations,user_embedding.view(-1).tolist()
+
+    def predict_batch(self,profiles,k,fold_in:str|None=None,nprobe:int|None=None,ef_search:int|None=None):
+        """
+        Recommend movies for several cold-start users with one scoring pass.
+
+        Args:
+            profiles (list[tuple[list[int], list[float]]]): (MovieLens movie IDs, ratings) per user.
+            k (int): Number of recommendations per user.
+            fold_in (str, optional): Batched fold-in solver ("irls", "lstsq" or "ials").
+            nprobe (int, optional): IVF lists to visit when serving from an ANN index.
+            ef_search (int, optional): HNSW beam width when serving from an ANN index.
+
+        Returns:
+            list[tuple[list[float], list[int], list[float]]]: (scores, movie IDs, user embedding) per user.
+        """
+        fold_in=fold_in or self.fold_in
+        if fold_in=="adam":
+            return [self.predict(movie_ids,ratings,k,fold_in,nprobe,ef_search) for movie_ids,ratings in profiles]
+        # Translate every profile in one call, then split back per user
+        lengths=np.cumsum([len(movie_ids) for movie_ids,_ in profiles])[:-1]
+        flat=np.concatenate([np.asarray(movie_ids,dtype=np.int64) for movie_ids,_ in profiles])
+        item_ids=[x.tolist() for x in np.split(self._to_indices(flat),lengths)]
+        ratings=[list(ratings) for _,ratings in profiles]
+        scores,recommendations,user_embeddings=self.model.predict_batch(item_ids,ratings,k,self.pos_weight,fold_in=fold_in,
+                                                                          **self._search_kwargs(nprobe,ef_search))
+
+        return [
+            (*self._to_movie_ids(s,recs),emb.tolist())
+            for s,recs,emb in zip(scores,recommendations,user_embeddings)
+        ]
\ No newline at end of file
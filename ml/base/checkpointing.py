@@ -0,0 +1,126 @@
+"""
+Training checkpoints written in the background with atomic renames and a retention policy.
+
+save() copies the state to CPU memory on the calling thread, so training can carry on mutating the
+live tensors, and a single writer thread serialises the copy to '<file>.tmp', fsyncs it and renames
+it into place. A reader therefore only ever sees complete checkpoints. After every write the writer
+updates '<prefix>_checkpoints.json' (epoch, metric and file of each checkpoint kept) and deletes the
+files that fall outside keep_last / keep_best.
+"""
+import json
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict
+import torch
+
+CHECKPOINT_FORMAT_VERSION = 1
+
+
+def snapshot(state: Any) -> Any:
+    """Deep copy of a (nested) state with every tensor detached, cloned and moved to CPU"""
+    if isinstance(state, torch.Tensor):
+        return state.detach().to('cpu', copy=True)
+    if isinstance(state, dict):
+        return {key: snapshot(value) for key, value in state.items()}
+    if isinstance(state, (list, tuple)):
+        return type(state)(snapshot(value) for value in state)
+    return state
+
+
+def model_state_dict(checkpoint: Dict[str, Any]) -> Dict[str, torch.Tensor]:
+    """Model weights from either a plain state_dict or a full training checkpoint"""
+    if 'checkpoint_format_version' in checkpoint:
+        return checkpoint['model']
+    return checkpoint
+
+
+class AsyncCheckpointer:
+    def __init__(self, directory: str, prefix: str, keep_last: int = 3, keep_best: int = 1):
+        """
+        Args:
+            directory (str): Directory the checkpoints and their manifest are written to.
+            prefix (str): File name prefix, e.g. the model name.
+            keep_last (int): Most recent checkpoints to keep.
+            keep_best (int): Checkpoints with the lowest metric to keep, in addition to the last ones.
+        """
+        self.directory = directory
+        self.prefix = prefix
+        self.keep_last = keep_last
+        self.keep_best = keep_best
+        self.manifest_path = os.path.join(directory, f"{prefix}_checkpoints.json")
+        self.entries = self._read_manifest()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='checkpoint')
+        self._pending: Future | None = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _read_manifest(self) -> list[dict]:
+        if not os.path.exists(self.manifest_path):
+            return []
+        with open(self.manifest_path) as f:
+            return json.load(f)['checkpoints']
+
+    def save(self, state: Dict[str, Any], epoch: int, metric: float | None = None) -> str:
+        """
+        Snapshot state and write it in the background.
+
+        Waits for the previous write first, so at most one snapshot is held in memory besides the
+        live state, and re-raises any error from it.
+
+        Args:
+            state (Dict[str, Any]): Checkpoint contents; tensors may live on any device.
+            epoch (int): Epoch the state was taken after, used in the file name.
+            metric (float | None): Value ranked by keep_best, lower is better.
+
+        Returns:
+            str: Path the checkpoint will be written to.
+        """
+        self.wait()
+        path = os.path.join(self.directory, f"{self.prefix}_checkpoint_epoch_{epoch}.pth")
+        state = {'checkpoint_format_version': CHECKPOINT_FORMAT_VERSION, **snapshot(state)}
+        self._pending = self._executor.submit(self._write, state, path, epoch, metric)
+        return path
+
+    def _write(self, state: Dict[str, Any], path: str, epoch: int, metric: float | None) -> None:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            torch.save(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        self.entries = [entry for entry in self.entries if entry['epoch'] != epoch]
+        self.entries.append({'epoch': epoch, 'metric': metric, 'file': os.path.basename(path)})
+        self.entries.sort(key=lambda entry: entry['epoch'])
+        kept = {entry['file'] for entry in self.entries[-self.keep_last:]} if self.keep_last > 0 else set()
+        ranked = sorted((entry for entry in self.entries if entry['metric'] is not None), key=lambda entry: entry['metric'])
+        kept.update(entry['file'] for entry in ranked[:self.keep_best])
+        removed = [entry for entry in self.entries if entry['file'] not in kept]
+        self.entries = [entry for entry in self.entries if entry['file'] in kept]
+
+        # The manifest only ever lists files that exist: it is replaced before anything is deleted
+        tmp_manifest = f"{self.manifest_path}.tmp"
+        with open(tmp_manifest, 'w') as f:
+            json.dump({'checkpoints': self.entries}, f, indent=2)
+        os.replace(tmp_manifest, self.manifest_path)
+        for entry in removed:
+            try:
+                os.remove(os.path.join(self.directory, entry['file']))
+            except FileNotFoundError:
+                pass
+
+    def wait(self) -> None:
+        """Block until the pending write has finished, re-raising its error if it failed"""
+        if self._pending is not None:
+            pending, self._pending = self._pending, None
+            pending.result()
+
+    def latest(self) -> str | None:
+        """Path of the most recent checkpoint listed in the manifest, if any"""
+        self.wait()
+        if not self.entries:
+            return None
+        return os.path.join(self.directory, self.entries[-1]['file'])
+
+    def close(self) -> None:
+        self.wait()
+        self._executor.shutdown()
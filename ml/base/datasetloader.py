@@ -1,32 +1,103 @@
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
 import torch
 import polars as pl
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import Dataset, DataLoader, Sampler
 from typing import Tuple, Dict
 
+CACHE_FORMAT_VERSION = 1
+
+
 class RecommenderDataset(Dataset):
     def __init__(self, data: pl.DataFrame):
         """
         Initialize the dataset with a Polars DataFrame.
 
+        The columns are kept as contiguous tensors (int32 IDs, float32 ratings) rather than Python
+        lists, so a whole batch is gathered with one index operation.
+
         Args:
             data (polars.DataFrame): DataFrame containing user-item interactions.
         """
-        self.user_ids = data['user_id'].to_list()
-        self.movie_ids = data['movie_id'].to_list()
-        self.ratings = data['rating'].to_list()
+        self.user_ids = self._column(data, 'user_id', pl.Int32)
+        self.movie_ids = self._column(data, 'movie_id', pl.Int32)
+        self.ratings = self._column(data, 'rating', pl.Float32)
+
+    @staticmethod
+    def _column(data: pl.DataFrame, name: str, dtype: pl.DataType) -> torch.Tensor:
+        # One copy out of Arrow: a zero-copy view would be read-only, which torch.from_numpy warns
+        # about since the tensor could then write to immutable memory
+        return torch.from_numpy(data[name].cast(dtype).to_numpy(writable=True))
 
     def __len__(self):
         return len(self.user_ids)
 
     def __getitem__(self, idx):
-        
-        user_id = torch.tensor(self.user_ids[idx], dtype=torch.long)
-        movie_id = torch.tensor(self.movie_ids[idx], dtype=torch.long)
-        rating = torch.tensor(self.ratings[idx], dtype=torch.float32)
-        return user_id, movie_id, rating
-    
+        """
+        Get one interaction, or a whole batch when idx is a tensor or list of indices.
+
+        Returns:
+            Tuple[torch.Tensor, torch.Tensor, torch.Tensor]: User IDs and movie IDs (int64) and ratings (float32).
+        """
+        return self.user_ids[idx].long(), self.movie_ids[idx].long(), self.ratings[idx]
+
+
+class TensorBatchSampler(Sampler):
+    def __init__(self, num_samples: int, batch_size: int, shuffle: bool = True, drop_last: bool = False,
+                 rank: int = 0, world_size: int = 1, seed: int = 42):
+        """
+        Yield batches of indices as slices of one permutation per epoch.
+
+        Used with DataLoader(batch_size=None) so every batch is a single gather from
+        RecommenderDataset, with no per-sample calls, collation or worker processes.
+
+        Args:
+            num_samples (int): Number of samples in the dataset.
+            batch_size (int): Number of indices per batch.
+            shuffle (bool): Whether to draw a new permutation each epoch.
+            drop_last (bool): Whether to drop the last incomplete batch.
+            rank (int): Rank of this process in data-parallel training.
+            world_size (int): Number of data-parallel processes. Every rank draws the same seeded
+                permutation and takes an equal, disjoint share of it.
+            seed (int): Seed of the shared permutation when world_size > 1.
+        """
+        self.num_samples = num_samples
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.rank = rank
+        self.world_size = world_size
+        self.seed = seed
+        self.epoch = 0
+
+    def __iter__(self):
+        if not self.shuffle:
+            order = torch.arange(self.num_samples)
+        elif self.world_size == 1:
+            order = torch.randperm(self.num_samples)
+        else:
+            generator = torch.Generator().manual_seed(self.seed + self.epoch)
+            order = torch.randperm(self.num_samples, generator=generator)
+        self.epoch += 1
+        # Ranks must run the same number of steps, so the remainder after an even split is dropped
+        per_rank = self.num_samples // self.world_size
+        order = order[self.rank * per_rank:(self.rank + 1) * per_rank] if self.world_size > 1 else order
+        for start in range(0, len(self) * self.batch_size, self.batch_size):
+            yield order[start:start + self.batch_size]
+
+    def __len__(self):
+        num_samples = self.num_samples // self.world_size
+        if self.drop_last:
+            return num_samples // self.batch_size
+        return (num_samples + self.batch_size - 1) // self.batch_size
+
+
 class DatasetLoader:
-    def __init__(self,path:str,dataset_type:str="csv",separator:str=",",val_ratio:float=0.1,test_ratio:float=0.2,batch_size:int =64, binarize:bool=False,min_rating:int=1):
+    def __init__(self,path:str,dataset_type:str="csv",separator:str=",",val_ratio:float=0.1,test_ratio:float=0.2,batch_size:int =64, binarize:bool=False,min_rating:int=1,
+                 cache_dir:str|None=None,seed:int=42):
         """
         Initialize the DatasetLoader.
 
@@ -35,11 +106,24 @@ class DatasetLoader:
             dataset_type (str): Type of dataset file (e.g., 'csv', 'parquet').
             batch_size (int): Batch size for DataLoader.
             binarize (bool): Whether to binarize the ratings.
+            cache_dir (str | None): Directory for the preprocessed-dataset cache; None disables caching.
+            seed (int): Seed of the shuffle that defines the train/val/test split.
         """
         if dataset_type not in ["csv", "parquet"]:
             raise ValueError("Unsupported dataset type. Use 'csv' or 'parquet'.")
         
-        self._uid_map,self._mid_map,self.data= self.load_data(path, dataset_type,separator,binarize,min_rating)
+        self.seed = seed
+        self.cache_key = self.fingerprint(path, dataset_type, separator, binarize, min_rating, seed)
+        cache_path = os.path.join(cache_dir, self.cache_key) if cache_dir else None
+        if cache_path and os.path.exists(os.path.join(cache_path, "meta.json")):
+            self.user_index, self.movie_index, self.data = self.load_cache(cache_path)
+            print(f"Loaded preprocessed dataset from {cache_path}")
+        else:
+            self.user_index, self.movie_index, self.data = self.load_data(path, dataset_type, separator, binarize, min_rating, seed)
+            if cache_path:
+                self.save_cache(cache_path, path)
+        self._uid_map = dict(zip(self.user_index.tolist(), range(len(self.user_index))))
+        self._mid_map = dict(zip(self.movie_index.tolist(), range(len(self.movie_index))))
         self.batch_size = batch_size
         self.val_ratio = val_ratio
         self.test_ratio = test_ratio
@@ -47,20 +131,37 @@ class DatasetLoader:
         self.num_items = len(self._mid_map) 
         self.train_data, self.val_data, self.test_data = self.split_data()
 
+    @staticmethod
+    def fingerprint(path: str, dataset_type: str, separator: str, binarize: bool, min_rating: int, seed: int) -> str:
+        """
+        Hash the source file's content and the preprocessing options into a cache key.
 
+        Returns:
+            str: Hex digest identifying the preprocessed dataset.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 24), b""):
+                digest.update(chunk)
+        options = {"format_version": CACHE_FORMAT_VERSION, "dataset_type": dataset_type, "separator": separator,
+                   "binarize": binarize, "min_rating": min_rating, "seed": seed}
+        digest.update(json.dumps(options, sort_keys=True).encode())
+        return digest.hexdigest()
 
-    def load_data(self, path: str, dataset_type: str, separator:str , binarize: bool, min_rating: int) -> Tuple[Dict, Dict, pl.DataFrame]:
+    def load_data(self, path: str, dataset_type: str, separator:str , binarize: bool, min_rating: int, seed: int = 42) -> Tuple[np.ndarray, np.ndarray, pl.DataFrame]:
         """
-        Load the dataset from a file.
+        Load the dataset from a file, encode the IDs and shuffle the rows once.
 
         Args:
             path (str): Path to the dataset file.
             dataset_type (str): Type of dataset file (e.g., 'csv', 'parquet').
             binarize (bool): Whether to binarize the ratings.
             min_rating (int): Minimum rating for binarization.
+            seed (int): Seed of the row shuffle.
 
         Returns:
-            polars.DataFrame: Loaded dataset as a Polars DataFrame.
+            Tuple[np.ndarray, np.ndarray, pl.DataFrame]: Sorted raw user and movie IDs (position = encoded index),
+                and the encoded, shuffled interactions.
         """
         if dataset_type == "parquet":
             data = pl.read_parquet(path)
@@ -75,24 +176,63 @@ class DatasetLoader:
             data = data.with_columns(
                 pl.when(pl.col('rating') >= min_rating).then(1).otherwise(0).alias('rating')
             )
-        unique_users = data.get_column("user_id").unique().to_list()
-        unique_movies = data.get_column("movie_id").unique().to_list()
-        uid_map= {uid: i for i, uid in enumerate(unique_users)}
-        mid_map= {mid: i for i, mid in enumerate(unique_movies)}
-
-        data = data.with_columns(
-            pl.col('user_id').replace(uid_map).alias('user_id'),
-            pl.col('movie_id').replace(mid_map).alias('movie_id')
-        )        
-        
-        return uid_map,mid_map,data 
+        user_index = data.get_column("user_id").unique().sort().to_numpy()
+        movie_index = data.get_column("movie_id").unique().sort().to_numpy()
 
+        # Dense ranks of the raw IDs are their positions in the sorted unique arrays
+        data = data.select(
+            (pl.col('user_id').rank('dense') - 1).cast(pl.Int32).alias('user_id'),
+            (pl.col('movie_id').rank('dense') - 1).cast(pl.Int32).alias('movie_id'),
+            pl.col('rating').cast(pl.Float32),
+        ).sample(fraction=1.0, shuffle=True, seed=seed)
         
+        return user_index, movie_index, data
+
+    def save_cache(self, cache_path: str, source_path: str) -> None:
+        """
+        Write the encoded interactions and ID arrays as .npy files, atomically.
+
+        Args:
+            cache_path (str): Cache entry directory, named after the cache key.
+            source_path (str): Dataset file the entry was built from, recorded in meta.json.
+        """
+        tmp_path = f"{cache_path}.tmp-{os.getpid()}"
+        os.makedirs(tmp_path, exist_ok=True)
+        for name in ("user_id", "movie_id", "rating"):
+            np.save(os.path.join(tmp_path, f"{name}.npy"), self.data[name].to_numpy())
+        np.save(os.path.join(tmp_path, "user_index.npy"), self.user_index)
+        np.save(os.path.join(tmp_path, "movie_index.npy"), self.movie_index)
+        with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+            json.dump({"cache_key": self.cache_key, "source": os.path.abspath(source_path), "num_rows": len(self.data),
+                       "num_users": len(self.user_index), "num_items": len(self.movie_index)}, f, indent=2)
+        try:
+            os.rename(tmp_path, cache_path)
+        except OSError:
+            # Another run wrote the same entry first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        print(f"Cached preprocessed dataset to {cache_path}")
+
+    @staticmethod
+    def load_cache(cache_path: str) -> Tuple[np.ndarray, np.ndarray, pl.DataFrame]:
+        """
+        Memory-map a cache entry written by save_cache.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, pl.DataFrame]: Same as load_data.
+        """
+        columns = {name: np.load(os.path.join(cache_path, f"{name}.npy"), mmap_mode="r")
+                   for name in ("user_id", "movie_id", "rating")}
+        return (np.load(os.path.join(cache_path, "user_index.npy")),
+                np.load(os.path.join(cache_path, "movie_index.npy")),
+                pl.DataFrame(columns))
            
     def split_data(self) -> Tuple[Dataset, Dataset, Dataset]:
         """
         Split the dataset into training, validation, and test sets.
 
+        The rows were shuffled once by load_data, so the splits are contiguous ranges and are the
+        same on every run (and cache hit) with the same seed.
+
         Returns:
             Tuple[Dataset, Dataset, Dataset]: Training, validation, and test datasets.
         """
@@ -100,24 +240,32 @@ class DatasetLoader:
         train_end = int(n * (1 - self.val_ratio - self.test_ratio))
         val_end = int(n * (1 - self.test_ratio))
 
-        data=self.data.sample(fraction=1.0,shuffle=True)  # Shuffle the data before splitting
-        train_data = data[:train_end]
-        val_data = data[train_end:val_end]
-        test_data = data[val_end:]
+        train_data = self.data[:train_end]
+        val_data = self.data[train_end:val_end]
+        test_data = self.data[val_end:]
 
         return RecommenderDataset(train_data), RecommenderDataset(val_data), RecommenderDataset(test_data)
     
-    def get_dataloader(self, dataset: Dataset,batch_size:int=64,num_workers:int =2) -> DataLoader:
+    def get_dataloader(self, dataset: Dataset, batch_size: int | None = None, shuffle: bool = True,
+                       rank: int = 0, world_size: int = 1) -> DataLoader:
         """
         Get a DataLoader for the given dataset.
 
+        Batches are sliced from the dataset's tensors in the main process (see TensorBatchSampler).
+
         Args:
             dataset (Dataset): The dataset to create a DataLoader for.
+            batch_size (int | None): Batch size, defaults to the loader's batch_size.
+            shuffle (bool): Whether to reshuffle the data every epoch.
+            rank (int): Rank of this process in data-parallel training.
+            world_size (int): Number of data-parallel processes; each gets a disjoint shard of the data.
 
         Returns:
             DataLoader: DataLoader for the dataset.
         """
-        return DataLoader(dataset, batch_size=self.batch_size, shuffle=True,num_workers=num_workers,persistent_workers=True)
+        sampler = TensorBatchSampler(len(dataset), batch_size or self.batch_size, shuffle=shuffle,
+                                     rank=rank, world_size=world_size, seed=self.seed)
+        return DataLoader(dataset, sampler=sampler, batch_size=None)
     
     @property
     def uid_map(self) -> Dict:
@@ -0,0 +1,219 @@
+"""
+Top-k ranking metrics over the full catalog: recall@k, NDCG@k, MAP@k and catalog coverage@k.
+
+Users are evaluated in blocks. Each block is scored against every item with one call to a model's
+score function (a single GEMM for MF), the items the user already rated are masked to -inf, one
+batched top-k is taken at the largest k, and every metric is computed from the (B, k) hit matrix
+without a per-user Python loop. Peak memory is one (block_size, num_items) float32 score matrix
+on top of the held-out and already-rated matrices; for sharded datasets those are built for one
+range of users at a time (holdout_partitions), so evaluation does not load the whole dataset.
+"""
+import numpy as np
+import scipy.sparse as sp
+import torch
+from typing import Callable, Dict, Iterable, Iterator, Tuple
+
+
+def rating_matrix(batches: Iterable[Tuple[torch.Tensor, torch.Tensor, torch.Tensor]], num_users: int,
+                  num_items: int, min_rating: float | None = None) -> sp.csr_matrix:
+    """
+    Collect (user, item, rating) batches into a CSR matrix valued by rating.
+
+    Args:
+        batches: Batches as yielded by DatasetLoader.get_dataloader or ShardedDatasetLoader.get_dataloader.
+        num_users (int): Number of users.
+        num_items (int): Number of items.
+        min_rating (float | None): Keep only ratings at or above this; None keeps everything.
+
+    Returns:
+        sp.csr_matrix: (num_users, num_items) matrix with sorted indices.
+    """
+    users, items, ratings = [], [], []
+    for user_ids, item_ids, batch_ratings in batches:
+        keep = batch_ratings >= min_rating if min_rating is not None else torch.ones_like(batch_ratings, dtype=torch.bool)
+        users.append(user_ids[keep].numpy())
+        items.append(item_ids[keep].numpy())
+        ratings.append(batch_ratings[keep].numpy().astype(np.float32))
+    if not users:
+        return sp.csr_matrix((num_users, num_items), dtype=np.float32)
+    matrix = sp.csr_matrix((np.concatenate(ratings), (np.concatenate(users), np.concatenate(items))),
+                           shape=(num_users, num_items))
+    matrix.sort_indices()
+    return matrix
+
+
+def holdout_matrices(loader, held_out, seen: list, relevant_rating: float,
+                     batch_size: int = 1 << 20) -> Tuple[sp.csr_matrix, sp.csr_matrix]:
+    """
+    Relevant and already-rated matrices for evaluating on a held-out split.
+
+    Every rating of the splits is collected into memory, so this is for DatasetLoader; use
+    holdout_partitions for ShardedDatasetLoader.
+
+    Args:
+        loader: DatasetLoader or ShardedDatasetLoader the splits come from.
+        held_out: Split whose ratings at or above relevant_rating are the relevant items.
+        seen (list): Splits whose ratings (any value) are masked, e.g. [train] or [train, val].
+        relevant_rating (float): Held-out ratings counted as relevant (1 for binarized data).
+        batch_size (int): Rows read per batch while collecting the splits.
+
+    Returns:
+        Tuple[sp.csr_matrix, sp.csr_matrix]: (relevant, seen) matrices of shape (num_users, num_items).
+    """
+    collect = lambda data, min_rating=None: rating_matrix(
+        loader.get_dataloader(data, batch_size=batch_size, shuffle=False), loader.num_users, loader.num_items, min_rating)
+    relevant = collect(held_out, relevant_rating)
+    seen_matrix = collect(seen[0])
+    for data in seen[1:]:
+        seen_matrix = seen_matrix + collect(data)
+    return relevant, seen_matrix.tocsr()
+
+
+def holdout_partitions(loader, held_out, seen: list, relevant_rating: float,
+                       users_per_partition: int = 50_000) -> Iterator[Tuple[int, sp.csr_matrix, sp.csr_matrix]]:
+    """
+    holdout_matrices for consecutive ranges of users of a ShardedDatasetLoader, one range at a time.
+
+    Each range is one filtered scan of the shards per split, so memory is bounded by the ratings of
+    users_per_partition users, and the shards are read once per range and split.
+
+    Args:
+        loader: ShardedDatasetLoader the splits come from.
+        held_out: Split whose ratings at or above relevant_rating are the relevant items.
+        seen (list): Splits whose ratings (any value) are masked.
+        relevant_rating (float): Held-out ratings counted as relevant.
+        users_per_partition (int): Users per range.
+
+    Yields:
+        Tuple[int, sp.csr_matrix, sp.csr_matrix]: First user of the range and its (relevant, seen)
+        matrices, with one row per user of the range (see RankingEvaluator's user_offset).
+    """
+    for first in range(0, loader.num_users, users_per_partition):
+        last = min(first + users_per_partition, loader.num_users)
+
+        def collect(data, min_rating=None) -> sp.csr_matrix:
+            users, items, ratings = data.read_users(first, last)
+            keep = ratings >= min_rating if min_rating is not None else np.ones(len(ratings), dtype=bool)
+            matrix = sp.csr_matrix((ratings[keep].astype(np.float32), (users[keep] - first, items[keep])),
+                                   shape=(last - first, loader.num_items))
+            matrix.sort_indices()
+            return matrix
+
+        relevant = collect(held_out, relevant_rating)
+        seen_matrix = collect(seen[0])
+        for data in seen[1:]:
+            seen_matrix = seen_matrix + collect(data)
+        yield first, relevant, seen_matrix.tocsr()
+
+
+class RankingEvaluator:
+    def __init__(self, relevant: sp.csr_matrix, seen: sp.csr_matrix | None = None, ks: Tuple[int, ...] = (10, 20),
+                 block_size: int = 512, user_offset: int = 0):
+        """
+        Args:
+            relevant (sp.csr_matrix): (num_users, num_items) held-out items each user liked.
+            seen (sp.csr_matrix, optional): Items each user already rated (e.g. the training split),
+                never recommended and so never counted as hits or misses.
+            ks (Tuple[int, ...]): Cut-offs to report.
+            block_size (int): Users scored per block.
+            user_offset (int): User index of the first row of relevant and seen, when they only
+                cover a range of users; score_fn is always called with full user indices.
+        """
+        self.relevant = relevant.tocsr()
+        self.relevant.sort_indices()
+        self.seen = seen.tocsr() if seen is not None else None
+        self.ks = tuple(sorted(ks))
+        self.block_size = block_size
+        self.num_items = relevant.shape[1]
+        self.user_offset = user_offset
+        # Only users with at least one held-out positive have a defined recall/NDCG/MAP
+        self.users = np.flatnonzero(np.diff(self.relevant.indptr))
+
+    @staticmethod
+    def _rows(matrix: sp.csr_matrix) -> Tuple[torch.Tensor, torch.Tensor]:
+        """(row within block, column) index pairs of a CSR block"""
+        counts = torch.from_numpy(np.diff(matrix.indptr).astype(np.int64))
+        rows = torch.repeat_interleave(torch.arange(len(counts)), counts)
+        return rows, torch.from_numpy(matrix.indices.astype(np.int64))
+
+    def accumulate(self, score_fn: Callable[[np.ndarray], torch.Tensor], rank: int = 0,
+                   world_size: int = 1) -> Dict[str, torch.Tensor]:
+        """
+        Sum the per-user metrics over this rank's share of the users.
+
+        Args:
+            score_fn: Maps a block of user indices to a (B, num_items) float score tensor. The
+                tensor is modified in place, so it must not be a view of model state.
+            rank (int): Rank of this process; users rank::world_size are evaluated here.
+            world_size (int): Number of processes sharing the evaluation.
+
+        Returns:
+            Dict[str, torch.Tensor]: Metric sums, user count and per-k recommended-item counts,
+            which can be summed across user partitions and all-reduced with SUM across ranks
+            before summarize().
+        """
+        users = self.users[rank::world_size]
+        max_k = min(self.ks[-1], self.num_items)
+        discount = 1.0 / torch.log2(torch.arange(2, max_k + 2, dtype=torch.float64))
+        ideal = discount.cumsum(0)
+        positions = torch.arange(1, max_k + 1, dtype=torch.float64)
+        totals = {'users': torch.tensor(float(len(users)), dtype=torch.float64)}
+        for k in self.ks:
+            totals.update({f'recall@{k}': torch.zeros((), dtype=torch.float64),
+                           f'ndcg@{k}': torch.zeros((), dtype=torch.float64),
+                           f'map@{k}': torch.zeros((), dtype=torch.float64),
+                           f'recommended@{k}': torch.zeros(self.num_items, dtype=torch.float64)})
+
+        for start in range(0, len(users), self.block_size):
+            block = users[start:start + self.block_size]
+            scores = score_fn(block + self.user_offset).float()
+            if self.seen is not None:
+                rows, cols = self._rows(self.seen[block])
+                scores[rows, cols] = float('-inf')
+            top_ids = scores.topk(max_k, dim=1).indices
+
+            # Hits by binary search of (row, item) keys in the sorted relevant entries
+            relevant = self.relevant[block]
+            rows, cols = self._rows(relevant)
+            keys = rows * self.num_items + cols
+            top_keys = torch.arange(len(block)).unsqueeze(1) * self.num_items + top_ids
+            found = torch.searchsorted(keys, top_keys).clamp_(max=len(keys) - 1)
+            hits = (keys[found] == top_keys).double()
+            num_relevant = torch.from_numpy(np.diff(relevant.indptr)).double()
+
+            for k in self.ks:
+                k_hits = hits[:, :k]
+                capped = num_relevant.clamp(max=k)
+                totals[f'recall@{k}'] += (k_hits.sum(dim=1) / capped).sum()
+                dcg = (k_hits * discount[:k]).sum(dim=1)
+                totals[f'ndcg@{k}'] += (dcg / ideal[capped.long() - 1]).sum()
+                precision = k_hits.cumsum(dim=1) / positions[:k]
+                totals[f'map@{k}'] += ((precision * k_hits).sum(dim=1) / capped).sum()
+                totals[f'recommended@{k}'].index_fill_(0, top_ids[:, :k].reshape(-1), 1.0)
+        return totals
+
+    def summarize(self, totals: Dict[str, torch.Tensor]) -> Dict[str, float]:
+        """Turn (possibly all-reduced) sums from accumulate() into averages and coverage"""
+        num_users = max(totals['users'].item(), 1.0)
+        metrics = {'ranking_users': int(totals['users'].item())}
+        for k in self.ks:
+            metrics[f'recall@{k}'] = totals[f'recall@{k}'].item() / num_users
+            metrics[f'ndcg@{k}'] = totals[f'ndcg@{k}'].item() / num_users
+            metrics[f'map@{k}'] = totals[f'map@{k}'].item() / num_users
+            metrics[f'coverage@{k}'] = (totals[f'recommended@{k}'] > 0).sum().item() / self.num_items
+        return metrics
+
+    def evaluate(self, score_fn: Callable[[np.ndarray], torch.Tensor]) -> Dict[str, float]:
+        """
+        Rank the full catalog for every user with a held-out positive.
+
+        Recall and MAP are normalised by min(k, number of relevant items), so 1.0 is attainable.
+
+        Args:
+            score_fn: Maps a block of user indices to a (B, num_items) float score tensor.
+
+        Returns:
+            Dict[str, float]: recall@k, ndcg@k, map@k and coverage@k for every k, and the number
+            of users evaluated.
+        """
+        return self.summarize(self.accumulate(score_fn))
@@ -0,0 +1,325 @@
+"""
+Sharded on-disk ratings and a streaming loader for datasets larger than RAM.
+
+write_shards converts a ratings CSV/Parquet file into Parquet shards of encoded interactions without
+loading it eagerly. ShardedDatasetLoader reads them back one shard at a time with the same interface
+as DatasetLoader, so MatrixFactorizationTrainer trains on it unchanged (dataset_type "shards").
+Convert once from the ml/ directory:
+
+    python -m base.sharded_dataset data/ml-32m/ratings.csv data/ml-32m/shards
+"""
+import argparse
+import copy
+import json
+import os
+import tempfile
+import numpy as np
+import polars as pl
+import torch
+from torch.utils.data import DataLoader, IterableDataset
+from typing import Dict, Iterator, Tuple
+
+NUM_BUCKETS = 10_000
+
+
+def split_buckets(user_ids: np.ndarray, movie_ids: np.ndarray) -> np.ndarray:
+    """
+    Hash raw (user, movie) pairs into NUM_BUCKETS buckets that fix train/val/test membership.
+
+    Uses the splitmix64 finalizer in NumPy, so the buckets do not depend on the polars version or on
+    how the IDs are encoded.
+
+    Args:
+        user_ids (np.ndarray): Raw user IDs.
+        movie_ids (np.ndarray): Raw movie IDs.
+
+    Returns:
+        np.ndarray: uint16 bucket per interaction.
+    """
+    x = (user_ids.astype(np.uint64) << np.uint64(32)) ^ movie_ids.astype(np.uint64)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    x = x ^ (x >> np.uint64(31))
+    return (x % np.uint64(NUM_BUCKETS)).astype(np.uint16)
+
+
+def write_shards(path: str, output_dir: str, dataset_type: str = "csv", separator: str = ",",
+                 shard_rows: int = 1_000_000) -> dict:
+    """
+    Convert a ratings file into encoded Parquet shards with streaming polars queries.
+
+    Only the unique user and movie IDs and one shard are held in memory at a time. Ratings are kept
+    raw; binarization happens when the shards are read.
+
+    Args:
+        path (str): Ratings file with user, movie, rating and timestamp columns.
+        output_dir (str): Directory to write the shards and manifest to.
+        dataset_type (str): Type of the ratings file ('csv' or 'parquet').
+        separator (str): CSV field separator.
+        shard_rows (int): Interactions per shard.
+
+    Returns:
+        dict: The manifest written to output_dir/manifest.json.
+    """
+    if dataset_type not in ["csv", "parquet"]:
+        raise ValueError("Unsupported dataset type. Use 'csv' or 'parquet'.")
+    os.makedirs(output_dir, exist_ok=True)
+    columns = ["user_id", "movie_id", "rating", "timestamp"]
+
+    with tempfile.TemporaryDirectory(dir=output_dir) as tmp:
+        if dataset_type == "csv":
+            # Parquet row groups make the per-shard slices below cheap; CSV would be re-parsed per slice
+            source = os.path.join(tmp, "ratings.parquet")
+            pl.scan_csv(path, separator=separator, has_header=True, new_columns=columns) \
+                .select("user_id", "movie_id", "rating").sink_parquet(source)
+        else:
+            source = path
+        ratings = pl.scan_parquet(source).select("user_id", "movie_id", "rating")
+
+        user_index = ratings.select(pl.col("user_id").unique().sort()).collect(engine="streaming")["user_id"].to_numpy()
+        movie_index = ratings.select(pl.col("movie_id").unique().sort()).collect(engine="streaming")["movie_id"].to_numpy()
+        num_rows = ratings.select(pl.len()).collect().item()
+
+        shards = []
+        bucket_counts = []
+        for offset in range(0, num_rows, shard_rows):
+            chunk = ratings.slice(offset, shard_rows).collect()
+            users, movies = chunk["user_id"].to_numpy(), chunk["movie_id"].to_numpy()
+            buckets = split_buckets(users, movies)
+            name = f"part-{len(shards):05d}.parquet"
+            pl.DataFrame({
+                "user_id": np.searchsorted(user_index, users).astype(np.int32),
+                "movie_id": np.searchsorted(movie_index, movies).astype(np.int32),
+                "rating": chunk["rating"].cast(pl.Float32),
+                "bucket": buckets,
+            }).write_parquet(os.path.join(output_dir, name))
+            shards.append({"file": name, "num_rows": len(chunk)})
+            bucket_counts.append(np.bincount(buckets, minlength=NUM_BUCKETS))
+            print(f"Wrote {name} ({offset + len(chunk)}/{num_rows} rows)")
+
+    np.save(os.path.join(output_dir, "user_index.npy"), user_index)
+    np.save(os.path.join(output_dir, "movie_index.npy"), movie_index)
+    np.save(os.path.join(output_dir, "bucket_counts.npy"), np.stack(bucket_counts))
+    manifest = {"source": os.path.abspath(path), "num_rows": num_rows, "num_users": len(user_index),
+                "num_items": len(movie_index), "num_buckets": NUM_BUCKETS, "shards": shards}
+    with open(os.path.join(output_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+class ShardedRecommenderDataset(IterableDataset):
+    def __init__(self, path: str, shards: list[dict], bucket_counts: np.ndarray, bucket_range: Tuple[int, int],
+                 binarize: bool = False, min_rating: int = 1, batch_size: int = 64, shuffle: bool = True,
+                 buffer_size: int = 2_000_000, seed: int = 42):
+        """
+        Stream one split of a sharded dataset as ready-made batches.
+
+        Shards are visited in a new random order every epoch, and rows are shuffled within a buffer
+        spanning several shards, so memory use is bounded by buffer_size rather than the dataset.
+
+        Args:
+            path (str): Directory written by write_shards.
+            shards (list[dict]): Shard entries from the manifest.
+            bucket_counts (np.ndarray): Rows per split bucket for each shard.
+            bucket_range (Tuple[int, int]): Half-open range of buckets belonging to this split.
+            binarize (bool): Whether to binarize the ratings.
+            min_rating (int): Minimum rating for binarization.
+            batch_size (int): Interactions per batch.
+            shuffle (bool): Whether to shuffle shards and rows every epoch.
+            buffer_size (int): Rows to accumulate before shuffling and emitting batches.
+            seed (int): Seed for the per-epoch shuffles.
+        """
+        self.path = path
+        self.shards = shards
+        self.bucket_range = bucket_range
+        self.binarize = binarize
+        self.min_rating = min_rating
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.buffer_size = buffer_size
+        self.seed = seed
+        self.epoch = 0
+        self.rank = 0
+        self.world_size = 1
+        self.shard_rows = bucket_counts[:, bucket_range[0]:bucket_range[1]].sum(axis=1)
+
+    def __len__(self):
+        # In data-parallel training every rank stops after the smallest rank's number of batches
+        return min(int(-(-self.shard_rows[rank::self.world_size].sum() // self.batch_size))
+                   for rank in range(self.world_size))
+
+    def with_batching(self, batch_size: int, shuffle: bool, rank: int = 0,
+                      world_size: int = 1) -> "ShardedRecommenderDataset":
+        if world_size > len(self.shards):
+            raise ValueError(f"Cannot split {len(self.shards)} shards across {world_size} processes")
+        dataset = copy.copy(self)
+        dataset.batch_size = batch_size
+        dataset.shuffle = shuffle
+        dataset.rank = rank
+        dataset.world_size = world_size
+        return dataset
+
+    def read_shard(self, shard: dict) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        low, high = self.bucket_range
+        chunk = pl.scan_parquet(os.path.join(self.path, shard["file"])) \
+            .filter((pl.col("bucket") >= low) & (pl.col("bucket") < high)) \
+            .select("user_id", "movie_id", "rating").collect()
+        return self._columns(chunk)
+
+    def read_users(self, first: int, last: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Every row of this split for the encoded users first <= user_id < last.
+
+        Shards are not partitioned by user, so this is one streaming scan over all of them; memory
+        is bounded by the rows returned.
+        """
+        low, high = self.bucket_range
+        chunk = pl.scan_parquet([os.path.join(self.path, shard["file"]) for shard in self.shards]) \
+            .filter((pl.col("bucket") >= low) & (pl.col("bucket") < high)
+                    & (pl.col("user_id") >= first) & (pl.col("user_id") < last)) \
+            .select("user_id", "movie_id", "rating").collect(engine="streaming")
+        return self._columns(chunk)
+
+    def _columns(self, chunk: pl.DataFrame) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        ratings = chunk["rating"].to_numpy()
+        if self.binarize:
+            ratings = (ratings >= self.min_rating).astype(np.float32)
+        return chunk["user_id"].to_numpy(), chunk["movie_id"].to_numpy(), ratings
+
+    def batches(self, columns: list[np.ndarray], rng: np.random.Generator) -> Iterator[Tuple[torch.Tensor, ...]]:
+        if self.shuffle:
+            order = rng.permutation(len(columns[0]))
+            columns = [column[order] for column in columns]
+        for start in range(0, len(columns[0]), self.batch_size):
+            user_ids, movie_ids, ratings = (column[start:start + self.batch_size] for column in columns)
+            yield torch.from_numpy(user_ids).long(), torch.from_numpy(movie_ids).long(), torch.from_numpy(ratings)
+
+    def __iter__(self):
+        num_batches = len(self)
+        for batch_idx, batch in enumerate(self.stream()):
+            if batch_idx == num_batches:
+                break
+            yield batch
+
+    def stream(self) -> Iterator[Tuple[torch.Tensor, ...]]:
+        rng = np.random.default_rng((self.seed, self.rank, self.epoch))
+        self.epoch += 1
+        # Each rank reads a disjoint, fixed subset of the shards
+        owned = np.arange(self.rank, len(self.shards), self.world_size)
+        order = rng.permutation(owned) if self.shuffle else owned
+        buffer, buffered = [], 0
+        for shard_idx in order:
+            if self.shard_rows[shard_idx] == 0:
+                continue
+            buffer.append(self.read_shard(self.shards[shard_idx]))
+            buffered += len(buffer[-1][0])
+            if buffered < self.buffer_size:
+                continue
+            columns = [np.concatenate(parts) for parts in zip(*buffer)]
+            full = len(columns[0]) // self.batch_size * self.batch_size
+            yield from self.batches([column[:full] for column in columns], rng)
+            # Rows short of a full batch are carried into the next buffer
+            buffer = [tuple(column[full:] for column in columns)]
+            buffered = len(buffer[0][0])
+        if buffered:
+            yield from self.batches([np.concatenate(parts) for parts in zip(*buffer)], rng)
+
+
+class ShardedDatasetLoader:
+    def __init__(self, path: str, val_ratio: float = 0.1, test_ratio: float = 0.2, batch_size: int = 64,
+                 binarize: bool = False, min_rating: int = 1, buffer_size: int = 2_000_000, seed: int = 42):
+        """
+        Initialize the loader over a directory written by write_shards.
+
+        Splits are ranges of hash buckets, so nothing is materialized and membership is the same on
+        every run.
+
+        Args:
+            path (str): Directory containing manifest.json and the shards.
+            val_ratio (float): Fraction of interactions in the validation split.
+            test_ratio (float): Fraction of interactions in the test split.
+            batch_size (int): Batch size for DataLoader.
+            binarize (bool): Whether to binarize the ratings.
+            min_rating (int): Minimum rating for binarization.
+            buffer_size (int): Shuffle buffer size in rows.
+            seed (int): Seed for the per-epoch shuffles.
+        """
+        with open(os.path.join(path, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        self.path = path
+        self.user_index = np.load(os.path.join(path, "user_index.npy"))
+        self.movie_index = np.load(os.path.join(path, "movie_index.npy"))
+        self.bucket_counts = np.load(os.path.join(path, "bucket_counts.npy"))
+        self._uid_map = dict(zip(self.user_index.tolist(), range(len(self.user_index))))
+        self._mid_map = dict(zip(self.movie_index.tolist(), range(len(self.movie_index))))
+        self.num_users = len(self._uid_map)
+        self.num_items = len(self._mid_map)
+        self.batch_size = batch_size
+        self.val_ratio = val_ratio
+        self.test_ratio = test_ratio
+        self.binarize = binarize
+        self.min_rating = min_rating
+        self.buffer_size = buffer_size
+        self.seed = seed
+        self.train_data, self.val_data, self.test_data = self.split_data()
+
+    def split_data(self) -> Tuple[ShardedRecommenderDataset, ShardedRecommenderDataset, ShardedRecommenderDataset]:
+        """
+        Split the dataset into training, validation, and test sets by hash bucket.
+
+        Returns:
+            Tuple[ShardedRecommenderDataset, ...]: Training, validation, and test datasets.
+        """
+        num_buckets = self.manifest["num_buckets"]
+        train_end = int(num_buckets * (1 - self.val_ratio - self.test_ratio))
+        val_end = int(num_buckets * (1 - self.test_ratio))
+        return tuple(
+            ShardedRecommenderDataset(self.path, self.manifest["shards"], self.bucket_counts, bucket_range,
+                                      binarize=self.binarize, min_rating=self.min_rating, batch_size=self.batch_size,
+                                      buffer_size=self.buffer_size, seed=self.seed + split)
+            for split, bucket_range in enumerate([(0, train_end), (train_end, val_end), (val_end, num_buckets)])
+        )
+
+    def get_dataloader(self, dataset: ShardedRecommenderDataset, batch_size: int | None = None,
+                       shuffle: bool = True, rank: int = 0, world_size: int = 1) -> DataLoader:
+        """
+        Get a DataLoader for the given split.
+
+        Args:
+            dataset (ShardedRecommenderDataset): The split to create a DataLoader for.
+            batch_size (int | None): Batch size, defaults to the loader's batch_size.
+            shuffle (bool): Whether to reshuffle shards and rows every epoch.
+            rank (int): Rank of this process in data-parallel training.
+            world_size (int): Number of data-parallel processes; shards are assigned round-robin.
+
+        Returns:
+            DataLoader: DataLoader yielding (user_ids, movie_ids, ratings) batches.
+        """
+        return DataLoader(dataset.with_batching(batch_size or self.batch_size, shuffle, rank, world_size),
+                          batch_size=None)
+
+    @property
+    def uid_map(self) -> Dict:
+        return self._uid_map
+
+    @property
+    def mid_map(self) -> Dict:
+        return self._mid_map
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a ratings file into shards for ShardedDatasetLoader")
+    parser.add_argument("path", help="ratings file")
+    parser.add_argument("output_dir")
+    parser.add_argument("--dataset-type", default="csv", choices=["csv", "parquet"])
+    parser.add_argument("--separator", default=",")
+    parser.add_argument("--shard-rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    manifest = write_shards(args.path, args.output_dir, args.dataset_type, args.separator, args.shard_rows)
+    print(f"{manifest['num_rows']} interactions, {manifest['num_users']} users, {manifest['num_items']} movies "
+          f"in {len(manifest['shards'])} shards")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Concurrency benchmark for a running ML API: latency percentiles under parallel load.
+
+/health is probed alongside the load so a blocked event loop shows up directly. Compare
+runs before and after a change by pointing it at the two servers. Needs httpx.
+
+    python -m benchmarks.bench_api_concurrency --url http://localhost:8000 --concurrency 1 8 32
+"""
+import argparse
+import asyncio
+import random
+import time
+import httpx
+import numpy as np
+
+
+def percentiles(samples: list[float]) -> str:
+    if not samples:
+        return "n/a"
+    p50, p99 = np.percentile(samples, [50, 99])
+    return f"p50={p50:7.1f}ms p99={p99:7.1f}ms"
+
+
+async def worker(client: httpx.AsyncClient, endpoint: str, tmdb_ids: list[int], requests: int,
+    latencies: list[float], statuses: dict) -> None:
+    for _ in range(requests):
+        picks = random.sample(tmdb_ids, 20)
+        ratings = [random.choice([1.0, 2.5, 4.0, 4.5, 5.0]) for _ in picks]
+        if endpoint == "/tfidf-recommendation":
+            body = {"interactions": list(zip(picks, ratings))}
+        else:
+            body = {"movie_ids": picks, "ratings": ratings}
+        start = time.perf_counter()
+        response = await client.post(endpoint, params={"k": 10}, json=body)
+        latencies.append((time.perf_counter() - start) * 1000)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+
+async def probe_health(client: httpx.AsyncClient, stop: asyncio.Event, latencies: list[float]) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/health")
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.01)
+
+
+async def run(args, concurrency: int, tmdb_ids: list[int]) -> None:
+    latencies, health_latencies, statuses = [], [], {}
+    stop = asyncio.Event()
+    async with httpx.AsyncClient(base_url=args.url, timeout=60.0) as client:
+        health = asyncio.create_task(probe_health(client, stop, health_latencies))
+        start = time.perf_counter()
+        await asyncio.gather(*[
+            worker(client, args.endpoint, tmdb_ids, args.requests // concurrency, latencies, statuses)
+            for _ in range(concurrency)
+        ])
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await health
+    print(f"c={concurrency:>3} {len(latencies) / elapsed:7.1f} req/s  {args.endpoint} {percentiles(latencies)}  "
+          f"/health {percentiles(health_latencies)}  status={statuses}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--endpoint", default="/recommendation", choices=["/recommendation", "/tfidf-recommendation"])
+    parser.add_argument("--links", default="api/app/data/links.csv", help="links.csv to draw TMDB IDs from")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=256)
+    args = parser.parse_args()
+
+    with open(args.links) as f:
+        next(f)
+        tmdb_ids = [int(row.split(",")[2]) for row in f if row.strip().split(",")[2]]
+    for concurrency in args.concurrency:
+        asyncio.run(run(args, concurrency, tmdb_ids))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Training-loader throughput (samples/sec): per-row __getitem__ + collate vs tensor batch slicing.
+
+The per-row baseline reproduces the previous RecommenderDataset (Python lists, three scalar tensors
+per sample) behind get_dataloader's old DataLoader settings. Run from the ml/ directory against a
+ratings file, or a synthetic ml-32m-shaped frame:
+
+    python -m benchmarks.bench_dataloader --ratings data/ml-32m/ratings.csv
+    python -m benchmarks.bench_dataloader --num-rows 32000000
+"""
+import argparse
+import time
+import numpy as np
+import polars as pl
+import torch
+from torch.utils.data import DataLoader, Dataset
+from base.datasetloader import RecommenderDataset, TensorBatchSampler
+
+
+class RowDataset(Dataset):
+    def __init__(self, data: pl.DataFrame):
+        self.user_ids = data['user_id'].to_list()
+        self.movie_ids = data['movie_id'].to_list()
+        self.ratings = data['rating'].to_list()
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def __getitem__(self, idx):
+        return (torch.tensor(self.user_ids[idx], dtype=torch.long),
+                torch.tensor(self.movie_ids[idx], dtype=torch.long),
+                torch.tensor(self.ratings[idx], dtype=torch.float32))
+
+
+def load_frame(args) -> pl.DataFrame:
+    if args.ratings:
+        data = pl.read_csv(args.ratings, has_header=True, new_columns=["user_id", "movie_id", "rating", "timestamp"])
+        return data.with_columns(pl.col('rating').cast(pl.Float32))
+    rng = np.random.default_rng(0)
+    return pl.DataFrame({
+        "user_id": rng.integers(0, 200_000, args.num_rows),
+        "movie_id": rng.integers(0, 87_585, args.num_rows),
+        "rating": rng.integers(0, 2, args.num_rows).astype(np.float32),
+    })
+
+
+def samples_per_sec(loader: DataLoader, max_batches: int) -> float:
+    count = 0
+    start = time.perf_counter()
+    for batch_idx, (user_ids, _, _) in enumerate(loader):
+        count += len(user_ids)
+        if batch_idx + 1 >= max_batches:
+            break
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ratings", default=None)
+    parser.add_argument("--num-rows", type=int, default=2_000_000)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--num-workers", type=int, default=2, help="workers for the per-row baseline")
+    parser.add_argument("--max-batches", type=int, default=2000, help="batches timed per loader")
+    args = parser.parse_args()
+
+    data = load_frame(args)
+    print(f"{len(data)} rows, batch size {args.batch_size}")
+
+    start = time.perf_counter()
+    rows = RowDataset(data)
+    print(f"{'per-row':>14}: built in {time.perf_counter() - start:6.2f}s")
+    row_loader = DataLoader(rows, batch_size=args.batch_size, shuffle=True,
+                            num_workers=args.num_workers, persistent_workers=args.num_workers > 0)
+    print(f"{'per-row':>14}: {samples_per_sec(row_loader, args.max_batches):12,.0f} samples/sec")
+    del row_loader, rows
+
+    start = time.perf_counter()
+    columns = RecommenderDataset(data)
+    print(f"{'tensor slices':>14}: built in {time.perf_counter() - start:6.2f}s")
+    tensor_loader = DataLoader(columns, sampler=TensorBatchSampler(len(columns), args.batch_size), batch_size=None)
+    print(f"{'tensor slices':>14}: {samples_per_sec(tensor_loader, args.max_batches):12,.0f} samples/sec")
+
+
+if __name__ == "__main__":
+    main()
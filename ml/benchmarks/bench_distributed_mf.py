@@ -0,0 +1,95 @@
+"""
+Scaling efficiency of data-parallel MF training (torch.distributed, gloo) from 1 to N processes.
+
+Each world size is launched with torchrun on this node and trains one pass over the same synthetic
+ratings (strong scaling), with every rank taking its shard through TensorBatchSampler and gradients
+averaged by MatrixFactorizationTrainer. Efficiency is throughput(N) / (N * throughput(1)). Run from
+the ml/ directory:
+
+    python -m benchmarks.bench_distributed_mf --world-sizes 1 2 4 8
+    python -m benchmarks.bench_distributed_mf --world-sizes 1 2 4 --dense
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+import polars as pl
+import torch
+import torch.distributed as dist
+from base.datasetloader import DatasetLoader, RecommenderDataset
+from models.matrix_factorisation.model import MatrixFactorizationModel
+from models.matrix_factorisation.trainer import MatrixFactorizationTrainer, build_optimizers
+
+
+def worker(args) -> None:
+    # Only what train_epoch touches is set, so no ratings file or wandb run is needed
+    trainer = MatrixFactorizationTrainer.__new__(MatrixFactorizationTrainer)
+    trainer._init_distributed({})
+    rng = np.random.default_rng(0)
+    data = pl.DataFrame({
+        "user_id": rng.integers(0, args.num_users, args.num_ratings),
+        "movie_id": rng.integers(0, args.num_items, args.num_ratings),
+        "rating": rng.integers(0, 2, args.num_ratings).astype(np.float32),
+    })
+    loader = DatasetLoader.__new__(DatasetLoader)
+    loader.batch_size, loader.seed = args.batch_size, 42
+    train_loader = loader.get_dataloader(RecommenderDataset(data), rank=trainer.rank, world_size=trainer.world_size)
+
+    torch.manual_seed(0)
+    trainer.model = MatrixFactorizationModel(args.num_users, args.num_items, args.dim, sparse=not args.dense)
+    trainer.optimizers = build_optimizers(trainer.model, 0.001)
+    trainer.loss_type, trainer.l2_reg, trainer.pos_weight = "bce_logits", 0.002, 1.0
+    if trainer.world_size > 1:
+        trainer._broadcast_state()
+        dist.barrier()
+    trainer.model.train()
+    samples = 0
+    start = time.perf_counter()
+    for batch in train_loader:
+        trainer.train_epoch(batch)
+        samples += len(batch[0])
+    seconds = trainer._mean_across_ranks(time.perf_counter() - start) if trainer.world_size > 1 else time.perf_counter() - start
+    if trainer.rank == 0:
+        sys.__stdout__.write(json.dumps({"samples": samples * trainer.world_size, "seconds": seconds}) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--world-sizes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--num-users", type=int, default=200_948)
+    parser.add_argument("--num-items", type=int, default=87_585)
+    parser.add_argument("--num-ratings", type=int, default=500_000)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--dense", action="store_true", help="dense embeddings and full-table L2 instead of sparse")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        worker(args)
+        return
+
+    forwarded = [f"--num-users={args.num_users}", f"--num-items={args.num_items}", f"--num-ratings={args.num_ratings}",
+                 f"--dim={args.dim}", f"--batch-size={args.batch_size}", *(["--dense"] if args.dense else [])]
+    print(f"{os.cpu_count()} CPUs, {'dense' if args.dense else 'sparse'} embeddings, "
+          f"{args.num_ratings} ratings, batch {args.batch_size} per rank")
+    print(f"{'procs':>5} {'samples/s':>12} {'speedup':>8} {'efficiency':>10}")
+    baseline = None
+    for world_size in args.world_sizes:
+        command = [sys.executable, "-m", "torch.distributed.run", "--standalone", f"--nproc-per-node={world_size}",
+                   "-m", "benchmarks.bench_distributed_mf", "--worker", *forwarded]
+        out = subprocess.run(command, capture_output=True, text=True, cwd=os.getcwd())
+        if out.returncode != 0:
+            print(f"{world_size:>5} failed: {out.stderr.strip().splitlines()[-1]}")
+            continue
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        throughput = result["samples"] / result["seconds"]
+        baseline = baseline or throughput / world_size
+        speedup = throughput / baseline
+        print(f"{world_size:>5} {throughput:>12,.0f} {speedup:>8.2f} {speedup / world_size:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
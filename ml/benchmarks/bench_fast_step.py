@@ -0,0 +1,120 @@
+"""
+MF training step throughput and quality in each fast-path mode: eager fp32, bf16 autocast,
+torch.compile, and torch.compile + bf16 autocast.
+
+Steps go through MatrixFactorizationTrainer.train_epoch, so every mode runs the training code with
+its compile_step / autocast_dtype settings (and falls back to eager fp32 where they are unavailable).
+Throughput is measured on tables of the given shape (ml-32m by default) after warm-up steps that
+absorb compilation; quality is validation BCE/AUC after a few epochs on a ratings file, or on
+synthetic low-rank ratings at ml-1m scale. Run from the ml/ directory:
+
+    python -m benchmarks.bench_fast_step
+    python -m benchmarks.bench_fast_step --sparse --ratings data/ml-1m/ratings.csv
+"""
+import argparse
+import time
+import numpy as np
+import torch
+from base.datasetloader import DatasetLoader, RecommenderDataset
+from models.matrix_factorisation.model import MatrixFactorizationModel
+from models.matrix_factorisation.trainer import MatrixFactorizationTrainer, build_optimizers
+from benchmarks.bench_sparse_mf import evaluate, synthetic_ratings
+
+MODES = {
+    "eager/fp32": {},
+    "eager/bf16": {"autocast_dtype": "bfloat16"},
+    "compiled/fp32": {"compile_step": True},
+    "compiled/bf16": {"compile_step": True, "autocast_dtype": "bfloat16"},
+}
+
+
+def make_trainer(num_users: int, num_items: int, mode: dict, args) -> MatrixFactorizationTrainer:
+    # Only what train_epoch/validate touch is set, so no dataset or wandb run is needed
+    trainer = MatrixFactorizationTrainer.__new__(MatrixFactorizationTrainer)
+    trainer.device = torch.device("cpu")
+    trainer.model = MatrixFactorizationModel(num_users, num_items, args.dim, dropout_rate=0.2, sparse=args.sparse)
+    trainer.optimizers = build_optimizers(trainer.model, args.lr)
+    trainer.loss_type = "bce_logits"
+    trainer.l2_reg = args.l2_reg
+    trainer.pos_weight = 1.0
+    trainer.compile_step = mode.get("compile_step", False)
+    trainer.autocast_dtype = mode.get("autocast_dtype")
+    return trainer
+
+
+def throughput(args) -> None:
+    rng = np.random.default_rng(0)
+    batches = [(torch.from_numpy(rng.integers(0, args.num_users, args.batch_size)),
+                torch.from_numpy(rng.integers(0, args.num_items, args.batch_size)),
+                torch.from_numpy(rng.integers(0, 2, args.batch_size).astype(np.float32)))
+               for _ in range(args.steps)]
+    print(f"Throughput, {args.num_users} users x {args.num_items} items x {args.dim} dims, batch {args.batch_size}, "
+          f"{'sparse' if args.sparse else 'dense'} embeddings, {torch.get_num_threads()} threads")
+    for name, mode in MODES.items():
+        torch.manual_seed(0)
+        trainer = make_trainer(args.num_users, args.num_items, mode, args)
+        trainer.model.train()
+        start = time.perf_counter()
+        for batch in batches[:args.warmup]:
+            trainer.train_epoch(batch)
+        warmup = time.perf_counter() - start
+        start = time.perf_counter()
+        for batch in batches:
+            trainer.train_epoch(batch)
+        seconds = time.perf_counter() - start
+        active = "(eager fp32 fallback)" if mode and trainer._loss_step == trainer._compute_loss else ""
+        print(f"{name:>14}: {args.steps / seconds:8.1f} steps/s  {args.steps * args.batch_size / seconds:10,.0f} samples/s  "
+              f"(warm-up {warmup:5.1f} s) {active}")
+
+
+def quality(args) -> None:
+    if args.ratings:
+        loader = DatasetLoader(args.ratings, batch_size=args.batch_size, binarize=True, min_rating=4)
+        num_users, num_items = loader.num_users, loader.num_items
+        train, val = loader.train_data, loader.val_data
+    else:
+        num_users, num_items = 6040, 3706
+        data = synthetic_ratings(num_users, num_items, 1_000_209)
+        cut = int(len(data) * 0.9)
+        train, val = RecommenderDataset(data[:cut]), RecommenderDataset(data[cut:])
+        loader = DatasetLoader.__new__(DatasetLoader)
+        loader.batch_size, loader.seed = args.batch_size, 42
+    print(f"Quality, {num_users} users x {num_items} items, {len(train)} train / {len(val)} validation ratings")
+    for name, mode in MODES.items():
+        torch.manual_seed(0)
+        trainer = make_trainer(num_users, num_items, mode, args)
+        start = time.perf_counter()
+        for _ in range(args.epochs):
+            trainer.model.train()
+            # Full batches only, so the compiled step sees a single shape
+            for batch in loader.get_dataloader(train):
+                if len(batch[0]) == args.batch_size:
+                    trainer.train_epoch(batch)
+        seconds = time.perf_counter() - start
+        bce, auc = evaluate(trainer, loader.get_dataloader(val, batch_size=4096, shuffle=False))
+        print(f"{name:>14}: val BCE {bce:.4f}  AUC {auc:.4f}  ({seconds / args.epochs:.1f} s/epoch)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ratings", default=None, help="ratings CSV for the quality run; synthetic if omitted")
+    parser.add_argument("--sparse", action="store_true", help="sparse embeddings with per-batch L2")
+    parser.add_argument("--num-users", type=int, default=200_948)
+    parser.add_argument("--num-items", type=int, default=87_585)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--steps", type=int, default=200, help="timed steps for the throughput run")
+    parser.add_argument("--warmup", type=int, default=10, help="untimed steps, including compilation")
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--lr", type=float, default=0.001)
+    parser.add_argument("--l2-reg", type=float, default=0.002)
+    parser.add_argument("--skip-quality", action="store_true")
+    args = parser.parse_args()
+
+    throughput(args)
+    if not args.skip_quality:
+        quality(args)
+
+
+if __name__ == "__main__":
+    main()
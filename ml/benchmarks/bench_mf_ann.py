@@ -0,0 +1,73 @@
+"""
+Recall@k vs latency of approximate MF retrieval against the exact top-k path.
+
+Run from the ml/ directory, against a checkpoint or a random catalog of the same shape:
+    python -m benchmarks.bench_mf_ann --checkpoint api/app/model_checkpoints/mf_ml32m.pth
+    python -m benchmarks.bench_mf_ann --num-items 87585 --dim 128
+"""
+import argparse
+import time
+import numpy as np
+import torch
+from base.checkpointing import model_state_dict
+from models.matrix_factorisation.ann_index import MFAnnIndex
+from models.matrix_factorisation.scoring import top_k_items
+
+
+def load_item_side(args) -> tuple[torch.Tensor, torch.Tensor, float]:
+    if args.checkpoint:
+        state = model_state_dict(torch.load(args.checkpoint, map_location="cpu"))
+        return state["item_embedding.weight"], state["item_bias.weight"].view(-1), float(state["global_bias"])
+    generator = torch.Generator().manual_seed(0)
+    item_embs = torch.randn(args.num_items, args.dim, generator=generator) * 0.05
+    item_bias = torch.randn(args.num_items, generator=generator) * 0.1
+    return item_embs, item_bias, 0.0
+
+
+def recall_at_k(approx_ids: np.ndarray, exact_ids: np.ndarray) -> float:
+    hits = [len(set(a) & set(e)) / len(e) for a, e in zip(approx_ids, exact_ids)]
+    return float(np.mean(hits))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--checkpoint", default=None)
+    parser.add_argument("--num-items", type=int, default=87_585)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--num-queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--pq-m", type=int, default=26)
+    args = parser.parse_args()
+
+    item_embs, item_bias, global_bias = load_item_side(args)
+    # Queries are folded-in-like: weighted sums of a few item vectors plus noise
+    rng = np.random.default_rng(0)
+    picks = rng.integers(0, len(item_embs), size=(args.num_queries, 20))
+    queries = item_embs[torch.from_numpy(picks)].sum(dim=1) + torch.randn(args.num_queries, item_embs.size(1)) * 0.05
+
+    start = time.perf_counter()
+    _, exact_ids = top_k_items(queries, item_embs, args.k, item_bias=item_bias, global_bias=global_bias)
+    exact_ms = (time.perf_counter() - start) / args.num_queries * 1000
+    exact_ids = exact_ids.numpy()
+    print(f"exact: {exact_ms:.3f} ms/query")
+
+    settings = {
+        "ivf_flat": [("nprobe", n) for n in (1, 4, 16, 64)],
+        "ivf_pq": [("nprobe", n) for n in (1, 4, 16, 64)],
+        "hnsw": [("ef_search", e) for e in (16, 32, 64, 128, 256)],
+    }
+    print(f"{'index':>9} {'param':>14} {'recall@k':>9} {'ms/query':>9} {'speedup':>8}")
+    for index_type, params in settings.items():
+        index = MFAnnIndex.build(item_embs.numpy(), item_bias.numpy(), index_type=index_type,
+            global_bias=global_bias, nlist=args.nlist, pq_m=args.pq_m)
+        for name, value in params:
+            start = time.perf_counter()
+            _, approx_ids = index.search(queries.numpy(), args.k, **{name: value})
+            ms = (time.perf_counter() - start) / args.num_queries * 1000
+            print(f"{index_type:>9} {name + '=' + str(value):>14} {recall_at_k(approx_ids, exact_ids):>9.3f} "
+                  f"{ms:>9.3f} {exact_ms / ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Quantized first-pass scoring with exact re-ranking vs the float32 top-k path.
+
+Reports the item table memory, latency and top-k overlap with the exact result for each
+mode. Run from the ml/ directory against a checkpoint, a serving bundle, or a random catalog:
+
+    python -m benchmarks.bench_quantized_scoring --checkpoint api/app/model_checkpoints/mf_ml32m.pth
+    python -m benchmarks.bench_quantized_scoring --bundle api/app/model_checkpoints/mf_ml32m_bundle
+"""
+import argparse
+import time
+import numpy as np
+import torch
+from base.checkpointing import model_state_dict
+from models.matrix_factorisation.scoring import QuantizedItemTable, top_k_items, quantized_top_k_items
+
+
+def load_item_side(args) -> tuple[torch.Tensor, torch.Tensor, float]:
+    if args.checkpoint:
+        state = model_state_dict(torch.load(args.checkpoint, map_location="cpu"))
+        return state["item_embedding.weight"], state["item_bias.weight"].view(-1), float(state["global_bias"])
+    if args.bundle:
+        from models.matrix_factorisation.serving import MFServingModel
+        return MFServingModel.load(args.bundle, mmap=False).item_tables()
+    generator = torch.Generator().manual_seed(0)
+    item_embs = torch.randn(args.num_items, args.dim, generator=generator) * 0.05
+    return item_embs, torch.randn(args.num_items, generator=generator) * 0.1, 0.0
+
+
+def time_ms(fn, repeats: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--checkpoint", default=None)
+    parser.add_argument("--bundle", default=None)
+    parser.add_argument("--num-items", type=int, default=87_585)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[1, 32])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rerank", type=int, default=256)
+    parser.add_argument("--repeats", type=int, default=30)
+    args = parser.parse_args()
+
+    item_embs, item_bias, global_bias = load_item_side(args)
+    fp32_bytes = item_embs.numel() * item_embs.element_size()
+    tables = {mode: QuantizedItemTable(item_embs, mode) for mode in ("fp16", "bf16", "int8")}
+
+    print(f"{'mode':>6} {'batch':>6} {'table MB':>9} {'saving':>7} {'ms':>8} {'speedup':>8} {'overlap@k':>10}")
+    for batch_size in args.batch_size:
+        # Fold-in-like users: sums of a few item vectors
+        picks = torch.randint(0, len(item_embs), (batch_size, 20))
+        users = item_embs[picks].sum(dim=1)
+        exact = lambda: top_k_items(users, item_embs, args.k, item_bias=item_bias, global_bias=global_bias)
+        exact_ms = time_ms(exact, args.repeats)
+        exact_ids = exact()[1].numpy()
+        print(f"{'fp32':>6} {batch_size:>6} {fp32_bytes / 2**20:>9.1f} {'1.0x':>7} {exact_ms:>8.2f} {'1.0x':>8} {1.0:>10.3f}")
+        for mode, table in tables.items():
+            approx = lambda: quantized_top_k_items(users, item_embs, table, args.k, rerank=args.rerank,
+                item_bias=item_bias, global_bias=global_bias)
+            ms = time_ms(approx, args.repeats)
+            approx_ids = approx()[1].numpy()
+            overlap = np.mean([len(set(a) & set(e)) / args.k for a, e in zip(approx_ids, exact_ids)])
+            print(f"{mode:>6} {batch_size:>6} {table.nbytes / 2**20:>9.1f} {fp32_bytes / table.nbytes:>6.1f}x "
+                  f"{ms:>8.2f} {exact_ms / ms:>7.2f}x {overlap:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+MF training throughput and quality: dense embeddings + full-table L2 + Adam vs sparse embeddings +
+per-batch L2 + SparseAdam/Adagrad.
+
+Steps go through MatrixFactorizationTrainer.train_epoch, so both modes run exactly the training code.
+Throughput is measured on tables of the given shape (ml-32m by default); quality is validation
+BCE/AUC after a few epochs on a ratings file, or on synthetic low-rank ratings at ml-1m scale.
+Run from the ml/ directory:
+
+    python -m benchmarks.bench_sparse_mf
+    python -m benchmarks.bench_sparse_mf --ratings data/ml-1m/ratings.csv --epochs 5
+"""
+import argparse
+import time
+import numpy as np
+import polars as pl
+import torch
+from sklearn.metrics import roc_auc_score
+from base.datasetloader import DatasetLoader, RecommenderDataset
+from models.matrix_factorisation.model import MatrixFactorizationModel
+from models.matrix_factorisation.trainer import MatrixFactorizationTrainer, build_optimizers
+
+MODES = {
+    "dense/adam": {"sparse": False},
+    "sparse/sparse_adam": {"sparse": True, "sparse_optimizer": "sparse_adam"},
+    "sparse/adagrad": {"sparse": True, "sparse_optimizer": "adagrad"},
+}
+
+
+def make_trainer(num_users: int, num_items: int, mode: dict, args) -> MatrixFactorizationTrainer:
+    # Only what train_epoch/validate touch is set, so no dataset or wandb run is needed
+    trainer = MatrixFactorizationTrainer.__new__(MatrixFactorizationTrainer)
+    trainer.model = MatrixFactorizationModel(num_users, num_items, args.dim, dropout_rate=0.2, sparse=mode["sparse"])
+    trainer.optimizers = build_optimizers(trainer.model, args.lr, mode.get("sparse_optimizer", "sparse_adam"),
+                                          args.adagrad_lr if mode.get("sparse_optimizer") == "adagrad" else None)
+    trainer.loss_type = "bce_logits"
+    trainer.l2_reg = args.l2_reg
+    trainer.pos_weight = 1.0
+    return trainer
+
+
+def synthetic_ratings(num_users: int, num_items: int, num_ratings: int, rank: int = 16) -> pl.DataFrame:
+    rng = np.random.default_rng(0)
+    users = rng.standard_normal((num_users, rank)).astype(np.float32)
+    items = rng.standard_normal((num_items, rank)).astype(np.float32)
+    popularity = rng.zipf(1.5, num_items).astype(np.float64)
+    user_ids = rng.integers(0, num_users, num_ratings)
+    item_ids = rng.choice(num_items, num_ratings, p=popularity / popularity.sum())
+    logits = (users[user_ids] * items[item_ids]).sum(axis=1) / np.sqrt(rank)
+    liked = rng.random(num_ratings) < 1 / (1 + np.exp(-2 * logits))
+    return pl.DataFrame({"user_id": user_ids, "movie_id": item_ids, "rating": liked.astype(np.float32)})
+
+
+def throughput(args) -> None:
+    rng = np.random.default_rng(0)
+    batches = [(torch.from_numpy(rng.integers(0, args.num_users, args.batch_size)),
+                torch.from_numpy(rng.integers(0, args.num_items, args.batch_size)),
+                torch.from_numpy(rng.integers(0, 2, args.batch_size).astype(np.float32)))
+               for _ in range(args.steps)]
+    print(f"Throughput, {args.num_users} users x {args.num_items} items x {args.dim} dims, batch {args.batch_size}")
+    for name, mode in MODES.items():
+        trainer = make_trainer(args.num_users, args.num_items, mode, args)
+        trainer.model.train()
+        for batch in batches[:5]:
+            trainer.train_epoch(batch)
+        start = time.perf_counter()
+        for batch in batches:
+            trainer.train_epoch(batch)
+        seconds = time.perf_counter() - start
+        print(f"{name:>20}: {args.steps / seconds:8.1f} steps/s  {args.steps * args.batch_size / seconds:10,.0f} samples/s")
+
+
+def evaluate(trainer: MatrixFactorizationTrainer, loader) -> tuple[float, float]:
+    trainer.model.eval()
+    predictions, targets = [], []
+    with torch.no_grad():
+        for user_ids, item_ids, ratings in loader:
+            predictions.append(trainer.model(user_ids, item_ids))
+            targets.append(ratings)
+    predictions, targets = torch.cat(predictions), torch.cat(targets)
+    bce = torch.nn.functional.binary_cross_entropy_with_logits(predictions, targets).item()
+    return bce, roc_auc_score(targets.numpy(), torch.sigmoid(predictions).numpy())
+
+
+def quality(args) -> None:
+    if args.ratings:
+        loader = DatasetLoader(args.ratings, batch_size=args.batch_size, binarize=True, min_rating=4)
+        num_users, num_items = loader.num_users, loader.num_items
+        train, val = loader.train_data, loader.val_data
+    else:
+        num_users, num_items = 6040, 3706
+        data = synthetic_ratings(num_users, num_items, 1_000_209)
+        cut = int(len(data) * 0.9)
+        train, val = RecommenderDataset(data[:cut]), RecommenderDataset(data[cut:])
+        loader = DatasetLoader.__new__(DatasetLoader)
+        loader.batch_size, loader.seed = args.batch_size, 42
+    print(f"Quality, {num_users} users x {num_items} items, {len(train)} train / {len(val)} validation ratings")
+    for name, mode in MODES.items():
+        torch.manual_seed(0)
+        trainer = make_trainer(num_users, num_items, mode, args)
+        start = time.perf_counter()
+        for _ in range(args.epochs):
+            trainer.model.train()
+            for batch in loader.get_dataloader(train):
+                trainer.train_epoch(batch)
+        seconds = time.perf_counter() - start
+        bce, auc = evaluate(trainer, loader.get_dataloader(val, batch_size=4096, shuffle=False))
+        print(f"{name:>20}: val BCE {bce:.4f}  AUC {auc:.4f}  ({seconds / args.epochs:.1f} s/epoch)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ratings", default=None, help="ratings CSV for the quality run; synthetic if omitted")
+    parser.add_argument("--num-users", type=int, default=200_948)
+    parser.add_argument("--num-items", type=int, default=87_585)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--steps", type=int, default=200, help="timed steps for the throughput run")
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--lr", type=float, default=0.001)
+    parser.add_argument("--adagrad-lr", type=float, default=0.05)
+    parser.add_argument("--l2-reg", type=float, default=0.002)
+    args = parser.parse_args()
+
+    throughput(args)
+    quality(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Recall@k, QPS and size of the TF-IDF index types against the exact flat index.
+
+Queries are built like TFIDFModel.recommend builds user profiles (weighted means of a few item
+vectors) and searched one at a time, as the API does. Each index is then updated in place the way
+TFIDFModel.update does, and the replaced and added rows must come back as their own neighbours. Run from the ml/ directory against a
+saved bundle, or a synthetic clustered catalog of the same shape:
+
+    python -m benchmarks.bench_tfidf_ann --bundle checkpoints/tf_idf
+    python -m benchmarks.bench_tfidf_ann --num-items 87585 --dim 1000
+"""
+import argparse
+import time
+import numpy as np
+import faiss
+from models.tf_idf.model import TFIDFModel, build_index
+
+
+def load_vectors(args) -> np.ndarray:
+    if args.bundle:
+        return np.asarray(TFIDFModel.load_serving(args.bundle, mmap=False).tfidf_matrix, dtype=np.float32)
+    # Reduced TF-IDF vectors cluster by genre/tag themes; uniform noise would understate IVF recall
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((args.num_clusters, args.dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, args.num_clusters, args.num_items)]
+    vectors += rng.standard_normal((args.num_items, args.dim)).astype(np.float32) * 0.8
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def recall_at_k(approx_ids: np.ndarray, exact_ids: np.ndarray) -> float:
+    hits = [len(set(a) & set(e)) / len(e) for a, e in zip(approx_ids, exact_ids)]
+    return float(np.mean(hits))
+
+
+def search_one_by_one(model: TFIDFModel, queries: np.ndarray, k: int, **params) -> tuple[np.ndarray, float]:
+    search_params = model.search_params(**params)
+    ids = np.empty((len(queries), k), dtype=np.int64)
+    start = time.perf_counter()
+    for row, query in enumerate(queries):
+        _, ids[row] = model.index.search(query.reshape(1, -1), k, params=search_params)
+    return ids, len(queries) / (time.perf_counter() - start)
+
+
+def check_replacement(model: TFIDFModel, vectors: np.ndarray, num_rows: int,
+                      rng: np.random.Generator) -> tuple[float, float]:
+    """
+    Replace and add rows the way update() does.
+
+    Returns the share of written rows that are their own nearest neighbour, and the share of
+    untouched rows whose nearest neighbour is unchanged, both searched exhaustively so a miss can
+    only come from ids that no longer match rows.
+    """
+    model.tfidf_matrix = vectors
+    model.movie_ids = np.arange(len(vectors), dtype=np.int64)
+    model.row_index = model.build_row_index(model.movie_ids)
+    replaced = rng.choice(len(vectors), num_rows, replace=False)
+    untouched = rng.choice(np.setdiff1d(np.arange(len(vectors)), replaced), num_rows, replace=False)
+    exhaustive = {"nprobe": model.index_config["nlist"], "ef_search": 256}
+    before, _ = search_one_by_one(model, vectors[untouched], 1, **exhaustive)
+
+    doc_ids = np.concatenate([replaced, np.arange(len(vectors), len(vectors) + num_rows)])
+    new_vectors = rng.standard_normal((len(doc_ids), vectors.shape[1])).astype(np.float32)
+    new_vectors /= np.linalg.norm(new_vectors, axis=1, keepdims=True)
+    model._write_vectors(doc_ids, new_vectors)
+    written, _ = search_one_by_one(model, new_vectors, 1, **exhaustive)
+    after, _ = search_one_by_one(model, vectors[untouched], 1, **exhaustive)
+    return float(np.mean(written[:, 0] == model.rows(doc_ids)[0])), float(np.mean(before == after))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bundle", default=None)
+    parser.add_argument("--num-items", type=int, default=87_585)
+    parser.add_argument("--dim", type=int, default=1000)
+    parser.add_argument("--num-clusters", type=int, default=500)
+    parser.add_argument("--num-queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--pq-m", type=int, default=100)
+    parser.add_argument("--replace-rows", type=int, default=100, help="rows replaced (and added) by the update check")
+    parser.add_argument("--index-types", nargs="+", default=["ivf_flat", "hnsw", "opq_ivf_pq"],
+                        help="approximate index types to compare with the flat index")
+    args = parser.parse_args()
+
+    vectors = load_vectors(args)
+    rng = np.random.default_rng(1)
+    picks = rng.integers(0, len(vectors), size=(args.num_queries, 5))
+    weights = rng.uniform(0.2, 1.0, size=(args.num_queries, 5, 1)).astype(np.float32)
+    queries = np.ascontiguousarray((vectors[picks] * weights).sum(axis=1) / weights.sum(axis=1))
+
+    # Only index/index_config are touched, so the model is assembled without CSVs
+    model = TFIDFModel.__new__(TFIDFModel)
+    settings = {
+        "flat": [{}],
+        "ivf_flat": [{"nprobe": n} for n in (1, 4, 16, 64)],
+        "hnsw": [{"ef_search": e} for e in (16, 32, 64, 128, 256)],
+        "opq_ivf_pq": [{"nprobe": n} for n in (1, 4, 16, 64)],
+    }
+    exact_ids = None
+    print(f"{'index':>11} {'param':>14} {'recall@k':>9} {'QPS':>8} {'size MB':>8} {'build s':>8}")
+    for index_type in ["flat", *args.index_types]:
+        params = settings[index_type]
+        start = time.perf_counter()
+        model.index_config = {"index_type": index_type, "nlist": args.nlist, "pq_m": args.pq_m}
+        model.index = build_index(vectors, **model.index_config)
+        build_s = time.perf_counter() - start
+        size_mb = len(faiss.serialize_index(model.index)) / 2**20
+        for param in params:
+            ids, qps = search_one_by_one(model, queries, args.k, **param)
+            if exact_ids is None:
+                exact_ids = ids
+            label = ",".join(f"{name}={value}" for name, value in param.items()) or "-"
+            print(f"{index_type:>11} {label:>14} {recall_at_k(ids, exact_ids):>9.3f} {qps:>8.0f} "
+                  f"{size_mb:>8.1f} {build_s:>8.1f}")
+        written, untouched = check_replacement(model, vectors, args.replace_rows, np.random.default_rng(2))
+        print(f"{index_type:>11} {'update':>14} after replacing and adding {args.replace_rows} rows: "
+              f"{written:.3f} of them and {untouched:.3f} of untouched rows resolve correctly")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Peak memory and wall-clock time of TFIDFModel.fit, in-memory vs streaming.
+
+Each fit runs in a fresh subprocess so ru_maxrss is that fit's peak. Run from the ml/ directory
+against the real CSVs, or let it write an ml-32m-sized synthetic corpus:
+
+    python -m benchmarks.bench_tfidf_fit --movies data/ml-32m/movies.csv --tags data/ml-32m/tags.csv
+    python -m benchmarks.bench_tfidf_fit --synthetic-movies 87585 --synthetic-tags 2000000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import numpy as np
+
+GENRES = ["Action", "Adventure", "Animation", "Comedy", "Crime", "Drama", "Fantasy", "Horror", "Romance", "Sci-Fi", "Thriller"]
+
+
+def write_corpus(path: str, num_movies: int, num_tags: int, vocab_size: int = 40000, seed: int = 0) -> tuple[str, str]:
+    rng = np.random.default_rng(seed)
+    words = np.array([f"w{i}" for i in range(vocab_size)])
+    movies_path = os.path.join(path, "movies.csv")
+    tags_path = os.path.join(path, "tags.csv")
+    with open(movies_path, "w") as f:
+        f.write("movieId,title,genres\n")
+        for movie_id in range(1, num_movies + 1):
+            genres = "|".join(rng.choice(GENRES, size=rng.integers(1, 4), replace=False))
+            f.write(f"{movie_id},Movie {movie_id} ({1950 + movie_id % 70}),{genres}\n")
+    # Zipf-distributed movies and words, 1-3 word tags, like MovieLens tag text
+    movie_ids = np.minimum(rng.zipf(1.3, num_tags), num_movies)
+    lengths = rng.integers(1, 4, num_tags)
+    word_ids = np.minimum(rng.zipf(1.2, lengths.sum()), vocab_size) - 1
+    offsets = np.r_[0, np.cumsum(lengths)]
+    with open(tags_path, "w") as f:
+        f.write("userId,movieId,tag,timestamp\n")
+        for i in range(num_tags):
+            tag = " ".join(words[word_ids[offsets[i]:offsets[i + 1]]])
+            f.write(f"{i % 5000},{movie_ids[i]},{tag},{1_500_000_000 + i}\n")
+    return movies_path, tags_path
+
+
+def run_fit(movies: str, tags: str, streaming: bool, svd_components: int, n_jobs: int) -> dict:
+    code = f"""
+import json, resource, time
+from models.tf_idf.model import TFIDFModel
+model = TFIDFModel({movies!r}, {tags!r}, svd_components={svd_components})
+start = time.perf_counter()
+model.fit(streaming={streaming}, n_jobs={n_jobs})
+print(json.dumps({{"seconds": time.perf_counter() - start,
+                  "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                  "explained_variance": float(model.svd.explained_variance_ratio_.sum())}}))
+"""
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=os.getcwd())
+    if out.returncode != 0:
+        return {"error": out.stderr.strip().splitlines()[-1] if out.stderr else f"exit {out.returncode}"}
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--movies", default=None)
+    parser.add_argument("--tags", default=None)
+    parser.add_argument("--synthetic-movies", type=int, default=87585)
+    parser.add_argument("--synthetic-tags", type=int, default=2_000_000)
+    parser.add_argument("--svd-components", type=int, default=1000)
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.movies and args.tags:
+            movies, tags = args.movies, args.tags
+        else:
+            movies, tags = write_corpus(tmp, args.synthetic_movies, args.synthetic_tags)
+        for streaming in (False, True):
+            result = run_fit(movies, tags, streaming, args.svd_components, args.n_jobs)
+            mode = "streaming" if streaming else "in-memory"
+            if "error" in result:
+                print(f"{mode:>10}: failed ({result['error']})")
+                continue
+            print(f"{mode:>10}: {result['seconds']:7.1f}s  peak RSS {result['max_rss_mb']:7.0f} MB  "
+                  f"explained variance {result['explained_variance']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Micro-benchmark: partial top-k selection vs full sort for MF catalog scoring.
+
+Run from the ml/ directory:
+    python -m benchmarks.bench_topk --catalog-sizes 10000 87585 300000 --batch-size 1 32
+"""
+import argparse
+import time
+import torch
+from models.matrix_factorisation.scoring import top_k_items, full_sort_items
+
+
+def time_fn(fn, repeats: int) -> float:
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--catalog-sizes", type=int, nargs="+", default=[10_000, 87_585, 300_000])
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[1, 32])
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seen", type=int, default=50, help="rated items excluded per user")
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'items':>8} {'batch':>6} {'full sort (ms)':>15} {'topk (ms)':>10} {'speedup':>8}")
+    for num_items in args.catalog_sizes:
+        item_embs = torch.randn(num_items, args.dim) * 0.05
+        for batch_size in args.batch_size:
+            user_embs = torch.randn(batch_size, args.dim)
+            seen = torch.randint(0, num_items, (batch_size, args.seen))
+            sort_ms = time_fn(lambda: full_sort_items(user_embs, item_embs, args.k, apply_sigmoid=True), args.repeats)
+            topk_ms = time_fn(lambda: top_k_items(user_embs, item_embs, args.k, exclude_ids=seen, apply_sigmoid=True), args.repeats)
+            print(f"{num_items:>8} {batch_size:>6} {sort_ms:>15.3f} {topk_ms:>10.3f} {sort_ms / topk_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+Implicit alternating least squares (Hu, Koren & Volinsky) for binarized ratings.
+
+Each sweep solves every user vector with the item factors fixed, then every item vector with the
+user factors fixed. Rows are solved in blocks of the CSR interaction matrix on a thread pool, either
+with a few warm-started conjugate-gradient steps (default) or exactly with a batched Cholesky solve.
+The item factors are exported as a serving bundle that MFServingModel loads, with the "ials" fold-in.
+Train and export from the ml/ directory:
+
+    python -m models.ials.trainer data/ml-32m/ratings.csv --bundle api/app/model_checkpoints/ials_bundle \
+        --links api/app/data/links.csv
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import numpy as np
+import scipy.sparse as sp
+import torch
+import wandb
+from sklearn.metrics import roc_auc_score
+from typing import Dict, Tuple
+from base.base_model import RecommenderModel
+from base.datasetloader import DatasetLoader, RecommenderDataset
+from base.ranking_metrics import RankingEvaluator, holdout_matrices
+from models.matrix_factorisation.inference import MFInference
+from models.matrix_factorisation.serving import write_bundle
+
+
+def interaction_matrix(dataset: RecommenderDataset, num_rows: int, num_cols: int, transpose: bool = False) -> sp.csr_matrix:
+    """
+    Build a CSR matrix of the positive interactions, valued by rating (1 for binarized data).
+
+    Args:
+        dataset (RecommenderDataset): Encoded interactions.
+        num_rows (int): Number of users.
+        num_cols (int): Number of items.
+        transpose (bool): Build the item x user matrix instead.
+
+    Returns:
+        sp.csr_matrix: Interaction matrix with sorted indices.
+    """
+    keep = dataset.ratings > 0
+    rows, cols = dataset.user_ids[keep].numpy(), dataset.movie_ids[keep].numpy()
+    if transpose:
+        rows, cols, num_rows, num_cols = cols, rows, num_cols, num_rows
+    matrix = sp.csr_matrix((dataset.ratings[keep].numpy(), (rows, cols)), shape=(num_rows, num_cols))
+    matrix.sort_indices()
+    return matrix
+
+
+def row_blocks(indptr: np.ndarray, max_nnz: int) -> list[Tuple[int, int]]:
+    """Split CSR rows into contiguous blocks of at most max_nnz interactions (and rows)."""
+    blocks, start, num_rows = [], 0, len(indptr) - 1
+    while start < num_rows:
+        end = int(np.searchsorted(indptr, indptr[start] + max_nnz, side="right")) - 1
+        end = min(max(end, start + 1), start + max_nnz, num_rows)
+        blocks.append((start, end))
+        start = end
+    return blocks
+
+
+def solve_block(factors: torch.Tensor, fixed: torch.Tensor, gram: torch.Tensor, matrix: Tuple[torch.Tensor, ...],
+                block: Tuple[int, int], alpha: float, solver: str, cg_steps: int) -> None:
+    """
+    Update factors[start:end] in place for the fixed side's factors.
+
+    Minimises sum_j c_j (p_j - x . y_j)^2 + l2_reg ||x||^2 per row, with c_j = 1 + alpha * r_j and
+    p_j = 1 on the row's interactions and c_j = 1, p_j = 0 elsewhere; gram = Y^T Y + l2_reg I
+    accounts for all the non-interactions at once.
+    """
+    indptr, indices, values = matrix
+    start, end = block
+    lo, hi = int(indptr[start]), int(indptr[end])
+    rows = torch.repeat_interleave(torch.arange(end - start), indptr[start + 1:end + 1] - indptr[start:end])
+    neighbours = fixed[indices[lo:hi]]
+    confidence = alpha * values[lo:hi]
+    rhs = torch.zeros(end - start, fixed.size(1)).index_add_(0, rows, neighbours * (1 + confidence).unsqueeze(1))
+
+    if solver == "cholesky":
+        lhs = gram.expand(end - start, -1, -1).clone()
+        lhs.index_add_(0, rows, (neighbours * confidence.unsqueeze(1)).unsqueeze(2) * neighbours.unsqueeze(1))
+        factors[start:end] = torch.cholesky_solve(rhs.unsqueeze(-1), torch.linalg.cholesky(lhs)).squeeze(-1)
+        return
+
+    def matvec(v: torch.Tensor) -> torch.Tensor:
+        dots = (neighbours * v[rows]).sum(dim=1) * confidence
+        return v @ gram + torch.zeros_like(v).index_add_(0, rows, neighbours * dots.unsqueeze(1))
+
+    # Conjugate gradient warm-started from the previous sweep, so a few steps per sweep suffice
+    x = factors[start:end].clone()
+    residual = rhs - matvec(x)
+    direction = residual.clone()
+    residual_sq = (residual * residual).sum(dim=1)
+    for _ in range(cg_steps):
+        product = matvec(direction)
+        step = residual_sq / (direction * product).sum(dim=1).clamp_min(1e-20)
+        x += step.unsqueeze(1) * direction
+        residual -= step.unsqueeze(1) * product
+        new_residual_sq = (residual * residual).sum(dim=1)
+        direction = residual + (new_residual_sq / residual_sq.clamp_min(1e-20)).unsqueeze(1) * direction
+        residual_sq = new_residual_sq
+    factors[start:end] = x
+
+
+class IALSTrainer(MFInference, RecommenderModel):
+
+    def build(self, config: dict):
+        self.config = config
+        self.model_name = config.get('model_name', 'ials')
+        self.device = torch.device('cpu')
+        self.latent_dim = config.get('embedding_dim', 64)
+        self.dataset = DatasetLoader(
+            path=config['data_path'],
+            dataset_type=config.get('dataset_type', 'csv'),
+            separator=config.get('separator', ','),
+            batch_size=config.get('batch_size', 4096),
+            binarize=config.get('binarize', True),
+            min_rating=config.get('min_rating', 4),
+            cache_dir=config.get('dataset_cache_dir', 'data/cache'),
+            seed=config.get('split_seed', 42)
+        )
+        self.uid_map = self.dataset._uid_map
+        self.mid_map = self.dataset._mid_map
+        self.num_users = self.dataset.num_users
+        self.num_items = self.dataset.num_items
+        self.train_data, self.val_data, self.test_data = self.dataset.train_data, self.dataset.val_data, self.dataset.test_data
+
+        self.is_binary = config.get('binarize', True)
+        self.min_rating = config.get('min_rating', 4)
+        self.ials_alpha = config.get('alpha', 40.0)
+        self.l2_reg = config.get('l2_reg', 0.1)
+        self.fold_in_l2_reg = self.l2_reg
+        self.fold_in_iters = config.get('fold_in_iters', 5)
+        self.solver = config.get('solver', 'cg')
+        if self.solver not in ('cg', 'cholesky'):
+            raise ValueError(f"Unsupported solver: {self.solver}")
+        self.cg_steps = config.get('cg_steps', 3)
+        self.block_nnz = config.get('block_nnz', 262144)
+        self.num_threads = config.get('num_threads', os.cpu_count() or 1)
+        self.checkpoints_dir = config.get('checkpoints_dir', 'checkpoints')
+        os.makedirs(self.checkpoints_dir, exist_ok=True)
+
+        user_items = interaction_matrix(self.train_data, self.num_users, self.num_items)
+        item_users = interaction_matrix(self.train_data, self.num_users, self.num_items, transpose=True)
+        self.user_items = self._as_tensors(user_items)
+        self.item_users = self._as_tensors(item_users)
+        print(f"Interaction matrix: {self.num_users} users x {self.num_items} items, {user_items.nnz} positives")
+
+        generator = torch.Generator().manual_seed(config.get('split_seed', 42))
+        self.user_factors = torch.randn(self.num_users, self.latent_dim, generator=generator) * 0.01
+        self.item_factors = torch.randn(self.num_items, self.latent_dim, generator=generator) * 0.01
+
+    @staticmethod
+    def _as_tensors(matrix: sp.csr_matrix) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        return (torch.from_numpy(matrix.indptr.astype(np.int64)), torch.from_numpy(matrix.indices.astype(np.int64)),
+                torch.from_numpy(matrix.data.astype(np.float32)))
+
+    def _solve(self, factors: torch.Tensor, fixed: torch.Tensor, matrix: Tuple[torch.Tensor, ...]) -> None:
+        """Update every row of factors with fixed held constant, block by block on the thread pool"""
+        gram = fixed.T @ fixed + self.l2_reg * torch.eye(self.latent_dim)
+        # Cholesky materialises a (D, D) outer product per interaction, so it gets smaller blocks
+        max_nnz = self.block_nnz if self.solver == 'cg' else max(1, self.block_nnz // self.latent_dim)
+        blocks = row_blocks(matrix[0].numpy(), max_nnz)
+        if self.num_threads <= 1:
+            for block in blocks:
+                solve_block(factors, fixed, gram, matrix, block, self.ials_alpha, self.solver, self.cg_steps)
+            return
+        # Blocks write disjoint rows; one intra-op thread each avoids oversubscribing the cores
+        intra_op_threads = torch.get_num_threads()
+        torch.set_num_threads(1)
+        try:
+            with ThreadPoolExecutor(max_workers=self.num_threads) as pool:
+                list(pool.map(lambda block: solve_block(factors, fixed, gram, matrix, block, self.ials_alpha,
+                                                        self.solver, self.cg_steps), blocks))
+        finally:
+            torch.set_num_threads(intra_op_threads)
+
+    def train_epoch(self, batch=None) -> Dict[str, float]:
+        """One ALS sweep: all users, then all items. batch is unused; every sweep sees all the data."""
+        self._solve(self.user_factors, self.item_factors, self.user_items)
+        self._solve(self.item_factors, self.user_factors, self.item_users)
+        return {'loss': self.loss()}
+
+    def loss(self) -> float:
+        """Full training objective per interaction, with the non-interactions summed through the Gram matrices"""
+        indptr, indices, values = self.user_items
+        rows = torch.repeat_interleave(torch.arange(self.num_users), indptr[1:] - indptr[:-1])
+        scores = torch.cat([
+            (self.user_factors[rows[lo:lo + self.block_nnz]] * self.item_factors[indices[lo:lo + self.block_nnz]]).sum(dim=1)
+            for lo in range(0, len(indices), self.block_nnz)
+        ])
+        unobserved = (self.user_factors.T @ self.user_factors * (self.item_factors.T @ self.item_factors)).sum()
+        observed = ((1 + self.ials_alpha * values) * (1 - scores) ** 2 - scores ** 2).sum()
+        regularisation = self.l2_reg * (self.user_factors.pow(2).sum() + self.item_factors.pow(2).sum())
+        return float((unobserved + observed + regularisation) / max(len(indices), 1))
+
+    def train(self) -> None:
+        wandb.init(project=self.config.get('wandb_project', 'ials_training'), config=self.config)
+        for sweep in range(self.config.get('num_sweeps', 10)):
+            start = time.perf_counter()
+            metrics = self.train_epoch()
+            print(f"Sweep {sweep+1}, Loss: {metrics['loss']:.4f} ({time.perf_counter() - start:.1f}s)")
+            val_metrics = self.validate(self.val_data)
+            print(f"Validation metrics: {val_metrics}")
+            wandb.log({**metrics, **val_metrics, 'sweep': sweep+1})
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.save(f"{self.checkpoints_dir}/{self.model_name}_final_{timestamp}.pth")
+        wandb.finish()
+
+    def validate(self, dataset: RecommenderDataset) -> Dict[str, float]:
+        """Confidence-weighted squared error and AUC of the preference scores on held-out interactions"""
+        scores = (self.user_factors[dataset.user_ids.long()] * self.item_factors[dataset.movie_ids.long()]).sum(dim=1)
+        liked = (dataset.ratings > 0).float()
+        confidence = 1 + self.ials_alpha * dataset.ratings
+        metrics = {'val_loss': float((confidence * (liked - scores) ** 2).mean())}
+        if len(torch.unique(liked)) > 1:
+            metrics['auc_roc'] = float(roc_auc_score(liked.numpy(), scores.numpy()))
+        return metrics
+
+    def test(self) -> Dict[str, float]:
+        test_metrics = self.validate(self.test_data)
+        test_metrics['test_loss'] = test_metrics.pop('val_loss')
+        # Full-catalog top-k on the test split, with training and validation ratings masked
+        relevant, seen = holdout_matrices(self.dataset, self.test_data, [self.train_data, self.val_data], relevant_rating=1)
+        evaluator = RankingEvaluator(relevant, seen, tuple(self.config.get('ranking_ks', (10, 20))),
+                                     self.config.get('ranking_block_size', 512))
+        test_metrics.update(evaluator.evaluate(lambda users: self.user_factors[torch.from_numpy(users)] @ self.item_factors.T))
+        return test_metrics
+
+    def item_tables(self) -> Tuple[torch.Tensor, torch.Tensor, float]:
+        return self.item_factors, torch.zeros(self.num_items), 0.0
+
+    def predict(self, item_ids: torch.Tensor, ratings: torch.Tensor, k: int = 10, pos_weight: float = 1.0,
+                fold_in: str = "ials", **search_kwargs) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        return super().predict(item_ids, ratings, k, pos_weight, fold_in=fold_in, **search_kwargs)
+
+    def save(self, save_path: str) -> None:
+        torch.save({'user_factors': self.user_factors, 'item_factors': self.item_factors}, save_path)
+
+    def load(self, load_path: str) -> None:
+        state = torch.load(load_path, map_location='cpu')
+        self.user_factors, self.item_factors = state['user_factors'], state['item_factors']
+
+    def export(self, output_path: str, links_path: str | None = None) -> dict:
+        """
+        Write the item factors as a serving bundle, with ID tables for this training's encoding.
+
+        Args:
+            output_path (str): Bundle directory to create.
+            links_path (str, optional): links.csv, so the bundle's ID tables also translate TMDB IDs.
+
+        Returns:
+            dict: The manifest that was written.
+        """
+        from api.app.utils.id_map import IdTranslator
+        config = {'binarize': self.is_binary, 'min_rating': self.min_rating, 'fold_in': 'ials',
+                  'fold_in_l2_reg': self.l2_reg, 'fold_in_iters': self.fold_in_iters}
+        with tempfile.TemporaryDirectory() as id_tables_path:
+            IdTranslator.build(self.mid_map, links_path, {'num_users': self.num_users, 'pos_weight': 1.0}).save(id_tables_path)
+            return write_bundle(self.item_factors.numpy(), np.zeros(self.num_items, dtype=np.float32), 0.0, output_path,
+                                config, f"{self.model_name}:{self.config['data_path']}", id_tables_path,
+                                extra={'model_type': 'ials', 'ials_alpha': self.ials_alpha})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train implicit ALS and export a serving bundle")
+    parser.add_argument("data_path")
+    parser.add_argument("--bundle", default=None, help="serving bundle directory to write")
+    parser.add_argument("--links", default=None, help="links.csv for the bundle's TMDB ID tables")
+    parser.add_argument("--embedding-dim", type=int, default=64)
+    parser.add_argument("--alpha", type=float, default=40.0)
+    parser.add_argument("--l2-reg", type=float, default=0.1)
+    parser.add_argument("--num-sweeps", type=int, default=10)
+    parser.add_argument("--solver", default="cg", choices=["cg", "cholesky"])
+    parser.add_argument("--cg-steps", type=int, default=3)
+    parser.add_argument("--min-rating", type=float, default=4)
+    parser.add_argument("--num-threads", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--checkpoints-dir", default="checkpoints", help="directory the final weights are saved to")
+    args = parser.parse_args()
+
+    trainer = IALSTrainer()
+    trainer.build({
+        "data_path": args.data_path,
+        "embedding_dim": args.embedding_dim,
+        "alpha": args.alpha,
+        "l2_reg": args.l2_reg,
+        "num_sweeps": args.num_sweeps,
+        "solver": args.solver,
+        "cg_steps": args.cg_steps,
+        "min_rating": args.min_rating,
+        "num_threads": args.num_threads,
+        "checkpoints_dir": args.checkpoints_dir,
+    })
+    trainer.train()
+    print(f"Test results: {trainer.test()}")
+    if args.bundle:
+        trainer.export(args.bundle, args.links)
+
+
+if __name__ == "__main__":
+    main()
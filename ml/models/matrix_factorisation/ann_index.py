@@ -0,0 +1,139 @@
+import json
+import numpy as np
+import faiss
+
+
+def augment_items(item_embs: np.ndarray, item_bias: np.ndarray) -> tuple[np.ndarray, float]:
+    """
+    Reduce biased maximum inner product search to nearest-neighbour search.
+
+    Each item becomes [v, b, sqrt(M^2 - ||v||^2 - b^2)] where M is the largest norm of
+    [v, b]. All augmented items then share the norm M, and for a query [u, 1, 0] the inner
+    product equals u . v + b, so the L2-nearest item is the top scoring one.
+
+    Returns:
+        tuple[np.ndarray, float]: (num_items, D + 2) float32 vectors and M.
+    """
+    biased = np.hstack([item_embs, item_bias.reshape(-1, 1)]).astype(np.float32)
+    sq_norms = (biased ** 2).sum(axis=1)
+    max_sq_norm = float(sq_norms.max())
+    extra = np.sqrt(np.maximum(max_sq_norm - sq_norms, 0.0)).reshape(-1, 1)
+    return np.ascontiguousarray(np.hstack([biased, extra]), dtype=np.float32), float(np.sqrt(max_sq_norm))
+
+
+def augment_queries(user_embs: np.ndarray) -> np.ndarray:
+    """Turn user vectors into [u, 1, 0] queries for the augmented item space."""
+    ones = np.ones((user_embs.shape[0], 1), dtype=np.float32)
+    zeros = np.zeros((user_embs.shape[0], 1), dtype=np.float32)
+    return np.ascontiguousarray(np.hstack([user_embs.astype(np.float32), ones, zeros]))
+
+
+class MFAnnIndex:
+    """
+    Approximate top-k retrieval over matrix-factorisation item embeddings.
+
+    Supported index types are "ivf_flat", "ivf_pq" and "hnsw". Scores returned by search are
+    the model logits u . v + b_i + global_bias, the same quantity the exact path ranks by.
+    """
+
+    def __init__(self, index: faiss.Index, index_type: str, max_norm: float, global_bias: float = 0.0):
+        self.index = index
+        self.index_type = index_type
+        self.max_norm = max_norm
+        self.global_bias = global_bias
+
+    @classmethod
+    def build(cls, item_embs: np.ndarray, item_bias: np.ndarray, index_type: str = "hnsw",
+        global_bias: float = 0.0, nlist: int = 1024, pq_m: int = 26, hnsw_m: int = 32,
+        ef_construction: int = 200) -> "MFAnnIndex":
+        """
+        Build an index from the item-side tensors of a trained model.
+
+        Args:
+            item_embs (np.ndarray): Item embeddings of shape (num_items, D).
+            item_bias (np.ndarray): Item biases of shape (num_items,) or (num_items, 1).
+            index_type (str): "ivf_flat", "ivf_pq" or "hnsw".
+            global_bias (float): Global bias of the trained model.
+            nlist (int): Number of IVF lists.
+            pq_m (int): Number of PQ sub-quantizers; must divide D + 2.
+            hnsw_m (int): HNSW graph degree.
+            ef_construction (int): HNSW build-time beam width.
+        """
+        vectors, max_norm = augment_items(item_embs, item_bias)
+        d = vectors.shape[1]
+        if index_type == "ivf_flat":
+            index = faiss.index_factory(d, f"IVF{nlist},Flat")
+        elif index_type == "ivf_pq":
+            index = faiss.index_factory(d, f"IVF{nlist},PQ{pq_m}")
+        elif index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(d, hnsw_m)
+            index.hnsw.efConstruction = ef_construction
+        else:
+            raise ValueError(f"Unsupported index type: {index_type}")
+        if not index.is_trained:
+            index.train(vectors)
+        index.add(vectors)
+        print(f"Built {index_type} index over {index.ntotal} items")
+        return cls(index, index_type, max_norm, global_bias)
+
+    def search_params(self, nprobe: int | None = None, ef_search: int | None = None):
+        if self.index_type.startswith("ivf") and nprobe is not None:
+            return faiss.SearchParametersIVF(nprobe=nprobe)
+        if self.index_type == "hnsw" and ef_search is not None:
+            return faiss.SearchParametersHNSW(efSearch=ef_search)
+        return None
+
+    def search(self, user_embs: np.ndarray, k: int, exclude_ids: list[list[int]] | None = None,
+        nprobe: int | None = None, ef_search: int | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Retrieve the k best items for each user.
+
+        Args:
+            user_embs (np.ndarray): User vectors of shape (B, D).
+            k (int): Number of items per user.
+            exclude_ids (list[list[int]], optional): Item indices to drop per user; the search
+                over-fetches by the longest list so k items survive the filter.
+            nprobe (int, optional): IVF lists visited for this search.
+            ef_search (int, optional): HNSW beam width for this search.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: (B, k) logits and (B, k) item indices, -1 padded
+            if the index returned fewer candidates.
+        """
+        queries = augment_queries(user_embs)
+        extra = max((len(x) for x in exclude_ids), default=0) if exclude_ids else 0
+        fetch = min(k + extra, self.index.ntotal)
+        distances, ids = self.index.search(queries, fetch, params=self.search_params(nprobe, ef_search))
+        # ||q - x||^2 = ||q||^2 + M^2 - 2 q.x, so the inner product is recovered from the distance
+        q_sq_norms = (queries ** 2).sum(axis=1, keepdims=True)
+        logits = (q_sq_norms + self.max_norm ** 2 - distances) / 2 + self.global_bias
+
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        items = np.full((len(queries), k), -1, dtype=np.int64)
+        for row in range(len(queries)):
+            keep = ids[row] >= 0
+            if exclude_ids:
+                keep &= ~np.isin(ids[row], exclude_ids[row])
+            row_ids, row_logits = ids[row][keep][:k], logits[row][keep][:k]
+            items[row, :len(row_ids)] = row_ids
+            scores[row, :len(row_logits)] = row_logits
+        return scores, items
+
+    def save(self, path: str) -> None:
+        faiss.write_index(self.index, path)
+        with open(f"{path}.json", "w") as f:
+            json.dump({"index_type": self.index_type, "max_norm": self.max_norm,
+                       "global_bias": self.global_bias, "num_items": self.index.ntotal}, f)
+        print(f"ANN index saved to {path}")
+
+    @classmethod
+    def load(cls, path: str) -> "MFAnnIndex":
+        with open(f"{path}.json") as f:
+            meta = json.load(f)
+        try:
+            index = faiss.read_index(path, faiss.IO_FLAG_MMAP)
+        except RuntimeError:
+            # Not every index type can be memory-mapped
+            index = faiss.read_index(path)
+        print(f"ANN index loaded from {path}")
+        return cls(index, meta["index_type"], meta["max_norm"], meta.get("global_bias", 0.0))
@@ -0,0 +1,40 @@
+"""
+Build an approximate MIPS index over the item embeddings of a trained MF checkpoint.
+
+Run from the ml/ directory:
+    python -m models.matrix_factorisation.build_ann_index api/app/model_checkpoints/mf_ml32m.pth \
+        api/app/model_checkpoints/mf_ml32m_hnsw.faiss --index-type hnsw
+"""
+import argparse
+import torch
+from base.checkpointing import model_state_dict
+from models.matrix_factorisation.ann_index import MFAnnIndex
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("checkpoint", help="state_dict saved by MatrixFactorizationTrainer.save, or a training checkpoint")
+    parser.add_argument("output", help="where to write the FAISS index")
+    parser.add_argument("--index-type", choices=["ivf_flat", "ivf_pq", "hnsw"], default="hnsw")
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--pq-m", type=int, default=26)
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--ef-construction", type=int, default=200)
+    args = parser.parse_args()
+
+    state = model_state_dict(torch.load(args.checkpoint, map_location="cpu"))
+    index = MFAnnIndex.build(
+        state["item_embedding.weight"].numpy(),
+        state["item_bias.weight"].numpy(),
+        index_type=args.index_type,
+        global_bias=float(state["global_bias"]),
+        nlist=args.nlist,
+        pq_m=args.pq_m,
+        hnsw_m=args.hnsw_m,
+        ef_construction=args.ef_construction,
+    )
+    index.save(args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import torch
+
+
+def _as_batch(item_embs: torch.Tensor, item_bias: torch.Tensor, targets: torch.Tensor, weights: torch.Tensor | None):
+    """Promote single-user inputs to a batch of one and fill in default weights."""
+    if item_embs.dim() == 2:
+        item_embs = item_embs.unsqueeze(0)
+        item_bias = item_bias.reshape(1, -1)
+        targets = targets.reshape(1, -1)
+        weights = weights.reshape(1, -1) if weights is not None else None
+    item_bias = item_bias.reshape(targets.shape).to(item_embs.dtype)
+    targets = targets.to(item_embs.dtype)
+    if weights is None:
+        weights = torch.ones_like(targets)
+    return item_embs, item_bias, targets, weights.to(item_embs.dtype)
+
+
+@torch.no_grad()
+def ridge_fold_in(item_embs: torch.Tensor,
+    item_bias: torch.Tensor,
+    targets: torch.Tensor,
+    weights: torch.Tensor | None = None,
+    l2_reg: float = 0.1,
+    global_bias: float = 0.0) -> torch.Tensor:
+    """
+    Solve for user vectors with a single regularised least-squares solve.
+
+    Minimises sum_i w_i * (t_i - (u . v_i + b_i + g))^2 + l2_reg * ||u||^2, which is the
+    natural fold-in for models trained on explicit ratings.
+
+    Args:
+        item_embs (torch.Tensor): Rated item embeddings, (n, D) or (B, n, D).
+        item_bias (torch.Tensor): Rated item biases, (n,) or (B, n).
+        targets (torch.Tensor): Ratings in the model's score space, (n,) or (B, n).
+        weights (torch.Tensor, optional): Per-rating weights; 0 masks padding.
+        l2_reg (float): Ridge penalty on the user vector.
+        global_bias (float): Global bias of the trained model.
+
+    Returns:
+        torch.Tensor: User vectors of shape (B, D).
+    """
+    V, b, t, w = _as_batch(item_embs, item_bias, targets, weights)
+    eye = torch.eye(V.size(-1), dtype=V.dtype, device=V.device)
+    Vw = V * w.unsqueeze(-1)
+    A = Vw.transpose(1, 2) @ V + l2_reg * eye
+    rhs = (Vw * (t - b - global_bias).unsqueeze(-1)).sum(dim=1)
+    return torch.linalg.solve(A, rhs)
+
+
+@torch.no_grad()
+def irls_fold_in(item_embs: torch.Tensor,
+    item_bias: torch.Tensor,
+    targets: torch.Tensor,
+    weights: torch.Tensor | None = None,
+    pos_weight: float = 1.0,
+    l2_reg: float = 0.1,
+    global_bias: float = 0.0,
+    num_iters: int = 5) -> torch.Tensor:
+    """
+    Solve for user vectors with a few vectorised Newton (IRLS) steps on the BCE objective.
+
+    Minimises the same pos_weighted BCE-with-logits loss the trainer uses, summed over the
+    rated items, plus l2_reg * ||u||^2. Every step is one batched (D, D) solve, so a whole
+    batch of users is folded in together.
+
+    Args:
+        item_embs (torch.Tensor): Rated item embeddings, (n, D) or (B, n, D).
+        item_bias (torch.Tensor): Rated item biases, (n,) or (B, n).
+        targets (torch.Tensor): Binary (or soft) targets in [0, 1], (n,) or (B, n).
+        weights (torch.Tensor, optional): Per-rating weights; 0 masks padding.
+        pos_weight (float): Weight of the positive class, as in BCEWithLogitsLoss.
+        l2_reg (float): Ridge penalty on the user vector.
+        global_bias (float): Global bias of the trained model.
+        num_iters (int): Number of Newton steps.
+
+    Returns:
+        torch.Tensor: User vectors of shape (B, D).
+    """
+    V, b, t, w = _as_batch(item_embs, item_bias, targets, weights)
+    eye = torch.eye(V.size(-1), dtype=V.dtype, device=V.device)
+    # d(loss)/dz = sigmoid(z) * c - pos_weight * t and d2(loss)/dz2 = sigmoid(z) * (1 - sigmoid(z)) * c
+    c = pos_weight * t + (1.0 - t)
+    u = torch.zeros(V.size(0), V.size(-1), dtype=V.dtype, device=V.device)
+    for _ in range(num_iters):
+        z = (V @ u.unsqueeze(-1)).squeeze(-1) + b + global_bias
+        p = torch.sigmoid(z)
+        grad = (V * (w * (p * c - pos_weight * t)).unsqueeze(-1)).sum(dim=1) + 2 * l2_reg * u
+        hess = (V * (w * p * (1 - p) * c).unsqueeze(-1)).transpose(1, 2) @ V + 2 * l2_reg * eye
+        u = u - torch.linalg.solve(hess, grad)
+    return u
+
+
+@torch.no_grad()
+def ials_fold_in(item_embs: torch.Tensor,
+    targets: torch.Tensor,
+    item_gram: torch.Tensor,
+    weights: torch.Tensor | None = None,
+    alpha: float = 40.0,
+    l2_reg: float = 0.1) -> torch.Tensor:
+    """
+    Solve for user vectors exactly as an implicit-ALS user sweep does.
+
+    Minimises sum_i c_i * (p_i - u . v_i)^2 + l2_reg * ||u||^2 over the whole catalog, where
+    p_i = 1 and c_i = 1 + alpha for liked items and p_i = 0, c_i = 1 everywhere else. The
+    unobserved items enter through item_gram = V^T V, so the solve is still one (D, D) system.
+
+    Args:
+        item_embs (torch.Tensor): Rated item embeddings, (n, D) or (B, n, D).
+        targets (torch.Tensor): Binary preferences, (n,) or (B, n).
+        item_gram (torch.Tensor): Gram matrix of all item embeddings, (D, D).
+        weights (torch.Tensor, optional): Per-rating weights; 0 masks padding.
+        alpha (float): Confidence scale used in training.
+        l2_reg (float): Ridge penalty on the user vector.
+
+    Returns:
+        torch.Tensor: User vectors of shape (B, D).
+    """
+    V, _, t, w = _as_batch(item_embs, torch.zeros_like(targets, dtype=item_embs.dtype), targets, weights)
+    eye = torch.eye(V.size(-1), dtype=V.dtype, device=V.device)
+    liked = w * t
+    A = item_gram.to(V.dtype) + alpha * (V * liked.unsqueeze(-1)).transpose(1, 2) @ V + l2_reg * eye
+    rhs = (1 + alpha) * (V * liked.unsqueeze(-1)).sum(dim=1)
+    return torch.linalg.solve(A, rhs)
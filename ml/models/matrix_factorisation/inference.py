@@ -0,0 +1,163 @@
+import torch
+from abc import ABC, abstractmethod
+from typing import Tuple
+from .predict_model import prediction_model
+from .fold_in import ridge_fold_in, irls_fold_in, ials_fold_in
+from .scoring import top_k_items, quantized_top_k_items, QuantizedItemTable
+
+
+class MFInference(ABC):
+    """
+    Cold-start inference shared by the trainer and the lightweight serving model.
+
+    Subclasses provide item_tables() plus the attributes device, latent_dim, is_binary,
+    min_rating, fold_in_l2_reg and fold_in_iters. Nothing here imports training code.
+    """
+
+    quantized_table: QuantizedItemTable | None = None
+    rerank_candidates: int = 256
+    # Confidence scale of implicit-ALS models, used by the "ials" fold-in
+    ials_alpha: float = 40.0
+    _item_gram: torch.Tensor | None = None
+
+    @abstractmethod
+    def item_tables(self) -> Tuple[torch.Tensor, torch.Tensor, float]:
+        """Return (item embeddings (N, D), item biases (N,), global bias)."""
+        pass
+
+    def enable_quantized_scoring(self, mode: str | None, rerank_candidates: int = 256) -> None:
+        """
+        Score the catalog with an int8/fp16/bf16 copy of the item embeddings and re-rank the
+        best rerank_candidates exactly in float32. Passing mode=None switches back.
+        """
+        self.quantized_table = QuantizedItemTable(self.item_tables()[0], mode) if mode else None
+        self.rerank_candidates = rerank_candidates
+
+    def fold_in(self, item_ids: torch.Tensor, ratings: torch.Tensor, pos_weight: float = 1.0,
+        method: str = "irls", mask: torch.Tensor | None = None) -> torch.Tensor:
+        """
+        Compute user vectors for cold-start users from the items they rated.
+
+        Args:
+            item_ids (torch.Tensor): Rated item indices, (n,) or padded (B, n).
+            ratings (torch.Tensor): Raw ratings with the same shape as item_ids.
+            pos_weight (float): Positive class weight used during training.
+            method (str): "irls" (Newton steps on the BCE objective), "lstsq" (ridge solve),
+                "ials" (the implicit-ALS user solve, for iALS bundles) or "adam" (the original
+                optimiser loop, single user only).
+            mask (torch.Tensor, optional): 1 for real ratings, 0 for padding.
+
+        Returns:
+            torch.Tensor: User vectors of shape (B, D).
+        """
+        item_ids = item_ids.to(self.device)
+        ratings = ratings.to(self.device)
+        all_item_embs, all_item_bias, global_bias = self.item_tables()
+        item_embs = all_item_embs[item_ids]
+        item_bias = all_item_bias[item_ids]
+        weights = mask.to(self.device, torch.float32) if mask is not None else None
+
+        if method == "adam":
+            user_emb_model = prediction_model(self.latent_dim, device=self.device)
+            return user_emb_model.train_model(item_embs, ratings, item_bias, loss_type="bce_logits",
+                num_epochs=15, pos_weight=pos_weight, l2_reg=0.002, lr=0.001).detach()
+        if method == "lstsq":
+            return ridge_fold_in(item_embs, item_bias, ratings, weights,
+                l2_reg=self.fold_in_l2_reg, global_bias=global_bias)
+        if method == "irls":
+            targets = (ratings >= self.min_rating).float() if self.is_binary else ratings
+            return irls_fold_in(item_embs, item_bias, targets, weights, pos_weight=pos_weight,
+                l2_reg=self.fold_in_l2_reg, global_bias=global_bias, num_iters=self.fold_in_iters)
+        if method == "ials":
+            if self._item_gram is None:
+                self._item_gram = all_item_embs.T.float() @ all_item_embs.float()
+            targets = (ratings >= self.min_rating).float() if self.is_binary else (ratings > 0).float()
+            return ials_fold_in(item_embs, targets, self._item_gram, weights,
+                alpha=self.ials_alpha, l2_reg=self.fold_in_l2_reg)
+        raise ValueError(f"Unsupported fold-in method: {method}")
+
+    def recommend(self, user_embs: torch.Tensor, k: int, exclude_ids: torch.Tensor | None = None,
+        exclude_mask: torch.Tensor | None = None, ann_index=None, nprobe: int | None = None,
+        ef_search: int | None = None) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Rank the catalog for the given user vectors by the model logit u . v + b_i + b.
+
+        Args:
+            user_embs (torch.Tensor): User vectors of shape (B, D).
+            k (int): Number of items per user.
+            exclude_ids (torch.Tensor, optional): Item indices to leave out per user, (B, n).
+            exclude_mask (torch.Tensor, optional): 1 where exclude_ids holds a real id.
+            ann_index (MFAnnIndex, optional): Approximate index to retrieve from instead of
+                scoring every item.
+            nprobe (int, optional): IVF lists visited by the approximate search.
+            ef_search (int, optional): HNSW beam width for the approximate search.
+
+        Returns:
+            Tuple[torch.Tensor, torch.Tensor]: (B, k) scores and (B, k) item indices.
+        """
+        if ann_index is not None:
+            excluded = None
+            if exclude_ids is not None:
+                keep = exclude_mask.bool() if exclude_mask is not None else torch.ones_like(exclude_ids, dtype=torch.bool)
+                excluded = [row[row_keep].tolist() for row, row_keep in zip(exclude_ids.cpu(), keep.cpu())]
+            scores, ids = ann_index.search(user_embs.cpu().numpy(), k, excluded, nprobe=nprobe, ef_search=ef_search)
+            scores, ids = torch.from_numpy(scores), torch.from_numpy(ids)
+            return (torch.sigmoid(scores) if self.is_binary else scores), ids
+
+        item_embs, item_bias, global_bias = self.item_tables()
+        exclude = dict(
+            exclude_ids=exclude_ids.to(self.device) if exclude_ids is not None else None,
+            exclude_mask=exclude_mask.to(self.device) if exclude_mask is not None else None,
+            apply_sigmoid=self.is_binary, item_bias=item_bias, global_bias=global_bias)
+        if self.quantized_table is not None:
+            scores, ids = quantized_top_k_items(user_embs, item_embs, self.quantized_table, k,
+                rerank=self.rerank_candidates, **exclude)
+        else:
+            scores, ids = top_k_items(user_embs, item_embs, k, **exclude)
+        return scores.cpu(), ids.cpu()
+
+    def predict(self, item_ids: torch.Tensor, ratings: torch.Tensor,k:int =10,pos_weight:float =1.0,
+        fold_in: str = "adam", **search_kwargs) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        
+        user_emb = self.fold_in(item_ids, ratings, pos_weight, method=fold_in)
+        
+        # Movies the user just rated are masked out so k fresh ones come back
+        predictions, predicted_ids = self.recommend(user_emb, k, exclude_ids=item_ids.view(1, -1), **search_kwargs)
+        predictions=predictions.view(-1)
+        predicted_ids=predicted_ids.view(-1)
+
+        return predictions, predicted_ids, user_emb.cpu()
+    
+    def predict_batch(self, item_ids: list[list[int]], ratings: list[list[float]], k: int = 10,
+        pos_weight: float = 1.0, fold_in: str = "irls", **search_kwargs) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """
+        Recommend for several cold-start users at once.
+
+        Profiles are padded to the longest one, folded in together and scored with a single
+        (B, D) x (D, num_items) matmul followed by a batched top-k.
+
+        Args:
+            item_ids (list[list[int]]): Rated item indices per user.
+            ratings (list[list[float]]): Ratings per user, matching item_ids.
+            k (int): Number of recommendations per user.
+            pos_weight (float): Positive class weight used during training.
+            fold_in (str): "irls", "lstsq" or "ials"; the "adam" loop is single-user only.
+            **search_kwargs: ann_index / nprobe / ef_search, forwarded to recommend.
+
+        Returns:
+            Tuple[torch.Tensor, torch.Tensor, torch.Tensor]: (B, k) scores, (B, k) item indices
+            and (B, D) user embeddings.
+        """
+        max_len = max(len(x) for x in item_ids)
+        padded_ids = torch.zeros(len(item_ids), max_len, dtype=torch.long)
+        padded_ratings = torch.zeros(len(item_ids), max_len, dtype=torch.float32)
+        mask = torch.zeros(len(item_ids), max_len, dtype=torch.float32)
+        for row, (ids, rs) in enumerate(zip(item_ids, ratings)):
+            padded_ids[row, :len(ids)] = torch.as_tensor(ids, dtype=torch.long)
+            padded_ratings[row, :len(rs)] = torch.as_tensor(rs, dtype=torch.float32)
+            mask[row, :len(ids)] = 1.0
+        user_embs = self.fold_in(padded_ids, padded_ratings, pos_weight, method=fold_in, mask=mask)
+
+        scores, predicted_ids = self.recommend(user_embs, k, exclude_ids=padded_ids, exclude_mask=mask, **search_kwargs)
+
+        return scores, predicted_ids, user_embs.cpu()
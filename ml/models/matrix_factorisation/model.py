@@ -1,8 +1,18 @@
 import torch 
 import torch.nn as nn
 
+LOSS_FUNCTIONS = {
+    "mse": nn.MSELoss,
+    "mae": nn.L1Loss,
+    "bce": nn.BCELoss,
+    "smoothl1": nn.SmoothL1Loss,
+    "huber": nn.HuberLoss
+}
+
+
 class MatrixFactorizationModel(nn.Module):
-    def __init__(self, num_users: int, num_items: int, embedding_dim: int = 64, dropout_rate: float = 0.2):
+    def __init__(self, num_users: int, num_items: int, embedding_dim: int = 64, dropout_rate: float = 0.2,
+                 sparse: bool = False):
         """
         Initialize the Matrix Factorization model.
 
@@ -10,13 +20,16 @@ class MatrixFactorizationModel(nn.Module):
             num_users (int): Number of users.
             num_items (int): Number of items.
             embedding_dim (int): Dimension of the user and item embeddings.
+            sparse (bool): Produce sparse gradients for the embedding and bias tables, touching only the
+                rows in the batch. Needs a sparse-aware optimizer for those tables (see sparse_parameters).
         """
         super(MatrixFactorizationModel, self).__init__()
-        self.user_embedding = nn.Embedding(num_users, embedding_dim)
-        self.item_embedding = nn.Embedding(num_items, embedding_dim)
+        self.sparse = sparse
+        self.user_embedding = nn.Embedding(num_users, embedding_dim, sparse=sparse)
+        self.item_embedding = nn.Embedding(num_items, embedding_dim, sparse=sparse)
 
-        self.user_bias = nn.Embedding(num_users, 1)
-        self.item_bias = nn.Embedding(num_items, 1)
+        self.user_bias = nn.Embedding(num_users, 1, sparse=sparse)
+        self.item_bias = nn.Embedding(num_items, 1, sparse=sparse)
         self.global_bias = nn.Parameter(torch.zeros(1))
         
         # Batch normalization for embeddings
@@ -25,6 +38,8 @@ class MatrixFactorizationModel(nn.Module):
         
         # Dropout for regularization
         self.dropout = nn.Dropout(dropout_rate)
+        # Plain dict, so the cached loss modules stay out of state_dict()
+        self._loss_fns = {}
         
         # Initialize embeddings
         self._init_weights()
@@ -42,6 +57,15 @@ class MatrixFactorizationModel(nn.Module):
         # Initialize global bias to zero
         nn.init.constant_(self.global_bias, 0.0)
 
+    def sparse_parameters(self) -> list[nn.Parameter]:
+        """Embedding and bias tables, which get sparse gradients when the model is sparse"""
+        return [self.user_embedding.weight, self.item_embedding.weight, self.user_bias.weight, self.item_bias.weight]
+
+    def dense_parameters(self) -> list[nn.Parameter]:
+        """Global bias and BatchNorm parameters, which always get dense gradients"""
+        sparse_ids = {id(p) for p in self.sparse_parameters()}
+        return [p for p in self.parameters() if id(p) not in sparse_ids]
+
     def forward(self, user_ids: torch.Tensor, item_ids: torch.Tensor) -> torch.Tensor:
         """
         Forward pass to compute the predicted scores.
@@ -72,28 +96,34 @@ class MatrixFactorizationModel(nn.Module):
 
         return predictions
     
-    def loss(self, loss_type: str, predictions: torch.Tensor, targets: torch.Tensor, l2_reg: float = 0.01, pos_weight: float = 1.0) -> torch.Tensor:
-        
-        if loss_type == 'bce_logits':
-            # Use BCEWithLogitsLoss with pos_weight for class imbalance
-            pos_weight_tensor = torch.tensor(pos_weight, device=predictions.device)
-            loss_fn = nn.BCEWithLogitsLoss(pos_weight=pos_weight_tensor)
-            base_loss = loss_fn(predictions, targets)
-        else:
-            # Compute base loss
-            loss_functions = {
-                "mse": nn.MSELoss(),
-                "mae": nn.L1Loss(), 
-                "bce": nn.BCELoss(),
-                "smoothl1": nn.SmoothL1Loss(),
-                "huber": nn.HuberLoss()
-            }
-            if loss_type not in loss_functions:
+    def _loss_fn(self, loss_type: str, pos_weight: float, device: torch.device) -> nn.Module:
+        """Loss module for the configuration, built once instead of on every step"""
+        key = (loss_type, pos_weight, device)
+        if key not in self._loss_fns:
+            if loss_type == 'bce_logits':
+                # Use BCEWithLogitsLoss with pos_weight for class imbalance
+                self._loss_fns[key] = nn.BCEWithLogitsLoss(pos_weight=torch.tensor(pos_weight, device=device))
+            elif loss_type in LOSS_FUNCTIONS:
+                self._loss_fns[key] = LOSS_FUNCTIONS[loss_type]()
+            else:
                 raise ValueError(f"Unsupported loss type: {loss_type}")
-            if loss_type == 'bce':
-                predictions = torch.sigmoid(predictions)
-            base_loss = loss_functions[loss_type](predictions, targets)
+        return self._loss_fns[key]
+
+    def loss(self, loss_type: str, predictions: torch.Tensor, targets: torch.Tensor, l2_reg: float = 0.01, pos_weight: float = 1.0,
+             user_ids: torch.Tensor | None = None, item_ids: torch.Tensor | None = None) -> torch.Tensor:
         
+        if loss_type == 'bce':
+            predictions = torch.sigmoid(predictions)
+        base_loss = self._loss_fn(loss_type, pos_weight, predictions.device)(predictions, targets)
+        
+        if self.sparse:
+            # Penalise only the rows in the batch (mean squared norm), so the gradient stays sparse
+            if user_ids is None or item_ids is None:
+                raise ValueError("user_ids and item_ids are required for the loss of a sparse model")
+            l2_loss = (self.user_embedding(user_ids).pow(2).sum(dim=1).mean()
+                       + self.item_embedding(item_ids).pow(2).sum(dim=1).mean())
+            return base_loss + l2_reg * l2_loss
+
         # Add L2 regularization only to embeddings (not biases)
         l2_loss = 0
         l2_loss += torch.norm(self.user_embedding.weight, p=2)
@@ -16,9 +16,7 @@ class prediction_model(nn.Module):
         item_emb=self.item_bn(item_emb)
         user_emb = user_emb.expand(item_emb.size(0), -1)
         item_bias = item_bias.view(-1) 
-        print(f"user_emb: {user_emb.shape}, item_emb: {item_emb.shape}")
         preds=(user_emb*item_emb).sum(dim=1)+self.bias+item_bias
-        print(f"preds: {preds.shape}")
         return preds
 
     def loss(self,predictions:torch.Tensor,target:torch.Tensor,
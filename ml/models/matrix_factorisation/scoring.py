@@ -0,0 +1,149 @@
+import torch
+
+
+def _mask_excluded(scores: torch.Tensor, k: int, exclude_ids: torch.Tensor | None,
+    exclude_mask: torch.Tensor | None) -> int:
+    """Set excluded items to -inf in place and return k capped at the items left per row."""
+    if exclude_ids is None:
+        return k
+    rows = torch.arange(scores.size(0), device=scores.device).unsqueeze(1).expand_as(exclude_ids)
+    if exclude_mask is not None:
+        keep = exclude_mask.bool()
+        rows, exclude_ids = rows[keep], exclude_ids[keep]
+    scores[rows, exclude_ids] = float("-inf")
+    if k > scores.size(1) - exclude_ids.size(-1):
+        # Only near-full-catalog requests can run out of unseen items
+        k = min(k, int(torch.isfinite(scores).sum(dim=1).min()))
+    return k
+
+
+@torch.no_grad()
+def top_k_items(user_embs: torch.Tensor,
+    item_embs: torch.Tensor,
+    k: int,
+    exclude_ids: torch.Tensor | None = None,
+    exclude_mask: torch.Tensor | None = None,
+    apply_sigmoid: bool = False,
+    item_bias: torch.Tensor | None = None,
+    global_bias: float = 0.0) -> tuple[torch.Tensor, torch.Tensor]:
+    """
+    Score every item for each user and keep the k best with a partial selection.
+
+    Excluded items are masked to -inf before selection, so k unseen items come back without
+    over-fetching. Monotone transforms such as the sigmoid are only applied to the k winners.
+
+    Args:
+        user_embs (torch.Tensor): User vectors of shape (B, D).
+        item_embs (torch.Tensor): Item embedding table of shape (num_items, D).
+        k (int): Number of items to return per user.
+        exclude_ids (torch.Tensor, optional): Item indices to drop per user, (B, n).
+        exclude_mask (torch.Tensor, optional): 1 where exclude_ids holds a real id, 0 for padding.
+        apply_sigmoid (bool): Whether to map the returned logits to probabilities.
+        item_bias (torch.Tensor, optional): Item biases added to the scores, (num_items,).
+        global_bias (float): Global bias added to the returned scores.
+
+    Returns:
+        tuple[torch.Tensor, torch.Tensor]: (B, k) scores and (B, k) item indices.
+    """
+    scores = user_embs @ item_embs.T  # (B, num_items)
+    if item_bias is not None:
+        scores += item_bias.view(1, -1)
+    k = _mask_excluded(scores, k, exclude_ids, exclude_mask)
+    top_scores, top_ids = scores.topk(min(k, scores.size(1)), dim=1)
+    top_scores = top_scores + global_bias
+    if apply_sigmoid:
+        top_scores = torch.sigmoid(top_scores)
+    return top_scores, top_ids
+
+
+@torch.no_grad()
+def full_sort_items(user_embs: torch.Tensor, item_embs: torch.Tensor, k: int,
+    apply_sigmoid: bool = False, item_bias: torch.Tensor | None = None,
+    global_bias: float = 0.0) -> tuple[torch.Tensor, torch.Tensor]:
+    """Reference path: transform every score and fully sort the catalog before slicing."""
+    scores = user_embs @ item_embs.T + global_bias
+    if item_bias is not None:
+        scores += item_bias.view(1, -1)
+    if apply_sigmoid:
+        scores = torch.sigmoid(scores)
+    scores, ids = scores.sort(dim=1, descending=True)
+    return scores[:, :k], ids[:, :k]
+
+
+class QuantizedItemTable:
+    """
+    Low-precision copy of the item embeddings for a first scoring pass.
+
+    Modes:
+        "fp16" / "bf16": half-precision copy, scored with a half-precision matmul.
+        "int8": per-row symmetric int8 with a float32 scale per item, dequantised in
+            cache-sized chunks while scoring.
+    """
+
+    def __init__(self, item_embs: torch.Tensor, mode: str = "fp16", chunk_size: int = 8192):
+        self.mode = mode
+        self.chunk_size = chunk_size
+        if mode in ("fp16", "bf16"):
+            self.dtype = torch.float16 if mode == "fp16" else torch.bfloat16
+            self.weights = item_embs.detach().to(self.dtype).contiguous()
+            self.scales = None
+        elif mode == "int8":
+            self.scales = (item_embs.detach().abs().amax(dim=1) / 127.0).clamp_min(1e-12).float()
+            self.weights = (item_embs.detach() / self.scales.unsqueeze(1)).round().clamp(-127, 127).to(torch.int8)
+        else:
+            raise ValueError(f"Unsupported quantization mode: {mode}")
+
+    @property
+    def nbytes(self) -> int:
+        size = self.weights.numel() * self.weights.element_size()
+        if self.scales is not None:
+            size += self.scales.numel() * self.scales.element_size()
+        return size
+
+    @torch.no_grad()
+    def scores(self, user_embs: torch.Tensor) -> torch.Tensor:
+        """Approximate u . v for every item, returned as float32 of shape (B, num_items)."""
+        if self.scales is None:
+            return (user_embs.to(self.dtype) @ self.weights.T).float()
+        out = torch.empty(user_embs.size(0), self.weights.size(0), dtype=torch.float32, device=user_embs.device)
+        for start in range(0, self.weights.size(0), self.chunk_size):
+            chunk = self.weights[start:start + self.chunk_size].float()
+            out[:, start:start + self.chunk_size] = user_embs @ chunk.T
+        return out.mul_(self.scales.unsqueeze(0))
+
+
+@torch.no_grad()
+def quantized_top_k_items(user_embs: torch.Tensor,
+    item_embs: torch.Tensor,
+    table: QuantizedItemTable,
+    k: int,
+    rerank: int = 256,
+    exclude_ids: torch.Tensor | None = None,
+    exclude_mask: torch.Tensor | None = None,
+    apply_sigmoid: bool = False,
+    item_bias: torch.Tensor | None = None,
+    global_bias: float = 0.0) -> tuple[torch.Tensor, torch.Tensor]:
+    """
+    Two-pass top-k: shortlist with the quantized table, then re-rank the shortlist exactly.
+
+    The first pass keeps max(k, rerank) candidates per user by approximate score; their
+    float32 scores are then recomputed from item_embs and the k best returned. Arguments
+    and return values match top_k_items.
+    """
+    approx = table.scores(user_embs)
+    if item_bias is not None:
+        approx += item_bias.view(1, -1)
+    k = _mask_excluded(approx, k, exclude_ids, exclude_mask)
+    num_candidates = min(max(k, rerank), approx.size(1))
+    candidate_scores, candidates = approx.topk(num_candidates, dim=1)
+
+    exact = torch.einsum("bd,bcd->bc", user_embs, item_embs[candidates])
+    if item_bias is not None:
+        exact += item_bias[candidates]
+    # Keep excluded items out even when the shortlist had to include some
+    exact[torch.isinf(candidate_scores)] = float("-inf")
+    top_scores, positions = exact.topk(min(k, num_candidates), dim=1)
+    top_scores = top_scores + global_bias
+    if apply_sigmoid:
+        top_scores = torch.sigmoid(top_scores)
+    return top_scores, candidates.gather(1, positions)
@@ -0,0 +1,162 @@
+"""
+Inference-only bundle for the matrix-factorisation model.
+
+A bundle is a directory holding just what cold-start serving touches:
+
+    manifest.json        format version, model version, fold-in hyperparameters
+    item_embedding.npy   (num_items, D) float32
+    item_bias.npy        (num_items,) float32
+    id_tables/           ID translation tables (see api/app/utils/id_map.py), optional
+
+Write one from a training checkpoint with:
+
+    python -m models.matrix_factorisation.serving export api/app/model_checkpoints/mf_ml32m.pth \
+        api/app/model_checkpoints/mf_ml32m_bundle --id-tables api/app/model_checkpoints/id_tables
+
+Loading a bundle only needs numpy and torch: the user tables are never allocated and the
+training stack (wandb, tqdm, sklearn, the dataset loader) is never imported.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+import numpy as np
+import torch
+from typing import Tuple
+from base.checkpointing import model_state_dict
+from .inference import MFInference
+
+BUNDLE_FORMAT_VERSION = 1
+
+
+class MFServingModel(MFInference):
+
+    def __init__(self, item_embs: torch.Tensor, item_bias: torch.Tensor, manifest: dict):
+        self.item_embs = item_embs
+        self.item_bias = item_bias
+        self.manifest = manifest
+        self.global_bias = float(manifest.get("global_bias", 0.0))
+        self.device = torch.device("cpu")
+        self.latent_dim = item_embs.size(1)
+        self.is_binary = manifest.get("binarize", True)
+        self.min_rating = manifest.get("min_rating", 1)
+        self.fold_in_l2_reg = manifest.get("fold_in_l2_reg", 0.1)
+        self.fold_in_iters = manifest.get("fold_in_iters", 5)
+        self.ials_alpha = manifest.get("ials_alpha", self.ials_alpha)
+
+    def item_tables(self) -> Tuple[torch.Tensor, torch.Tensor, float]:
+        return self.item_embs, self.item_bias, self.global_bias
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "MFServingModel":
+        with open(os.path.join(path, "manifest.json")) as f:
+            manifest = json.load(f)
+        if manifest.get("format_version", 0) > BUNDLE_FORMAT_VERSION:
+            raise ValueError(f"Bundle format {manifest['format_version']} is newer than supported ({BUNDLE_FORMAT_VERSION})")
+        # Copy-on-write maps give torch writable views without reading the file up front
+        mmap_mode = "c" if mmap else None
+        item_embs = torch.from_numpy(np.load(os.path.join(path, "item_embedding.npy"), mmap_mode=mmap_mode))
+        item_bias = torch.from_numpy(np.load(os.path.join(path, "item_bias.npy"), mmap_mode=mmap_mode))
+        print(f"Serving bundle {manifest.get('model_version')} loaded from {path}")
+        return cls(item_embs, item_bias, manifest)
+
+
+def write_bundle(item_embs: np.ndarray, item_bias: np.ndarray, global_bias: float, output_path: str, config: dict,
+                 source: str, id_tables_path: str | None = None, extra: dict | None = None) -> dict:
+    """
+    Write item tables as an inference bundle; shared by every model that serves through MFServingModel.
+
+    Args:
+        item_embs (np.ndarray): Item embeddings, (num_items, D).
+        item_bias (np.ndarray): Item biases, (num_items,).
+        global_bias (float): Global bias added to every score.
+        output_path (str): Bundle directory to create.
+        config (dict): Model config; binarize, min_rating and the fold-in keys are recorded.
+        source (str): What the bundle was built from, recorded in the manifest.
+        id_tables_path (str, optional): Directory of ID tables to copy into the bundle.
+        extra (dict, optional): Model-specific manifest entries.
+
+    Returns:
+        dict: The manifest that was written.
+    """
+    item_embs = np.ascontiguousarray(item_embs, dtype=np.float32)
+    item_bias = np.ascontiguousarray(item_bias, dtype=np.float32).reshape(-1)
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(item_embs.tobytes())
+    digest.update(item_bias.tobytes())
+    manifest = {
+        "format_version": BUNDLE_FORMAT_VERSION,
+        "model_version": digest.hexdigest(),
+        "source_checkpoint": source,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "num_items": int(item_embs.shape[0]),
+        "embedding_dim": int(item_embs.shape[1]),
+        "global_bias": float(global_bias),
+        "binarize": config.get("binarize", True),
+        "min_rating": config.get("min_rating", 1),
+        "pos_weight": config.get("pos_weight", 1.0),
+        "fold_in": config.get("fold_in", "irls"),
+        "fold_in_l2_reg": config.get("fold_in_l2_reg", 0.1),
+        "fold_in_iters": config.get("fold_in_iters", 5),
+        **(extra or {}),
+    }
+
+    os.makedirs(output_path, exist_ok=True)
+    np.save(os.path.join(output_path, "item_embedding.npy"), item_embs)
+    np.save(os.path.join(output_path, "item_bias.npy"), item_bias)
+    if id_tables_path is not None:
+        shutil.copytree(id_tables_path, os.path.join(output_path, "id_tables"), dirs_exist_ok=True)
+        with open(os.path.join(id_tables_path, "meta.json")) as f:
+            manifest["pos_weight"] = json.load(f).get("pos_weight", manifest["pos_weight"])
+    with open(os.path.join(output_path, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Serving bundle {manifest['model_version']} written to {output_path}")
+    return manifest
+
+
+def export_bundle(checkpoint_path: str, output_path: str, config: dict, id_tables_path: str | None = None) -> dict:
+    """
+    Write an inference bundle from a MatrixFactorizationTrainer checkpoint.
+
+    Args:
+        checkpoint_path (str): state_dict saved by MatrixFactorizationTrainer.save, or a training checkpoint.
+        output_path (str): Bundle directory to create.
+        config (dict): Model config; binarize, min_rating and the fold-in keys are recorded.
+        id_tables_path (str, optional): Directory of ID tables to copy into the bundle.
+
+    Returns:
+        dict: The manifest that was written.
+    """
+    state = model_state_dict(torch.load(checkpoint_path, map_location="cpu"))
+    return write_bundle(state["item_embedding.weight"].numpy(), state["item_bias.weight"].numpy(),
+                        float(state["global_bias"]), output_path, config, os.path.basename(checkpoint_path),
+                        id_tables_path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export = subparsers.add_parser("export", help="write a serving bundle from a training checkpoint")
+    export.add_argument("checkpoint")
+    export.add_argument("output")
+    export.add_argument("--id-tables", default=None, help="ID table directory to include")
+    export.add_argument("--min-rating", type=float, default=4)
+    export.add_argument("--no-binarize", action="store_true")
+    export.add_argument("--fold-in", default="irls", choices=["irls", "lstsq"])
+    export.add_argument("--fold-in-l2-reg", type=float, default=0.1)
+    export.add_argument("--fold-in-iters", type=int, default=5)
+    args = parser.parse_args()
+
+    export_bundle(args.checkpoint, args.output, {
+        "binarize": not args.no_binarize,
+        "min_rating": args.min_rating,
+        "fold_in": args.fold_in,
+        "fold_in_l2_reg": args.fold_in_l2_reg,
+        "fold_in_iters": args.fold_in_iters,
+    }, args.id_tables)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,64 @@
 from datetime import datetime
 import numpy as np
 import os
+import sys
 from base.base_model import RecommenderModel
 from models.matrix_factorisation.model import MatrixFactorizationModel
 from base.datasetloader import DatasetLoader
-from typing import Dict, Tuple
+from base.sharded_dataset import ShardedDatasetLoader
+from typing import Dict, Iterator, Tuple
 from torch.utils.data import DataLoader
 import torch
+import torch.distributed as dist
 import torch.nn as nn
 import torch.nn.functional as F
 import wandb
 from tqdm import tqdm
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, roc_auc_score
-from .predict_model import prediction_model
+from base.ranking_metrics import RankingEvaluator, holdout_matrices, holdout_partitions
+from base.checkpointing import AsyncCheckpointer, model_state_dict, snapshot
+from .inference import MFInference
 
-class MatrixFactorizationTrainer(RecommenderModel):
+def build_optimizers(model: MatrixFactorizationModel, learning_rate: float, sparse_optimizer: str = 'sparse_adam',
+                     sparse_learning_rate: float | None = None) -> list[torch.optim.Optimizer]:
+    """
+    Create the optimizers for a MatrixFactorizationModel.
+
+    A dense model gets one Adam over all parameters. A sparse model gets Adam for the dense
+    parameters (global bias, BatchNorm) plus a sparse-aware optimizer for the embedding tables,
+    which only updates the rows present in the batch.
+
+    Args:
+        model (MatrixFactorizationModel): Model to optimise.
+        learning_rate (float): Learning rate of the dense optimizer.
+        sparse_optimizer (str): 'sparse_adam' or 'adagrad', used for the embedding tables of a sparse model.
+        sparse_learning_rate (float | None): Learning rate for the embedding tables, defaults to learning_rate.
+
+    Returns:
+        list[torch.optim.Optimizer]: Optimizers to step together.
+    """
+    if not model.sparse:
+        return [torch.optim.Adam(model.parameters(), lr=learning_rate)]
+    sparse_learning_rate = sparse_learning_rate or learning_rate
+    if sparse_optimizer == 'sparse_adam':
+        embedding_optimizer = torch.optim.SparseAdam(model.sparse_parameters(), lr=sparse_learning_rate)
+    elif sparse_optimizer == 'adagrad':
+        embedding_optimizer = torch.optim.Adagrad(model.sparse_parameters(), lr=sparse_learning_rate)
+    else:
+        raise ValueError(f"Unsupported sparse optimizer: {sparse_optimizer}")
+    return [torch.optim.Adam(model.dense_parameters(), lr=learning_rate), embedding_optimizer]
+
+
+class MatrixFactorizationTrainer(MFInference, RecommenderModel):
+    # Overwritten by _init_distributed when launched with torchrun
+    rank = 0
+    world_size = 1
+    # Opt-in fast path for the forward + loss of each step, see _build_loss_step
+    compile_step = False
+    autocast_dtype: str | None = None
+    _loss_step = None
+    # Set once the fast step has completed a forward and backward; from then on its errors are real
+    _loss_step_ok = False
 
     def build_for_inference(self,config:dict):
         self.config=config
@@ -33,30 +77,72 @@ class MatrixFactorizationTrainer(RecommenderModel):
         self.is_binary = config.get('binarize', True)
         self.threshold = config.get('threshold', 0.5)
         self.l2_reg = config.get('l2_reg', 0.01) 
+        self.min_rating = config.get('min_rating', 1)
+        self.fold_in_l2_reg = config.get('fold_in_l2_reg', 0.1)
+        self.fold_in_iters = config.get('fold_in_iters', 5)
+
+    def _init_distributed(self, config: dict) -> None:
+        """
+        Join the process group when launched by torchrun with more than one process.
+
+        Ranks other than 0 have stdout silenced, so only rank 0 prints; it is also the only rank that
+        logs to wandb and writes checkpoints.
+        """
+        self.world_size = int(os.environ.get('WORLD_SIZE', 1))
+        self.rank = int(os.environ.get('RANK', 0))
+        if self.world_size == 1:
+            return
+        if not dist.is_initialized():
+            dist.init_process_group(backend=config.get('dist_backend', 'gloo'))
+        # Split the node's cores between its ranks rather than every rank using all of them
+        local_world_size = int(os.environ.get('LOCAL_WORLD_SIZE', 1))
+        torch.set_num_threads(config.get('threads_per_rank', max(1, (os.cpu_count() or 1) // local_world_size)))
+        if self.rank != 0:
+            sys.stdout = open(os.devnull, 'w')
 
     def build(self,config:dict):
         self.config = config
         self.model_name = config.get('model_name', 'matrix_factorization')
-        self.device= torch.device('cuda' if torch.cuda.is_available() else 'mps' if torch.backends.mps.is_available() else 'cpu')
+        self._init_distributed(config)
+        self.device= torch.device('cpu' if self.world_size > 1 else 'cuda' if torch.cuda.is_available() else 'mps' if torch.backends.mps.is_available() else 'cpu')
         self.latent_dim = config.get('embedding_dim', 64)
-        self.dataset= DatasetLoader(
-            path=config['data_path'],
-            dataset_type=config.get('dataset_type', 'csv'),
-            separator=config.get('separator', ','),
-            batch_size=config.get('batch_size', 64),
-            binarize=config.get('binarize', False),
-            min_rating=config.get('min_rating', 1)
-        )
+        if self.rank != 0:
+            # Let rank 0 parse the ratings and write the dataset cache, then load from it
+            dist.barrier()
+        if config.get('dataset_type') == 'shards':
+            # Directory written by base.sharded_dataset, streamed instead of loaded into memory
+            self.dataset = ShardedDatasetLoader(
+                path=config['data_path'],
+                batch_size=config.get('batch_size', 64),
+                binarize=config.get('binarize', False),
+                min_rating=config.get('min_rating', 1),
+                buffer_size=config.get('shuffle_buffer_size', 2_000_000),
+                seed=config.get('split_seed', 42)
+            )
+        else:
+            self.dataset= DatasetLoader(
+                path=config['data_path'],
+                dataset_type=config.get('dataset_type', 'csv'),
+                separator=config.get('separator', ','),
+                batch_size=config.get('batch_size', 64),
+                binarize=config.get('binarize', False),
+                min_rating=config.get('min_rating', 1),
+                cache_dir=config.get('dataset_cache_dir', 'data/cache'),
+                seed=config.get('split_seed', 42)
+            )
+        if self.rank == 0 and self.world_size > 1:
+            dist.barrier()
         self.uid_map = self.dataset._uid_map
         self.mid_map = self.dataset._mid_map
         self.num_users = self.dataset.num_users
         self.num_items = self.dataset.num_items
-        self.train_data,self.val_data, self.test_data = self.dataset.split_data()
+        self.train_data, self.val_data, self.test_data = self.dataset.train_data, self.dataset.val_data, self.dataset.test_data
         self.model = MatrixFactorizationModel(
             num_users=self.num_users,
             num_items=self.num_items,
             embedding_dim=config.get('embedding_dim', 64),
-            dropout_rate=config.get('dropout_rate', 0.2)
+            dropout_rate=config.get('dropout_rate', 0.2),
+            sparse=config.get('sparse_embeddings', False)
         ).to(self.device)
         print(self.model)
 
@@ -64,20 +150,53 @@ class MatrixFactorizationTrainer(RecommenderModel):
         self.is_binary = config.get('binarize', True)
         self.threshold = config.get('threshold', 0.5)
         self.l2_reg = config.get('l2_reg', 0.01)
+        self.min_rating = config.get('min_rating', 1)
+        self.fold_in_l2_reg = config.get('fold_in_l2_reg', 0.1)
+        self.fold_in_iters = config.get('fold_in_iters', 5)
         
         self.checkpoints_dir = config.get('checkpoints_dir', 'checkpoints') 
         os.makedirs(self.checkpoints_dir, exist_ok=True)
         self.pos_weight = self._calculate_pos_weight()
         print(f"Calculated pos_weight: {self.pos_weight}")
         
-        self.optimizer = torch.optim.Adam(self.model.parameters(), lr=config.get('learning_rate', 0.001))
-        self.scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(
-            self.optimizer, mode='min', patience=5, factor=0.3
+        self.compile_step = config.get('compile_step', False)
+        self.autocast_dtype = config.get('autocast_dtype')
+
+        self.optimizers = build_optimizers(
+            self.model,
+            learning_rate=config.get('learning_rate', 0.001),
+            sparse_optimizer=config.get('sparse_optimizer', 'sparse_adam'),
+            sparse_learning_rate=config.get('sparse_learning_rate')
         )
+        self.optimizer = self.optimizers[0]
+        self.schedulers = [
+            torch.optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode='min', patience=5, factor=0.3)
+            for optimizer in self.optimizers
+        ]
+        self.scheduler = self.schedulers[0]
         self.early_stopping_patience = config.get('early_stopping_patience', 10)
         self.best_val_loss = float('inf')
         self.patience_counter = 0
         self.best_model_state = None
+        self.start_epoch = 0
+        self.checkpointer = AsyncCheckpointer(
+            self.checkpoints_dir, self.model_name,
+            keep_last=config.get('keep_last_checkpoints', 3),
+            keep_best=config.get('keep_best_checkpoints', 1)
+        ) if self.rank == 0 else None
+        self.ranking_ks = tuple(config.get('ranking_ks', (10, 20)))
+        self.ranking_block_size = config.get('ranking_block_size', 512)
+        self.ranking_eval_every = config.get('ranking_eval_every', 0)
+        # Held-out ratings counted as relevant by the ranking metrics (binarized ratings are 0/1)
+        self.relevant_rating = 1 if self.is_binary else config.get('relevant_rating', 4)
+        # Sharded splits are read back one range of users at a time on every evaluation
+        self.ranking_users_per_partition = config.get('ranking_users_per_partition', 50_000)
+        self._ranking_evaluators = {}
+        if not isinstance(self.dataset, ShardedDatasetLoader):
+            # Built up front: collecting the splits iterates DataLoaders, which would otherwise draw
+            # from the global RNG in the middle of training
+            splits = ['test', 'val'] if self.ranking_eval_every and self.val_data else ['test']
+            self._ranking_evaluators = {split: self._build_ranking_evaluator(split) for split in splits}
         
    
     def _calculate_pos_weight(self) -> float:
@@ -103,33 +222,190 @@ class MatrixFactorizationTrainer(RecommenderModel):
         print(f"Dataset stats - Positive: {pos_count}, Negative: {neg_count}")
         return min(pos_weight, 10.0)  # Cap the weight to prevent extreme values
 
+    def _compute_loss(self, user_ids: torch.Tensor, item_ids: torch.Tensor, ratings: torch.Tensor) -> torch.Tensor:
+        predictions = self.model(user_ids, item_ids)
+        return self.model.loss(self.loss_type, predictions, ratings, self.l2_reg, self.pos_weight, user_ids, item_ids)
+
+    def _build_loss_step(self):
+        """
+        Forward + loss of a training step, under reduced-precision autocast ('autocast_dtype', e.g.
+        'bfloat16') and/or compiled with torch.compile ('compile_step') when configured.
+        """
+        step = self._compute_loss
+        if self.autocast_dtype:
+            dtype = getattr(torch, self.autocast_dtype)
+            eager_step = step
+
+            def step(user_ids: torch.Tensor, item_ids: torch.Tensor, ratings: torch.Tensor) -> torch.Tensor:
+                with torch.autocast(self.device.type, dtype=dtype):
+                    return eager_step(user_ids, item_ids, ratings).float()
+        if self.compile_step and self.model.sparse:
+            print("Warning: torch.compile cannot differentiate sparse embedding lookups, compiling skipped")
+        elif self.compile_step:
+            step = torch.compile(step)
+        return step
+
+    def _forward_backward(self, user_ids: torch.Tensor, item_ids: torch.Tensor, ratings: torch.Tensor) -> torch.Tensor:
+        if self._loss_step is None:
+            self._loss_step = self._build_loss_step()
+            self._loss_step_ok = False
+        if self._loss_step == self._compute_loss:
+            loss = self._compute_loss(user_ids, item_ids, ratings)
+            loss.backward()
+            return loss
+        if self._loss_step_ok:
+            loss = self._loss_step(user_ids, item_ids, ratings)
+            loss.backward()
+            return loss
+        # Compilation or autocast support errors surface on the first forward or backward, before
+        # any optimizer step, so only that step falls back; BatchNorm statistics are restored so
+        # the eager retry sees the batch once
+        buffers = [buffer.clone() for buffer in self.model.buffers()]
+        try:
+            loss = self._loss_step(user_ids, item_ids, ratings)
+            loss.backward()
+        except Exception as e:
+            print(f"Warning: fast training step unavailable ({type(e).__name__}: {e}); using eager fp32")
+            self._loss_step = self._compute_loss
+            with torch.no_grad():
+                for buffer, saved in zip(self.model.buffers(), buffers):
+                    buffer.copy_(saved)
+            for optimizer in self.optimizers:
+                optimizer.zero_grad()
+            return self._forward_backward(user_ids, item_ids, ratings)
+        self._loss_step_ok = True
+        return loss
+
     def train_epoch(self, batch: Tuple[torch.Tensor, torch.Tensor, torch.Tensor]) -> Dict[str,float]:
         user_ids, item_ids, ratings = batch
-        self.optimizer.zero_grad()
-        
-        predictions = self.model(user_ids, item_ids)
-        loss = self.model.loss(self.loss_type, predictions, ratings, self.l2_reg, self.pos_weight)
+        for optimizer in self.optimizers:
+            optimizer.zero_grad()
         
-        loss.backward()
+        loss = self._forward_backward(user_ids, item_ids, ratings)
+        if self.model.sparse:
+            # Merge the duplicate rows from the forward and L2 lookups so the clipping norm is exact
+            for param in self.model.sparse_parameters():
+                param.grad = param.grad.coalesce()
+        if self.world_size > 1:
+            self._all_reduce_gradients()
         # Gradient clipping for stability
         torch.nn.utils.clip_grad_norm_(self.model.parameters(), max_norm=0.5)
-        self.optimizer.step()
+        for optimizer in self.optimizers:
+            optimizer.step()
         
         # Calculate batch metrics for monitoring
         batch_metrics = {'loss': loss.item()}
         
         return batch_metrics
     
+    def _all_reduce_gradients(self) -> None:
+        """Average gradients across ranks: dense ones in one flat buffer, sparse embedding rows as sparse tensors"""
+        dense_grads = [p.grad for p in self.model.parameters() if p.grad is not None and not p.grad.is_sparse]
+        flat = torch._utils._flatten_dense_tensors(dense_grads)
+        dist.all_reduce(flat)
+        flat /= self.world_size
+        for grad, synced in zip(dense_grads, torch._utils._unflatten_dense_tensors(flat, dense_grads)):
+            grad.copy_(synced)
+        for param in self.model.parameters():
+            if param.grad is not None and param.grad.is_sparse:
+                dist.all_reduce(param.grad)
+                param.grad = (param.grad / self.world_size).coalesce()
+
+    def _broadcast_state(self, buffers_only: bool = False) -> None:
+        """Copy rank 0's parameters and/or BatchNorm running statistics to every rank"""
+        tensors = list(self.model.buffers()) if buffers_only else list(self.model.state_dict().values())
+        for tensor in tensors:
+            dist.broadcast(tensor, src=0)
+
+    def training_state(self, epoch: int) -> Dict:
+        """
+        Everything needed to continue training after epoch (1-based) exactly as if uninterrupted.
+
+        Collective under torchrun: every rank contributes its RNG state (dropout and, on a single
+        process, the batch order draw from it).
+        """
+        rng_state = {'cpu': torch.get_rng_state(),
+                     'cuda': torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None}
+        rng_states = [rng_state]
+        if self.world_size > 1:
+            rng_states = [None] * self.world_size
+            dist.all_gather_object(rng_states, rng_state)
+        return {
+            'epoch': epoch,
+            'model': self.model.state_dict(),
+            'optimizers': [optimizer.state_dict() for optimizer in self.optimizers],
+            'schedulers': [scheduler.state_dict() for scheduler in self.schedulers],
+            'rng_states': rng_states,
+            'best_val_loss': self.best_val_loss,
+            'patience_counter': self.patience_counter,
+            # Left out when this epoch is the best one, so the model weights are not stored twice
+            'best_model_state': self.best_model_state if self.patience_counter > 0 else None,
+            'wandb_run_id': wandb.run.id if wandb.run is not None else None,
+        }
+
+    def resume(self, checkpoint: str) -> None:
+        """
+        Restore a checkpoint written by train() so the next call continues after its epoch.
+
+        Args:
+            checkpoint (str): Checkpoint path, or 'latest' for the newest one in checkpoints_dir
+                (a fresh start if there is none). Under torchrun every rank reads the file, so
+                checkpoints_dir must be visible to all of them.
+        """
+        if checkpoint == 'latest':
+            manifest = AsyncCheckpointer(self.checkpoints_dir, self.model_name)
+            checkpoint = manifest.latest()
+            manifest.close()
+            if checkpoint is None:
+                print(f"No checkpoint in {self.checkpoints_dir}, starting from scratch")
+                return
+        state = torch.load(checkpoint, map_location='cpu')
+        self.model.load_state_dict(state['model'])
+        for optimizer, optimizer_state in zip(self.optimizers, state['optimizers']):
+            optimizer.load_state_dict(optimizer_state)
+        for scheduler, scheduler_state in zip(self.schedulers, state['schedulers']):
+            scheduler.load_state_dict(scheduler_state)
+        rng_states = state['rng_states']
+        rng_state = rng_states[self.rank] if len(rng_states) == self.world_size else rng_states[0]
+        torch.set_rng_state(rng_state['cpu'])
+        if rng_state['cuda'] is not None and torch.cuda.is_available():
+            torch.cuda.set_rng_state_all(rng_state['cuda'])
+        self.best_val_loss = state['best_val_loss']
+        self.patience_counter = state['patience_counter']
+        self.best_model_state = state['best_model_state']
+        if self.best_model_state is None and self.best_val_loss < float('inf'):
+            self.best_model_state = snapshot(state['model'])
+        self.wandb_run_id = state['wandb_run_id']
+        self.start_epoch = state['epoch']
+        print(f"Resumed from {checkpoint} after epoch {self.start_epoch}")
+
     def train(self) -> None:
-        wandb.init(project=self.config.get('wandb_project', 'mf_training'), config=self.config)
-        train_loader = self.dataset.get_dataloader(self.train_data, batch_size=self.config.get('batch_size', 64))
-        val_loader = self.dataset.get_dataloader(self.val_data, batch_size=self.config.get('batch_size', 64)) if self.val_data else None
+        if self.config.get('resume'):
+            self.resume(self.config['resume'])
+        # A resumed run keeps logging to the same wandb run
+        run_id = getattr(self, 'wandb_run_id', None)
+        wandb.init(project=self.config.get('wandb_project', 'mf_training'), config=self.config,
+                   mode=None if self.rank == 0 else 'disabled', id=run_id, resume='allow' if run_id else None)
+        if self.world_size > 1:
+            self._broadcast_state()
+        train_loader = self.dataset.get_dataloader(self.train_data, batch_size=self.config.get('batch_size', 64),
+                                                   rank=self.rank, world_size=self.world_size)
+        val_loader = self.dataset.get_dataloader(self.val_data, batch_size=self.config.get('batch_size', 64), shuffle=False) if self.val_data else None
+        # Seeded per-epoch shuffles (torchrun, shards) continue from the resumed epoch
+        for holder in (train_loader.sampler, train_loader.dataset):
+            if hasattr(holder, 'epoch'):
+                holder.epoch = self.start_epoch
+
+        num_epochs = self.config.get('num_epochs', 10)
+        if val_loader is not None and self.patience_counter >= self.early_stopping_patience:
+            print(f"Early stopping was triggered after epoch {self.start_epoch}, nothing left to train")
+            num_epochs = self.start_epoch
 
-        for epoch in range(self.config.get('num_epochs', 10)):
+        for epoch in range(self.start_epoch, num_epochs):
             self.model.train()
             epoch_loss = 0.0
             
-            progress_bar = tqdm(train_loader, desc=f"Epoch {epoch+1}", leave=False)
+            progress_bar = tqdm(train_loader, desc=f"Epoch {epoch+1}", leave=False, disable=self.rank != 0)
             
             # Accumulate metrics across batches
             batch_count = 0
@@ -146,6 +422,8 @@ class MatrixFactorizationTrainer(RecommenderModel):
 
             # Calculate average metrics for the epoch
             avg_epoch_loss = epoch_loss / len(train_loader)
+            if self.world_size > 1:
+                avg_epoch_loss = self._mean_across_ranks(avg_epoch_loss)
             print(f"\nEpoch {epoch+1}, Avg Loss: {avg_epoch_loss:.4f}")
             
             wandb.log({'avg_epoch_loss': avg_epoch_loss, 'epoch': epoch+1})
@@ -160,25 +438,38 @@ class MatrixFactorizationTrainer(RecommenderModel):
                 if val_loss < self.best_val_loss:
                     self.best_val_loss = val_loss
                     self.patience_counter = 0
-                    # Save best model state
-                    self.best_model_state = self.model.state_dict().copy()
+                    # Keep a CPU copy of the best weights; state_dict() alone would alias the live tensors
+                    self.best_model_state = snapshot(self.model.state_dict())
                     print(f"New best validation loss: {val_loss:.4f}")
                 else:
                     self.patience_counter += 1
                     print(f"No improvement. Patience: {self.patience_counter}/{self.early_stopping_patience}")
                 
+                if self.ranking_eval_every and (epoch+1) % self.ranking_eval_every == 0:
+                    with torch.random.fork_rng(devices=[]):
+                        ranking_metrics = self.ranking_metrics('val')
+                    print(f"Validation ranking metrics: {ranking_metrics}")
+                    wandb.log({**{f"val_{k}": v for k, v in ranking_metrics.items()}, 'epoch': epoch+1})
+
                 # Use validation loss for scheduler
-                self.scheduler.step(val_loss)
-                
-                # Early stopping
-                if self.patience_counter >= self.early_stopping_patience:
-                    print(f"Early stopping triggered after {epoch+1} epochs")
-                    break
+                for scheduler in self.schedulers:
+                    scheduler.step(val_loss)
                 
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            self.save(f"{self.checkpoints_dir}/{self.model_name}_model_epoch_{epoch+1}_{timestamp}.pth")
+            # Written in the background while the next epoch trains
+            state = self.training_state(epoch+1)
+            if self.rank == 0:
+                self.checkpointer.save(state, epoch+1, metric=val_loss if val_loader is not None else None)
+
+            # Early stopping
+            if val_loader is not None and self.patience_counter >= self.early_stopping_patience:
+                print(f"Early stopping triggered after {epoch+1} epochs")
+                break
+
             if (epoch+1) % 5 == 0: 
-                test_results = self.test()
+                # Evaluation must not advance the RNG: the checkpoint above was taken before it, so
+                # a run resumed from it would otherwise draw different batches and dropout masks
+                with torch.random.fork_rng(devices=[]):
+                    test_results = self.test()
                 print(f"Test results: {test_results}")
                 test_results_prefixed = {f"test_{k}": v for k, v in test_results.items()}
                 wandb.log({**test_results_prefixed, 'epoch': epoch+1})
@@ -190,11 +481,22 @@ class MatrixFactorizationTrainer(RecommenderModel):
             
         # Final save
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.save(f"{self.checkpoints_dir}/{self.model_name}_final_{timestamp}.pth")
+        if self.rank == 0:
+            self.save(f"{self.checkpoints_dir}/{self.model_name}_final_{timestamp}.pth")
+            self.checkpointer.wait()
         
         wandb.finish()
 
+    def _mean_across_ranks(self, value: float) -> float:
+        tensor = torch.tensor([value], dtype=torch.float64)
+        dist.all_reduce(tensor)
+        return tensor.item() / self.world_size
+
     def validate(self, val_loader: DataLoader) -> Dict[str, float]:
+        if self.world_size > 1:
+            # Every rank validates the full split with rank 0's statistics, so all take the same
+            # early-stopping and scheduler decisions
+            self._broadcast_state(buffers_only=True)
         self.model.eval()
         total_loss = 0.0
         predictions_list = []
@@ -204,7 +506,7 @@ class MatrixFactorizationTrainer(RecommenderModel):
             for batch in val_loader:
                 user_ids, item_ids, ratings = [x.to(self.device) for x in batch]
                 predictions = self.model(user_ids, item_ids)
-                loss = self.model.loss(self.loss_type, predictions, ratings, self.l2_reg, self.pos_weight)
+                loss = self.model.loss(self.loss_type, predictions, ratings, self.l2_reg, self.pos_weight, user_ids, item_ids)
                 
                 total_loss += loss.item()
                 predictions_list.append(predictions.cpu())
@@ -289,7 +591,7 @@ class MatrixFactorizationTrainer(RecommenderModel):
     
     def test(self) -> Dict[str, float]:
         self.model.eval()
-        test_loader = self.dataset.get_dataloader(self.test_data, batch_size=self.config.get('batch_size', 64))
+        test_loader = self.dataset.get_dataloader(self.test_data, batch_size=self.config.get('batch_size', 64), shuffle=False)
         
         # Use the same validation logic for test set
         test_metrics = self.validate(test_loader)
@@ -297,39 +599,76 @@ class MatrixFactorizationTrainer(RecommenderModel):
         # Rename val_loss to test_loss
         if 'val_loss' in test_metrics:
             test_metrics['test_loss'] = test_metrics.pop('val_loss')
+        test_metrics.update(self.ranking_metrics('test'))
             
         return test_metrics
-    
-    def predict(self, item_ids: torch.Tensor, ratings: torch.Tensor,k:int =10,pos_weight:float =1.0 ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
-        
+
+    def _holdout_splits(self, split: str) -> Tuple:
+        return (self.val_data, [self.train_data]) if split == 'val' \
+            else (self.test_data, [self.train_data, self.val_data])
+
+    def _build_ranking_evaluator(self, split: str) -> RankingEvaluator:
+        relevant, seen = holdout_matrices(self.dataset, *self._holdout_splits(split), self.relevant_rating)
+        return RankingEvaluator(relevant, seen, self.ranking_ks, self.ranking_block_size)
+
+    def _iter_ranking_evaluators(self, split: str) -> Iterator[RankingEvaluator]:
+        if isinstance(self.dataset, ShardedDatasetLoader):
+            # Never holds more than one range of users' ratings, instead of the whole dataset
+            for first, relevant, seen in holdout_partitions(self.dataset, *self._holdout_splits(split),
+                                                            self.relevant_rating, self.ranking_users_per_partition):
+                yield RankingEvaluator(relevant, seen, self.ranking_ks, self.ranking_block_size, user_offset=first)
+            return
+        if split not in self._ranking_evaluators:
+            self._ranking_evaluators[split] = self._build_ranking_evaluator(split)
+        yield self._ranking_evaluators[split]
+
+    def ranking_metrics(self, split: str = 'test') -> Dict[str, float]:
+        """
+        Top-k recall, NDCG, MAP and coverage over the full catalog, as the API ranks it.
+
+        Every user with a relevant rating in the split is scored against all items in blocks of
+        ranking_block_size users, with the items they rated in earlier splits excluded. With several
+        ranks each evaluates a share of the users and the sums are all-reduced. Sharded datasets are
+        evaluated over ranges of ranking_users_per_partition users, each read from the shards when
+        it is evaluated.
+
+        Args:
+            split (str): 'val' (training ratings masked) or 'test' (training and validation ratings masked).
+
+        Returns:
+            Dict[str, float]: recall@k, ndcg@k, map@k and coverage@k for each k in ranking_ks.
+        """
+        if self.world_size > 1:
+            self._broadcast_state(buffers_only=True)
         self.model.eval()
-        item_ids = item_ids.to(self.device)
-        ratings = ratings.to(self.device)
-        user_emb_model=prediction_model(self.latent_dim,device=self.device)
-        
         with torch.no_grad():
-            item_embs = self.model.item_embedding(item_ids).detach()
-            item_bias=self.model.item_bias(item_ids).detach()
-        
-        user_emb=user_emb_model.train_model(item_embs,ratings,item_bias,loss_type="bce_logits",
-            num_epochs=15,pos_weight=pos_weight,l2_reg=0.002,lr=0.001)
-        
-        with torch.no_grad():
-            all_item_embs = self.model.item_embedding.weight  # (num_items, D)
-            predictions = torch.matmul(user_emb, all_item_embs.T)  # (num_items,)    
-            if self.is_binary:
-                predictions = torch.sigmoid(predictions)
-            predictions, predicted_ids = predictions.sort(descending=True)
-        predictions=predictions.view(-1)
-        predicted_ids=predicted_ids.view(-1)
-
-        return predictions[:k].cpu(), predicted_ids[:k].cpu(), user_emb.cpu()
+            # Scores match the model's eval-mode logits up to the per-user bias, which does not change the ranking
+            item_embs = self.model.item_bn(self.model.item_embedding.weight)
+            item_bias = self.model.item_bias.weight.view(1, -1)
+
+            def score_users(users: np.ndarray) -> torch.Tensor:
+                user_embs = self.model.user_bn(self.model.user_embedding.weight[torch.from_numpy(users).to(self.device)])
+                return (torch.addmm(item_bias, user_embs, item_embs.T)).cpu()
+
+            totals = None
+            for evaluator in self._iter_ranking_evaluators(split):
+                partial = evaluator.accumulate(score_users, self.rank, self.world_size)
+                totals = partial if totals is None else {name: totals[name] + partial[name] for name in totals}
+        if self.world_size > 1:
+            for tensor in totals.values():
+                dist.all_reduce(tensor)
+        return evaluator.summarize(totals)
     
+    def item_tables(self) -> Tuple[torch.Tensor, torch.Tensor, float]:
+        return (self.model.item_embedding.weight.detach(), self.model.item_bias.weight.detach().view(-1),
+                self.model.global_bias.item())
+
     def save(self, save_path: str) -> None:
         torch.save(self.model.state_dict(), save_path)
 
     def load(self, load_path: str,trainable:bool=False) -> None:
-        self.model.load_state_dict(torch.load(load_path,map_location=self.device))
+        # Accepts the weights-only files from save() and the training checkpoints from train()
+        self.model.load_state_dict(model_state_dict(torch.load(load_path,map_location=self.device)))
         self.model.to(self.device)
         if not trainable:
             self.model.eval()
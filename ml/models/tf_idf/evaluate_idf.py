@@ -0,0 +1,55 @@
+"""
+Offline top-k evaluation of a TF-IDF serving bundle on the held-out split of a ratings file.
+
+Each user's profile is built from their training ratings exactly as recommend() does, the full
+catalog is scored in blocks of users and their training movies are excluded. Run from the ml/
+directory:
+
+    python -m models.tf_idf.evaluate_idf data/ml-32m/ratings.csv --bundle checkpoints/tf_idf
+"""
+import argparse
+import time
+import numpy as np
+import scipy.sparse as sp
+import torch
+from base.datasetloader import DatasetLoader
+from base.ranking_metrics import RankingEvaluator, holdout_matrices
+from models.tf_idf.model import TFIDFModel
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall/NDCG/MAP/coverage of a TF-IDF bundle")
+    parser.add_argument("ratings_path")
+    parser.add_argument("--bundle", default="checkpoints/tf_idf")
+    parser.add_argument("--ks", type=int, nargs="+", default=[10, 20])
+    parser.add_argument("--relevant-rating", type=float, default=4, help="held-out ratings counted as relevant")
+    parser.add_argument("--min-pos-rating", type=int, default=3, help="training ratings at or below this carry no weight")
+    parser.add_argument("--split", choices=["val", "test"], default="test")
+    parser.add_argument("--block-size", type=int, default=512)
+    parser.add_argument("--cache-dir", default="data/cache")
+    args = parser.parse_args()
+
+    model = TFIDFModel.load_serving(args.bundle)
+    dataset = DatasetLoader(args.ratings_path, binarize=False, cache_dir=args.cache_dir)
+    held_out, seen = (dataset.test_data, [dataset.train_data, dataset.val_data]) if args.split == "test" \
+        else (dataset.val_data, [dataset.train_data])
+    relevant, seen = holdout_matrices(dataset, held_out, seen, args.relevant_rating)
+
+    # Re-index the columns from encoded movie indices to rows of the item vectors
+    rows, found = model.rows(dataset.movie_index)
+    to_rows = sp.csr_matrix((np.ones(found.sum(), dtype=np.float32), (np.flatnonzero(found), rows[found])),
+                            shape=(dataset.num_items, len(model.movie_ids)))
+    print(f"{dataset.num_items - found.sum()} of {dataset.num_items} rated movies have no TF-IDF vector")
+    seen, relevant = (seen @ to_rows).tocsr(), (relevant @ to_rows).tocsr()
+
+    evaluator = RankingEvaluator(relevant, seen, ks=tuple(args.ks), block_size=args.block_size)
+    start = time.perf_counter()
+    metrics = evaluator.evaluate(
+        lambda users: torch.from_numpy(model.score_users(seen[users], args.min_pos_rating)))
+    print(f"Evaluated {metrics['ranking_users']} users in {time.perf_counter() - start:.1f}s")
+    for name, value in metrics.items():
+        print(f"{name}: {value:.4f}" if isinstance(value, float) else f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,240 @@
 import polars as pl
 import numpy as np
 from typing import Dict, Tuple
-from sklearn.decomposition import TruncatedSVD
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.preprocessing import normalize
 import faiss
 import joblib
+import argparse
+import hashlib
+import json
 import os
+from datetime import datetime
+
+# Serving bundle layout written by save(): index.faiss, item_vectors.npy, movie_ids.npy and
+# manifest.json. The fitted vectorizer and SVD are pickled alongside for refits and updates only.
+BUNDLE_FORMAT_VERSION = 1
+
+def _document_frequencies(hasher, texts: list[str]) -> Tuple[np.ndarray, int]:
+    counts = hasher.transform(texts)
+    return np.bincount(counts.indices, minlength=hasher.n_features), counts.shape[0]
+
+
+def _hash_terms(terms: list[str], n_features: int) -> np.ndarray:
+    # The same feature index HashingVectorizer assigns to each analysed term
+    from sklearn.utils import murmurhash3_32
+
+    return np.fromiter((abs(murmurhash3_32(term, seed=0)) % n_features for term in terms),
+                       dtype=np.int64, count=len(terms))
+
+
+# Hash space of the pruned-term record kept next to a TfidfVectorizer; wide enough that unseen terms
+# practically never collide with a pruned one
+PRUNED_HASH_FEATURES = 2**31 - 1
+
+
+def _pruned_term_hashes(vectorizer, texts: list[str], batch_size: int = 20000) -> np.ndarray:
+    """
+    Hashes of the terms a fitted TfidfVectorizer saw but dropped by min_df/max_df.
+
+    sklearn no longer keeps these as stop_words_, and storing the strings themselves would take more
+    space than the vocabulary.
+    """
+    from sklearn.feature_extraction.text import HashingVectorizer
+
+    hasher = HashingVectorizer(n_features=PRUNED_HASH_FEATURES, analyzer=vectorizer.build_analyzer(),
+                               alternate_sign=False, norm=None)
+    seen = np.unique(np.concatenate([np.unique(hasher.transform(texts[start:start + batch_size]).indices)
+                                     for start in range(0, len(texts), batch_size)]))
+    return np.setdiff1d(seen, _hash_terms(list(vectorizer.vocabulary_), PRUNED_HASH_FEATURES))
+
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "opq_ivf_pq")
+
+
+def build_index(vectors: np.ndarray, index_type: str = "flat", nlist: int = 1024, pq_m: int = 100,
+                hnsw_m: int = 32, ef_construction: int = 200, nprobe: int = 16, ef_search: int = 64,
+                opq_iters: int = 10) -> faiss.Index:
+    """
+    Build an inner-product index over L2-normalised item vectors, with FAISS ids equal to rows.
+
+    Args:
+        vectors (np.ndarray): (num_items, D) float32 item vectors.
+        index_type (str): "flat" (exact), "ivf_flat", "hnsw" or "opq_ivf_pq".
+        nlist (int): Number of IVF lists.
+        pq_m (int): PQ sub-quantizers (and OPQ rotation blocks); must divide D.
+        hnsw_m (int): HNSW graph degree.
+        ef_construction (int): HNSW build-time beam width.
+        nprobe (int): Default IVF lists visited per search, stored in the index.
+        ef_search (int): Default HNSW beam width, stored in the index.
+        opq_iters (int): OPQ rotation updates (and initial PQ k-means rounds) at training time.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    d = vectors.shape[1]
+    if index_type == "flat":
+        index = faiss.IndexFlatIP(d)
+    elif index_type == "ivf_flat":
+        index = faiss.index_factory(d, f"IVF{nlist},Flat", faiss.METRIC_INNER_PRODUCT)
+    elif index_type == "hnsw":
+        index = faiss.index_factory(d, f"HNSW{hnsw_m},Flat", faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = ef_construction
+        index.hnsw.efSearch = ef_search
+    elif index_type == "opq_ivf_pq":
+        index = faiss.index_factory(d, f"OPQ{pq_m},IVF{nlist},PQ{pq_m}", faiss.METRIC_INNER_PRODUCT)
+        # FAISS defaults (50 rotation updates, 40 k-means rounds each) take an hour on 1000-dim vectors
+        opq = faiss.downcast_VectorTransform(index.chain.at(0))
+        opq.niter = opq_iters
+        opq.niter_pq_0 = opq_iters
+        # Polysemous codes only help Hamming-filtered search, which is not used here
+        faiss.downcast_index(faiss.extract_index_ivf(index)).do_polysemous_training = False
+    else:
+        raise ValueError(f"Unsupported index type: {index_type}")
+    if not index.is_trained:
+        index.train(vectors)
+    if index_type in ("ivf_flat", "opq_ivf_pq"):
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    else:
+        # Flat and HNSW storage is positional; an id map keeps FAISS ids equal to rows when update()
+        # removes vectors. IVF lists store ids natively, and wrapping them would shift the map on
+        # remove_ids while the lists keep the old ids
+        index = faiss.IndexIDMap2(index)
+    index.add_with_ids(vectors, np.arange(len(vectors), dtype=np.int64))
+    return index
+
+
+class HashedTfidf:
+    """
+    TF-IDF over hashed n-grams, fitted in two streaming passes over batches of documents.
+
+    The first pass only accumulates document frequencies per hashed feature, so no vocabulary
+    dict or unpruned count matrix is ever built; min_df/max_df then select the kept columns.
+    Weighting matches TfidfVectorizer(sublinear_tf=True) with smooth idf and l2-normalised rows.
+    Batches are vectorised in parallel with joblib.
+    """
+
+    def __init__(self, n_features: int = 2**20, min_df: int = 3, max_df: float = 0.8, ngram_range: Tuple[int, int] = (1, 3),
+                 stop_words: str | None = "english", n_jobs: int = -1):
+        self.n_features = n_features
+        self.min_df = min_df
+        self.max_df = max_df
+        self.ngram_range = ngram_range
+        self.stop_words = stop_words
+        self.n_jobs = n_jobs
+
+    def _hasher(self):
+        from sklearn.feature_extraction.text import HashingVectorizer
+        return HashingVectorizer(n_features=self.n_features, ngram_range=self.ngram_range, stop_words=self.stop_words,
+                                 alternate_sign=False, norm=None)
+
+    def fit(self, batches) -> "HashedTfidf":
+        from joblib import Parallel, delayed
+
+        hasher = self._hasher()
+        df = np.zeros(self.n_features, dtype=np.int64)
+        n_docs = 0
+        for counts, n in Parallel(n_jobs=self.n_jobs)(delayed(_document_frequencies)(hasher, texts) for texts in batches):
+            df += counts
+            n_docs += n
+        keep = (df >= self.min_df) & (df <= self.max_df * n_docs)
+        self.columns_ = np.flatnonzero(keep)
+        # Seen at fit time but dropped by min_df/max_df, the hashed counterpart of stop_words_
+        self.pruned_ = np.flatnonzero((df > 0) & ~keep)
+        self.idf_ = (np.log((1 + n_docs) / (1 + df[keep])) + 1).astype(np.float32)
+        self.n_docs_ = n_docs
+        return self
+
+    def transform(self, texts: list[str]):
+        from sklearn.preprocessing import normalize
+
+        counts = self._hasher().transform(texts)[:, self.columns_].tocsr().astype(np.float32)
+        counts.data = (1 + np.log(counts.data)) * self.idf_[counts.indices]
+        return normalize(counts, norm='l2')
+
+    def transform_batches(self, batches):
+        import scipy.sparse as sp
+        from joblib import Parallel, delayed
+
+        return sp.vstack(Parallel(n_jobs=self.n_jobs)(delayed(self.transform)(texts) for texts in batches), format="csr")
+
+    def build_analyzer(self):
+        return self._hasher().build_analyzer()
+
+    def contains(self, terms: list[str]) -> np.ndarray:
+        """Whether each analysed term hashes to a kept column (collisions count as known)."""
+        return np.isin(_hash_terms(terms, self.n_features), self.columns_)
+
+    def pruned(self, terms: list[str]) -> np.ndarray:
+        """Whether each analysed term hashes to a column seen at fit time but pruned by min_df/max_df."""
+        return np.isin(_hash_terms(terms, self.n_features), getattr(self, "pruned_", np.empty(0, dtype=np.int64)))
+
+
+class BlockedRandomizedSVD:
+    """
+    Randomized truncated SVD (Halko et al.) of a sparse matrix, computed over column blocks.
+
+    sklearn's randomized_svd materialises dense (n_columns, k + oversamples) and
+    (k + oversamples, n_columns) intermediates; here they only ever exist one block of columns
+    at a time, next to the (n_rows, k + oversamples) range basis. Everything is float32.
+    """
+
+    def __init__(self, n_components: int, n_oversamples: int = 10, n_iter: int = 5, block_size: int = 16384,
+                 random_state: int = 42):
+        self.n_components = n_components
+        self.n_oversamples = n_oversamples
+        self.n_iter = n_iter
+        self.block_size = block_size
+        self.random_state = random_state
+
+    def _blocks(self, matrix):
+        for start in range(0, matrix.shape[1], self.block_size):
+            yield start, matrix[:, start:start + self.block_size]
+
+    def fit_transform(self, matrix) -> np.ndarray:
+        matrix = matrix.tocsc().astype(np.float32)
+        size = self.n_components + self.n_oversamples
+        rng = np.random.default_rng(self.random_state)
+
+        basis = np.zeros((matrix.shape[0], size), dtype=np.float32)
+        for _, block in self._blocks(matrix):
+            basis += block @ rng.standard_normal((block.shape[1], size), dtype=np.float32)
+        for _ in range(self.n_iter):
+            basis, _ = np.linalg.qr(basis)
+            projected = np.zeros_like(basis)
+            for _, block in self._blocks(matrix):
+                projected += block @ (block.T @ basis)
+            basis = projected
+        basis, _ = np.linalg.qr(basis)
+
+        # Eigendecomposition of B B^T, B = Q^T A, accumulated block by block
+        gram = np.zeros((size, size), dtype=np.float64)
+        for _, block in self._blocks(matrix):
+            small = np.asarray((block.T @ basis).T, dtype=np.float64)
+            gram += small @ small.T
+        eigenvalues, eigenvectors = np.linalg.eigh(gram)
+        order = np.argsort(eigenvalues)[::-1][:self.n_components]
+        self.singular_values_ = np.sqrt(np.clip(eigenvalues[order], 0, None)).astype(np.float32)
+        rotation = eigenvectors[:, order].astype(np.float32)
+
+        scale = 1 / np.maximum(self.singular_values_, np.finfo(np.float32).tiny)
+        self.components_ = np.empty((self.n_components, matrix.shape[1]), dtype=np.float32)
+        for start, block in self._blocks(matrix):
+            self.components_[:, start:start + block.shape[1]] = (rotation.T @ (block.T @ basis).T) * scale[:, None]
+
+        transformed = basis @ (rotation * self.singular_values_)
+        squared = matrix.multiply(matrix).mean(axis=0)
+        total_var = float(np.sum(np.asarray(squared) - np.square(np.asarray(matrix.mean(axis=0)))))
+        self.explained_variance_ = transformed.var(axis=0)
+        self.explained_variance_ratio_ = self.explained_variance_ / total_var
+        return transformed
+
+    def transform(self, matrix) -> np.ndarray:
+        return np.asarray(matrix @ self.components_.T, dtype=np.float32)
+
 
 class TFIDFModel:
     def __init__(self, movie_path:str , tags_path: str ,save_path: str = "checkpoints/tf_idf",svd_components:int =1000):
         
         self.movies= pl.scan_csv(movie_path, separator=",", has_header=True,new_columns=["movie_id", "title", "genres"])
-        self.tags = pl.scan_csv(tags_path, separator=",", has_header=True, new_columns=["user_id", "movie_id", "tag", "timestamp"])
-        self.tags= self.process_data(self.movies,self.tags)
+        self.tag_events = pl.scan_csv(tags_path, separator=",", has_header=True, new_columns=["user_id", "movie_id", "tag", "timestamp"])
+        self.tags= self.process_data(self.movies,self.tag_events)
         self.save_path= save_path
         self.svd_components= svd_components
 
@@ -41,72 +261,441 @@ class TFIDFModel:
         return movies
 
     
-    def fit(self) -> None:
-        self.tfidf_vectorizer = TfidfVectorizer(
-            min_df=3,
-            max_df=0.8,
-            ngram_range=(1, 3),
-            stop_words='english',
-            sublinear_tf=True,
-        )
-        tfidf_matrix = self.tfidf_vectorizer.fit_transform(
-            self.tags.select("tags").collect().to_series().to_list()
+    @classmethod
+    def load_serving(cls, save_path: str = "checkpoints/tf_idf", mmap: bool = True) -> "TFIDFModel":
+        """
+        Load only what recommend() needs, without the raw CSVs, the fitted vectorizer or sklearn.
+
+        Args:
+            save_path (str): Directory written by save().
+            mmap (bool): Memory-map the item vectors and, where FAISS supports it, the index.
+        """
+        model = cls.__new__(cls)
+        model.save_path = save_path
+        model._load_bundle(mmap)
+        print(f"Serving model {model.model_version} loaded from {save_path}")
+        return model
+
+    def fit(self, streaming: bool = False, batch_size: int = 20000, n_jobs: int = -1) -> None:
+        """
+        Fit the TF-IDF vectorizer and SVD and compute the reduced item vectors.
+
+        Args:
+            streaming (bool): Use hashed n-grams fitted over document batches and a column-blocked
+                randomized SVD instead of TfidfVectorizer + TruncatedSVD; peak memory no longer
+                grows with the raw n-gram vocabulary, and only one batch of documents (see
+                document_batches) is read into memory at a time.
+            batch_size (int): Documents per batch in streaming mode and when recording pruned terms.
+            n_jobs (int): Parallel workers for batch vectorisation in streaming mode.
+        """
+        from sklearn.decomposition import TruncatedSVD
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.preprocessing import normalize
+
+        if streaming:
+            self.tfidf_vectorizer = HashedTfidf(min_df=3, max_df=0.8, ngram_range=(1, 3), n_jobs=n_jobs).fit(
+                batch["tags"].fill_null("").to_list() for batch in self.document_batches(batch_size))
+            movie_ids = []
+
+            def batches():
+                # Rows come out in batch order, so the movie IDs are collected on the way through
+                for batch in self.document_batches(batch_size):
+                    movie_ids.append(batch["movie_id"].to_numpy())
+                    yield batch["tags"].fill_null("").to_list()
+
+            tfidf_matrix = self.tfidf_vectorizer.transform_batches(batches())
+            self.movie_ids = np.concatenate(movie_ids).astype(np.int64)
+            self.svd = BlockedRandomizedSVD(n_components=self.svd_components, random_state=42)
+        else:
+            docs = self.tags.collect()
+            self.movie_ids = docs["movie_id"].to_numpy().astype(np.int64)
+            self.tfidf_vectorizer = TfidfVectorizer(
+                min_df=3,
+                max_df=0.8,
+                ngram_range=(1, 3),
+                stop_words='english',
+                sublinear_tf=True,
             )
-        self.movie_ids = self.tags.collect()["movie_id"].to_list()
-        
+            texts = docs["tags"].to_list()
+            tfidf_matrix = self.tfidf_vectorizer.fit_transform(texts)
+            # Lets update() tell terms pruned at fit time apart from genuinely new ones
+            self.tfidf_vectorizer.pruned_hashes_ = _pruned_term_hashes(self.tfidf_vectorizer, texts, batch_size)
+            del texts, docs
+            self.svd = TruncatedSVD(n_components=self.svd_components, random_state=42)
+
         print(f"TF-IDF matrix shape: {tfidf_matrix.shape}")
         print(f"Matrix sparsity: {1 - tfidf_matrix.nnz / (tfidf_matrix.shape[0] * tfidf_matrix.shape[1]):.4f}")
-        print(f"Applying TruncatedSVD with {self.svd_components} components...")
-        self.svd = TruncatedSVD(n_components=self.svd_components, random_state=42)
+        print(f"Applying {type(self.svd).__name__} with {self.svd_components} components...")
         self.tfidf_matrix = self.svd.fit_transform(tfidf_matrix)
-        self.tfidf_matrix = normalize(self.tfidf_matrix, norm='l2')
+        self.tfidf_matrix = normalize(self.tfidf_matrix, norm='l2').astype(np.float32)
+        self.row_index = self.build_row_index(self.movie_ids)
+        self.drift = {"tags_watermark": self.tags_watermark()}
 
         print(f"Reduced matrix shape: {self.tfidf_matrix.shape}")
         print(f"Explained variance ratio: {self.svd.explained_variance_ratio_.sum():.4f}")
         print(f"Storage reduction: {tfidf_matrix.shape[1] / self.svd_components:.0f}x")
 
-    def build_faiss_index(self) -> None:
-        d= self.tfidf_matrix.shape[1]
-        tfidf_dense = self.tfidf_matrix.astype(np.float32)
-        self.index= faiss.IndexFlatIP(d)
-        self.index.add(tfidf_dense)
-        print(f"FAISS index built with {self.index.ntotal} vectors.")
+    def document_batches(self, batch_size: int = 20000):
+        """
+        Yield the documents of batch_size movies at a time, in movie ID order.
+
+        Each batch is its own streaming query over a movie ID range. The range filter is pushed
+        down into both CSV scans, so the tag join and aggregation only ever hold one batch; the
+        CSVs are re-scanned once per batch instead.
+        """
+        movie_ids = np.sort(self.movies.select("movie_id").collect(engine="streaming").to_series().to_numpy())
+        for start in range(0, len(movie_ids), batch_size):
+            first, last = movie_ids[start], movie_ids[min(start + batch_size, len(movie_ids)) - 1]
+            yield (self.tags.filter(pl.col("movie_id").is_between(int(first), int(last)))
+                   .collect(engine="streaming").sort("movie_id"))
+
+    def build_faiss_index(self, index_type: str = "flat", **index_params) -> None:
+        """
+        Index the item vectors and save the model.
+
+        Args:
+            index_type (str): One of INDEX_TYPES; "flat" is an exact scan.
+            **index_params: nlist, pq_m, hnsw_m, ef_construction, nprobe, ef_search (see build_index).
+        """
+        self.index_config = {"index_type": index_type, **index_params}
+        self.index = build_index(self.tfidf_matrix, **self.index_config)
+        print(f"FAISS {index_type} index built with {self.index.ntotal} vectors.")
         self.save()
 
-    def search(self, movie_id:int) :
-        movie_idx= self.movie_ids.index(movie_id)
-        if hasattr(self.tfidf_matrix, 'toarray'):
-            return self.tfidf_matrix[movie_idx].toarray().flatten().astype(np.float32)
-        else:
-            return self.tfidf_matrix[movie_idx].astype(np.float32)
-
-    def recommend(self, interactions: list[Tuple], k: int = 10, min_pos_rating:int=3):
-        ratings= [x[1] for x in interactions]
-        movie_ids= [x[0] for x in interactions]
-        rating_weights= [max(0,x-2.5)/2.5 if x>min_pos_rating else 0 for x in ratings]
-        movie_vectors= [self.search(movie_id) for movie_id in movie_ids]
-        user_vector= np.average(movie_vectors, axis=0, weights=rating_weights)
+    def search_params(self, nprobe: int | None = None, ef_search: int | None = None, selector=None):
+        """
+        Per-search overrides of the defaults stored in the index.
+
+        Args:
+            nprobe (int, optional): IVF lists to visit.
+            ef_search (int, optional): HNSW beam width.
+            selector (faiss.IDSelector, optional): Restricts the search to the rows it accepts;
+                the caller keeps it alive for the duration of the search.
+        """
+        index_type = getattr(self, "index_config", {}).get("index_type", "flat")
+        if index_type in ("ivf_flat", "opq_ivf_pq") and (nprobe is not None or selector is not None):
+            params = faiss.SearchParametersIVF(sel=selector)
+            if nprobe is not None:
+                params.nprobe = nprobe
+            else:
+                params.nprobe = faiss.extract_index_ivf(self.index).nprobe
+            return params
+        if index_type == "hnsw" and (ef_search is not None or selector is not None):
+            params = faiss.SearchParametersHNSW(sel=selector)
+            params.efSearch = ef_search or faiss.downcast_index(self.index.index).hnsw.efSearch
+            return params
+        if selector is not None:
+            return faiss.SearchParameters(sel=selector)
+        return None
+
+    def tags_watermark(self) -> int:
+        """Latest tag timestamp in tags.csv; update() picks up tags newer than this."""
+        latest = self.tag_events.select(pl.col("timestamp").max()).collect().item()
+        return int(latest) if latest is not None else 0
+
+    def changed_movies(self, since: int | None = None) -> np.ndarray:
+        """
+        Movies whose document changed since the last fit or update.
+
+        Args:
+            since (int, optional): Tag timestamp watermark; defaults to the one recorded at the
+                last fit or update.
+
+        Returns:
+            np.ndarray: Movies without a row yet plus movies tagged after the watermark.
+        """
+        since = self.drift.get("tags_watermark", 0) if since is None else since
+        movie_ids = self.movies.select("movie_id").collect().to_series().to_numpy()
+        new_movies = movie_ids[~self.rows(movie_ids)[1]]
+        retagged = (self.tag_events.filter(pl.col("timestamp") > since)
+                    .select(pl.col("movie_id").unique()).collect().to_series().to_numpy())
+        return np.union1d(new_movies, retagged).astype(np.int64)
+
+    def update(self, movie_ids) -> dict:
+        """
+        Project changed movies through the fitted vectorizer and SVD and add or replace their vectors.
+
+        Needs the CSVs and a model opened with load(mmap=False). The vocabulary and SVD basis stay
+        fixed, so terms the vectorizer has never seen are dropped; their share is tracked in
+        self.drift as the signal for when a full refit is due.
+
+        Args:
+            movie_ids: Movie IDs whose title, genres or tags changed, or that are new.
+
+        Returns:
+            dict: Counts of added and replaced movies and the out-of-vocabulary rate of this update.
+        """
+        from sklearn.preprocessing import normalize
+
+        docs = self.tags.filter(pl.col("movie_id").is_in(np.asarray(movie_ids, dtype=np.int64))).collect()
+        if docs.is_empty():
+            return {"added": 0, "replaced": 0, "oov_rate": 0.0}
+        texts = docs["tags"].fill_null("").to_list()
+        doc_ids = docs["movie_id"].to_numpy().astype(np.int64)
+
+        vectors = self.svd.transform(self.tfidf_vectorizer.transform(texts))
+        vectors = normalize(vectors, norm='l2').astype(np.float32)
+        oov = self._record_drift(texts)
+        found = self._write_vectors(doc_ids, vectors)
+        self.drift["tags_watermark"] = max(self.drift.get("tags_watermark", 0), self.tags_watermark())
+
+        print(f"Updated {len(doc_ids)} movies ({(~found).sum()} new), OOV rate {oov:.4f}, "
+              f"cumulative {self.drift['oov_rate']:.4f}")
+        return {"added": int((~found).sum()), "replaced": int(found.sum()), "oov_rate": oov}
+
+    def _write_vectors(self, doc_ids: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+        # Replace the rows of known movies and append new ones, in the matrix and the index alike;
+        # returns which movies already had a row
+        rows, found = self.rows(doc_ids)
+        self._ensure_id_map()
+        # HNSW graphs cannot drop vectors, so replacements there mean a rebuild
+        rebuild = found.any() and self.index_config["index_type"] == "hnsw"
+        self.tfidf_matrix = np.array(self.tfidf_matrix, dtype=np.float32)
+        if found.any():
+            self.tfidf_matrix[rows[found]] = vectors[found]
+            if not rebuild:
+                self.index.remove_ids(rows[found])
+                self.index.add_with_ids(vectors[found], rows[found])
+        if (~found).any():
+            new_rows = np.arange(len(self.movie_ids), len(self.movie_ids) + (~found).sum(), dtype=np.int64)
+            self.tfidf_matrix = np.concatenate([self.tfidf_matrix, vectors[~found]])
+            self.movie_ids = np.concatenate([self.movie_ids, doc_ids[~found]])
+            if not rebuild:
+                self.index.add_with_ids(vectors[~found], new_rows)
+        if rebuild:
+            self.index = build_index(self.tfidf_matrix, **self.index_config)
+        self.row_index = self.build_row_index(self.movie_ids)
+        return found
+
+    def _record_drift(self, texts: list[str]) -> float:
+        # Share of analysed terms (after tokenising and n-gramming) never seen at fit time. Terms that
+        # were seen but pruned by min_df/max_df are left out of both counts: they would be dropped
+        # by a refit too, and make up about half the n-grams of the training documents themselves
+        vectorizer = self.tfidf_vectorizer
+        analyzer = vectorizer.build_analyzer()
+        total = oov = 0
+        for text in texts:
+            terms = analyzer(text)
+            if isinstance(vectorizer, HashedTfidf):
+                kept, pruned = vectorizer.contains(terms), vectorizer.pruned(terms)
+            else:
+                kept = np.fromiter((term in vectorizer.vocabulary_ for term in terms), dtype=bool, count=len(terms))
+                # Vectorizers fitted before pruned terms were recorded count them as unseen
+                pruned_hashes = getattr(vectorizer, "pruned_hashes_", np.empty(0, dtype=np.int64))
+                pruned = ~kept & np.isin(_hash_terms(terms, PRUNED_HASH_FEATURES), pruned_hashes)
+            unseen = ~kept & ~pruned
+            total += int((kept | unseen).sum())
+            oov += int(unseen.sum())
+        self.drift["updates"] = self.drift.get("updates", 0) + 1
+        self.drift["updated_movies"] = self.drift.get("updated_movies", 0) + len(texts)
+        self.drift["terms"] = self.drift.get("terms", 0) + total
+        self.drift["oov_terms"] = self.drift.get("oov_terms", 0) + oov
+        self.drift["oov_rate"] = self.drift["oov_terms"] / max(self.drift["terms"], 1)
+        return oov / max(total, 1)
+
+    def _ensure_id_map(self) -> None:
+        # Positional flat/HNSW indexes get rewrapped with row ids. A plain IVF index already has row
+        # ids, but one wrapped in an id map may have desynchronised lists and is rebuilt
+        ivf = self.index_config["index_type"] in ("ivf_flat", "opq_ivf_pq")
+        if ivf != isinstance(self.index, faiss.IndexIDMap2):
+            return
+        self.index = build_index(self.tfidf_matrix, **self.index_config)
+
+    @staticmethod
+    def build_row_index(movie_ids: list[int]) -> np.ndarray:
+        """Dense movie_id -> row array, -1 for movies without a row."""
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        row_index = np.full(int(movie_ids.max(initial=-1)) + 1, -1, dtype=np.int32)
+        row_index[movie_ids] = np.arange(len(movie_ids), dtype=np.int32)
+        return row_index
+
+    def rows(self, movie_ids) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Map movie IDs to rows of the item-vector matrix.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Row per movie (-1 if unknown) and a boolean found mask.
+        """
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        in_range = (movie_ids >= 0) & (movie_ids < len(self.row_index))
+        rows = np.full(movie_ids.shape, -1, dtype=np.int64)
+        rows[in_range] = self.row_index[movie_ids[in_range]]
+        return rows, rows >= 0
+
+    def search(self, movie_id:int) -> np.ndarray | None:
+        """Reduced TF-IDF vector of a movie, or None if the model has no row for it."""
+        rows, found = self.rows([movie_id])
+        if not found[0]:
+            return None
+        return np.asarray(self.tfidf_matrix[rows[0]], dtype=np.float32)
+
+    def recommend(self, interactions: list[Tuple], k: int = 10, min_pos_rating:int=3,
+                  nprobe: int | None = None, ef_search: int | None = None,
+                  exclude_ids: list[int] | None = None, exclude_seen: bool = True):
+        """
+        Recommend movies similar to the positively rated ones.
+
+        Excluded movies are filtered inside the FAISS search with an ID selector, so k fresh
+        results come back from a single query.
+
+        Args:
+            interactions (list[Tuple]): (movie_id, rating) pairs.
+            k (int): Number of recommendations.
+            min_pos_rating (int): Ratings at or below this carry no weight.
+            nprobe (int, optional): IVF lists to visit, overriding the index default.
+            ef_search (int, optional): HNSW beam width, overriding the index default.
+            exclude_ids (list[int], optional): Movie IDs never to return, e.g. a blocklist.
+            exclude_seen (bool): Also exclude every movie in interactions.
+
+        Returns:
+            Tuple[list[int], np.ndarray, list[int]]: Recommended movie IDs, their similarity
+            scores, and the interaction movie IDs the model has no vector for.
+        """
+        movie_ids = np.fromiter((x[0] for x in interactions), dtype=np.int64, count=len(interactions))
+        ratings = np.fromiter((x[1] for x in interactions), dtype=np.float32, count=len(interactions))
+        rows, found = self.rows(movie_ids)
+        missing = movie_ids[~found].tolist()
+
+        rating_weights = np.where(ratings > min_pos_rating, np.maximum(0, ratings - 2.5) / 2.5, 0)[found]
+        if rating_weights.sum() <= 0:
+            raise ValueError(f"No positively rated movies (rating > {min_pos_rating}) known to the model")
+        # One gather of the rated rows, then a weighted sum
+        movie_vectors = self.tfidf_matrix[rows[found]]
+        user_vector = (rating_weights @ movie_vectors) / rating_weights.sum()
         user_vector = user_vector.reshape(1, -1).astype(np.float32)
-        expect_val, indices = self.index.search(user_vector, k)
-        recommendations= [self.movie_ids[i] for i in indices[0]]
-        return recommendations, expect_val[0]
+
+        excluded = rows[found] if exclude_seen else np.zeros(0, dtype=np.int64)
+        if exclude_ids:
+            blocked, blocked_found = self.rows(exclude_ids)
+            excluded = np.union1d(excluded, blocked[blocked_found])
+        k = min(k, len(self.movie_ids) - len(excluded))
+        batch = faiss.IDSelectorBatch(excluded) if len(excluded) else None
+        selector = faiss.IDSelectorNot(batch) if batch is not None else None
+        expect_val, indices = self.index.search(user_vector, k, params=self.search_params(nprobe, ef_search, selector))
+        hits = indices[0] >= 0
+        if hits.sum() < k:
+            # Approximate indexes can come back short when the filter empties the probed
+            # lists or graph neighbourhood; an exact scan over the vectors always fills k
+            scores = np.asarray(self.tfidf_matrix @ user_vector[0], dtype=np.float32)
+            scores[excluded] = -np.inf
+            top = np.argpartition(-scores, k - 1)[:k] if k > 0 else np.zeros(0, dtype=np.int64)
+            top = top[np.argsort(-scores[top])]
+            return self.movie_ids[top].tolist(), scores[top], missing
+        recommendations = self.movie_ids[indices[0][hits]].tolist()
+        return recommendations, expect_val[0][hits], missing
+
+    def score_users(self, ratings, min_pos_rating: int = 3) -> np.ndarray:
+        """
+        Exact similarity of every row to the profiles of a block of users, as recommend() builds them.
+
+        Args:
+            ratings (scipy.sparse.csr_matrix): (B, rows) raw ratings, columns aligned with the item vectors.
+            min_pos_rating (int): Ratings at or below this carry no weight.
+
+        Returns:
+            np.ndarray: (B, rows) float32 scores; all zero for users without a positive rating.
+        """
+        weights = ratings.tocsr(copy=True)
+        weights.data = np.where(weights.data > min_pos_rating, np.maximum(0, weights.data - 2.5) / 2.5, 0).astype(np.float32)
+        totals = np.asarray(weights.sum(axis=1), dtype=np.float32)
+        profiles = np.asarray(weights @ self.tfidf_matrix, dtype=np.float32) / np.maximum(totals, 1e-12)
+        return profiles @ np.asarray(self.tfidf_matrix, dtype=np.float32).T
 
     def save(self) -> None:
-        import os
         os.makedirs(self.save_path, exist_ok=True)
-        
-        # Save all components
+
+        # Training-only components
         joblib.dump(self.tfidf_vectorizer, f"{self.save_path}/tfidf_vectorizer.pkl")
         joblib.dump(self.svd, f"{self.save_path}/svd_transformer.pkl")
-        joblib.dump(self.index, f"{self.save_path}/faiss_index.pkl")
-        joblib.dump(self.movie_ids, f"{self.save_path}/movie_ids.pkl")
-        
+        self._save_bundle()
+
         print(f"Model saved to {self.save_path}")
-        
-    def load(self) -> None:
+
+    def _save_bundle(self) -> None:
+        item_vectors = np.ascontiguousarray(self.tfidf_matrix, dtype=np.float32)
+        movie_ids = np.asarray(self.movie_ids, dtype=np.int64)
+        digest = hashlib.blake2b(digest_size=8)
+        digest.update(item_vectors.tobytes())
+        digest.update(movie_ids.tobytes())
+        manifest = {
+            "format_version": BUNDLE_FORMAT_VERSION,
+            "model_version": digest.hexdigest(),
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "num_items": int(item_vectors.shape[0]),
+            "dim": int(item_vectors.shape[1]),
+            "index": getattr(self, "index_config", {"index_type": "flat"}),
+            "faiss_version": faiss.__version__,
+            "drift": getattr(self, "drift", {}),
+        }
+        faiss.write_index(self.index, f"{self.save_path}/index.faiss")
+        np.save(f"{self.save_path}/item_vectors.npy", item_vectors)
+        np.save(f"{self.save_path}/movie_ids.npy", movie_ids)
+        # Written last so a bundle with a manifest is always complete
+        with open(f"{self.save_path}/manifest.json", "w") as f:
+            json.dump(manifest, f, indent=2)
+        self.manifest = manifest
+        self.model_version = manifest["model_version"]
+
+    def _load_bundle(self, mmap: bool = True) -> None:
+        manifest_path = f"{self.save_path}/manifest.json"
+        if not os.path.exists(manifest_path):
+            self._load_legacy_bundle()
+            return
+        with open(manifest_path) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format_version", 0) > BUNDLE_FORMAT_VERSION:
+            raise ValueError(f"TF-IDF bundle format {self.manifest['format_version']} is newer than supported ({BUNDLE_FORMAT_VERSION})")
+        index_path = f"{self.save_path}/index.faiss"
+        try:
+            self.index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP if mmap else 0)
+        except RuntimeError:
+            # Not every index type can be memory-mapped
+            self.index = faiss.read_index(index_path)
+        mmap_mode = "r" if mmap else None
+        self.tfidf_matrix = np.load(f"{self.save_path}/item_vectors.npy", mmap_mode=mmap_mode)
+        self.movie_ids = np.load(f"{self.save_path}/movie_ids.npy")
+        self.row_index = self.build_row_index(self.movie_ids)
+        self.drift = self.manifest.get("drift", {})
+        self.index_config = self.manifest.get("index", {"index_type": "flat"})
+        self.model_version = self.manifest["model_version"]
+
+    def _load_legacy_bundle(self) -> None:
+        # Checkpoints written before manifest.json pickled the index and movie ID list
+        self.manifest = {}
+        self.drift = {}
+        self.index_config = {"index_type": "flat"}
+        self.index = joblib.load(f"{self.save_path}/faiss_index.pkl")
+        self.movie_ids = np.asarray(joblib.load(f"{self.save_path}/movie_ids.pkl"), dtype=np.int64)
+        vectors_path = f"{self.save_path}/item_vectors.npy"
+        if os.path.exists(vectors_path):
+            self.tfidf_matrix = np.load(vectors_path, mmap_mode="r")
+        else:
+            # The flat IP index stores the vectors verbatim
+            self.tfidf_matrix = self.index.reconstruct_n(0, self.index.ntotal)
+        self.row_index = self.build_row_index(self.movie_ids)
+        self.model_version = str(os.stat(f"{self.save_path}/faiss_index.pkl").st_mtime_ns)
+
+    def load(self, mmap: bool = True) -> None:
         """Load a pre-trained model"""
         self.tfidf_vectorizer = joblib.load(f"{self.save_path}/tfidf_vectorizer.pkl")
         self.svd = joblib.load(f"{self.save_path}/svd_transformer.pkl")
-        self.index = joblib.load(f"{self.save_path}/faiss_index.pkl")
-        self.movie_ids = joblib.load(f"{self.save_path}/movie_ids.pkl")
-        print(f"Model loaded from {self.save_path}")
\ No newline at end of file
+        self._load_bundle(mmap)
+        print(f"Model loaded from {self.save_path}")
+
+
+def main():
+    # Rewrite a pickled checkpoint as a serving bundle without refitting
+    parser = argparse.ArgumentParser()
+    parser.add_argument("save_path", help="directory holding faiss_index.pkl and movie_ids.pkl")
+    args = parser.parse_args()
+
+    model = TFIDFModel.__new__(TFIDFModel)
+    model.save_path = args.save_path
+    model._load_legacy_bundle()
+    model.tfidf_matrix = np.asarray(model.tfidf_matrix)
+    model._save_bundle()
+    print(f"Serving bundle {model.model_version} written to {args.save_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,31 @@
-from model import TFIDFModel
+import argparse
+from model import TFIDFModel, INDEX_TYPES
 
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--streaming", action="store_true",
+                        help="hashed n-grams over tag batches and a column-blocked randomized SVD")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="parallel vectorisation workers (streaming only)")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat")
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--pq-m", type=int, default=100)
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--nprobe", type=int, default=16, help="default IVF lists visited per search")
+    parser.add_argument("--ef-search", type=int, default=64, help="default HNSW beam width")
+    args = parser.parse_args()
+
     movie_path = "data/ml-32m/movies.csv"
     tags_path = "data/ml-32m/tags.csv"
 
     model = TFIDFModel(movie_path=movie_path, tags_path=tags_path)
-    model.fit()
-    model.build_faiss_index()
+    model.fit(streaming=args.streaming, n_jobs=args.n_jobs)
+    model.build_faiss_index(args.index_type, nlist=args.nlist, pq_m=args.pq_m, hnsw_m=args.hnsw_m,
+                            nprobe=args.nprobe, ef_search=args.ef_search)
 
     # Example search
     movie_id = 1  # Replace with a valid movie ID
     result = model.search(movie_id)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,31 @@
+import argparse
+from model import TFIDFModel
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add new and re-tagged movies to a fitted TF-IDF model")
+    parser.add_argument("--movie-ids", type=int, nargs="*", default=None,
+                        help="movies to re-project; defaults to new movies and movies tagged since the last run")
+    parser.add_argument("--since", type=int, default=None, help="tag timestamp to look for changes after")
+    parser.add_argument("--max-oov-rate", type=float, default=0.2,
+                        help="cumulative out-of-vocabulary rate above which a full refit is recommended")
+    args = parser.parse_args()
+
+    movie_path = "data/ml-32m/movies.csv"
+    tags_path = "data/ml-32m/tags.csv"
+
+    model = TFIDFModel(movie_path=movie_path, tags_path=tags_path)
+    model.load(mmap=False)
+    movie_ids = args.movie_ids if args.movie_ids is not None else model.changed_movies(args.since)
+    print(f"{len(movie_ids)} movies to update")
+    if len(movie_ids) == 0:
+        return
+    model.update(movie_ids)
+    model.save()
+
+    if model.drift["oov_rate"] > args.max_oov_rate:
+        print(f"Cumulative OOV rate {model.drift['oov_rate']:.4f} exceeds {args.max_oov_rate}; "
+              f"run train_idf.py for a full refit")
+
+if __name__ == "__main__":
+    main()
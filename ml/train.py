@@ -19,7 +19,12 @@ mf_config={
     "wandb_project": "mf_training_fixed",
     "l2_reg": 0.002,  # Reduced regularization
     "threshold": 0.5,
-    "early_stopping_patience": 6  # Early stopping patience
+    "early_stopping_patience": 6,  # Early stopping patience
+    "resume": "latest",  # Continue from the newest checkpoint in checkpoints_dir, if there is one
+    "keep_last_checkpoints": 3,
+    "keep_best_checkpoints": 1,
+    "compile_step": False,  # torch.compile the forward + loss of each step
+    "autocast_dtype": None  # e.g. "bfloat16" for reduced-precision autocast
 }
 
 